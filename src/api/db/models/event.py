@@ -9,9 +9,12 @@
 class AnomalyEvent(Base):
     __tablename__ = "anomaly_events"
 
-    id = Column(Text, primary_key=True,
-                default=lambda: ulid.new().str, index=True)
-    timestamp = Column(TIMESTAMP(timezone=True), nullable=True, index=True)
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
+
+    id = Column(Text, primary_key=True, default=lambda: ulid.new().str)
+    # partitioned by day on timestamp, so it is part of the key
+    timestamp = Column(TIMESTAMP(timezone=True), primary_key=True,
+                       nullable=False, index=True)
     is_alert = Column(Boolean, nullable=True, index=True)
     alert_type = Column(Text, nullable=True, index=True)
     alert_level = Column(Text, nullable=True)
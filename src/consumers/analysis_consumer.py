@@ -1,66 +1,361 @@
-from consumers.analyzers.logs_analyzer import LogsAnalyzer
-from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
-from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+import os
+import time
+from collections import deque
+from itertools import chain, groupby
+
+from consumers.analyzers.batch import MetricsBatch
+from consumers.analyzers.correlation import Correlator
+from consumers.analyzers.partition_state import ANALYZER_TYPES, PartitionState
+from consumers.analyzers.rule_engine import RulesWatcher, WindowState, load_rules
 from consumers.base_consumer import BaseConsumer
-from consumers.config.settings import KafkaConfig
+from consumers.events import DecodeError, convert_event, decode_event
+from consumers.config.settings import KafkaConfig, ConsumerConfig, AnalyzerConfig, AlertConfig, DBConfig
+from consumers.utils.alert_cooldown import AlertCooldown
 from consumers.utils.dc_alert import AlertHandler
 from consumers.utils.db_handler import DBHandler
+from consumers.utils.sink_pipeline import SinkPipeline
+from consumers.utils.snapshot import encode_snapshot, read_snapshot, write_payload, write_snapshot
 
 
 class AnalysisConsumer(BaseConsumer):
-  def __init__(self, topics, group_id):
+  # analyzer state is sharded by topic-partition, so with workers keyed by
+  # partition each shard is only ever touched by one worker lane; windows
+  # keyed by another field than the topic's message key are process-wide
+  def __init__(self, topics, group_id, batch_size=ConsumerConfig.BATCH_SIZE,
+               workers=0):
     super().__init__(
       topics=topics,
       group_id=group_id,
-      bootstrap_servers=KafkaConfig.BOOTSTRAP_SERVERS
+      bootstrap_servers=KafkaConfig.BOOTSTRAP_SERVERS,
+      batch_size=batch_size,
+      poll_timeout_ms=ConsumerConfig.POLL_TIMEOUT_MS,
+      commit_interval=ConsumerConfig.COMMIT_INTERVAL_SECONDS,
+      workers=workers,
+      key_by=ConsumerConfig.WORKER_KEY_BY,
+      worker_queue_size=ConsumerConfig.WORKER_QUEUE_SIZE
     )
 
-    self.logs_analyzer = LogsAnalyzer()
-    self.metrics_analyzer = MetricsAnalyzer()
-    self.transactions_analyzer = TransactionsAnalyzer()
+    self.rules = load_rules()
+    self.rules_watcher = RulesWatcher()
+
+    # (topic, partition) -> PartitionState, opened on assignment and dropped
+    # on revoke so a process never counts partitions it no longer owns
+    self.shards = {}
+    # windows whose key spans partitions, e.g. logs per user_id: counted once
+    # for every shard here, and rebuilt from the stream after a restart
+    self.shared_windows = WindowState()
+    # topics are named after their source type, so each partition's analyzer
+    # is resolved once and cached here instead of sniffing payloads
+    self.shard_handlers = {}
+
+    # joins alerts across topics by service; partitions of different topics
+    # only meet here if they are assigned to the same process, see README
+    self.correlator = Correlator(self.rules.correlations, AnalyzerConfig.MAX_KEYS)
 
     self.alert_handler = AlertHandler()
-    self.db_handler = DBHandler()
+    # sink mode: alerts reach the webhook and the database from their own
+    # threads, offsets commit once both have them; the poll loop must own
+    # commits for that, so the per-message loop keeps sinks inline
+    self.sinks = None
+    if ConsumerConfig.SINK_QUEUE_SIZE and (batch_size or workers):
+      # rows are always batched here: whatever is queued, up to flush_rows
+      self.db_handler = DBHandler(flush_rows=DBConfig.FLUSH_ROWS or 1000)
+      self.sinks = SinkPipeline(ConsumerConfig.SINK_QUEUE_SIZE, name=group_id)
+      self.sinks.add("webhook", self.alert_handler.send_alert)
+      self.sinks.add("db", self.db_handler.insert_analysis_result,
+                     flush=self.db_handler.flush, flush_due=self.db_handler.flush_due)
+      self.sinks.start()
+      print(f"[SINK] Sinks on their own threads, queues of {ConsumerConfig.SINK_QUEUE_SIZE}")
+    else:
+      self.db_handler = DBHandler()
+    # bounds sink load during incidents, when a window rule fires per event
+    self.alert_cooldown = AlertCooldown(
+      AlertConfig.COOLDOWN_SECONDS, AlertConfig.COOLDOWN_MAX_KEYS)
+
+    # shard state files are written on the poll thread right after a commit,
+    # when the windows hold exactly the committed records; with workers the
+    # windows keep changing underneath, so state files stay off
+    self.state_dir = AnalyzerConfig.STATE_DIR if not workers else ""
+    if AnalyzerConfig.STATE_DIR and workers:
+      print("[STATE] Snapshots disabled: analysis runs on worker threads")
+    self._committed = {}
+    self._snapshot_offsets = {}
+    # sink mode: offsets analyzed so far, and state files encoded for them
+    # that wait for those offsets to commit
+    self._processed = {}
+    self._pending_snapshots = deque()
+    self._last_snapshot = time.monotonic()
   
-  def process_message(self, message):
+  def on_poll(self):
+    self.db_handler.maintain_partitions()
+    if self.sinks is not None:
+      self.apply_backpressure()
+    elif self.db_handler.flush_rows and self.db_handler.flush_due():
+      self.db_handler.flush()
+
+    # rates are swapped inside the rule set, evaluators pick them up as is
+    if self.rules.rates is not None and self.rules.rates.poll():
+      print(f"[RATES] Reloaded {len(self.rules.rates.rates)} rates from {self.rules.rates.path}")
+
+    # rules are reloaded in-process: no restart, so no rebalance or replay
+    rules = self.rules_watcher.poll()
+    if rules is None:
+      return
+
+    self.rules = rules
+    self.correlator.set_rules(rules.correlations)
+    dropped = sum(shard.set_rules(rules) for shard in list(self.shards.values()))
+    with self.shared_windows.lock:
+      dropped += self.shared_windows.retain(rules.process_ids)
+    print(f"[RULES] Reloaded {len(rules.rules)} rules from "
+          f"{self.rules_watcher.path}, dropped {dropped} unused windows")
+
+  def apply_backpressure(self):
+    # a sink falling behind pauses every partition; polling goes on, so the
+    # group keeps this member, and resumes them once the queues have drained
+    if self.sinks.saturated():
+      running = self.consumer.assignment() - self.consumer.paused()
+      if running:
+        self.consumer.pause(*running)
+        print(f"[SINK] Paused {len(running)} partitions, sinks behind: {self.sinks.stats()}")
+    elif self.consumer.paused() and self.sinks.drained():
+      paused = self.consumer.paused()
+      self.consumer.resume(*paused)
+      print(f"[SINK] Resumed {len(paused)} partitions")
+
+  def before_commit(self):
+    if self.sinks is not None:
+      return True
+    # alerts of the records being committed must be in the database first;
+    # a failed flush keeps both its rows and the offsets for the next try
+    return self.db_handler.flush()
+
+  def commit_barrier(self, offsets):
+    if self.sinks is None:
+      return None
+    if self.state_dir:
+      # no workers, so the windows hold exactly the records up to these
+      # offsets right now; state files are encoded now and written once the
+      # offsets are committed, i.e. once the sinks have their alerts
+      for tp, offset in offsets.items():
+        self._processed[(tp.topic, tp.partition)] = offset
+      if time.monotonic() - self._last_snapshot >= AnalyzerConfig.SNAPSHOT_INTERVAL_SECONDS:
+        self._last_snapshot = time.monotonic()
+        self._pending_snapshots.append({
+          key: (offset, encode_snapshot({key: offset}, self.shards[key].snapshot()))
+          for key, offset in self._processed.items()
+          if key in self.shards and offset != self._snapshot_offsets.get(key)
+        })
+    return self.sinks.mark()
+
+  def barrier_passed(self, barrier, wait=False):
+    return self.sinks.acked(barrier, ConsumerConfig.SINK_DRAIN_SECONDS if wait else 0)
+
+  def on_commit(self, offsets):
+    for tp, offset in offsets.items():
+      self._committed[(tp.topic, tp.partition)] = offset
+    if self.sinks is not None:
+      self.write_pending_snapshots()
+      return
+    if self.state_dir and \
+        time.monotonic() - self._last_snapshot >= AnalyzerConfig.SNAPSHOT_INTERVAL_SECONDS:
+      self._last_snapshot = time.monotonic()
+      for key in list(self.shards):
+        if self._committed.get(key) != self._snapshot_offsets.get(key):
+          self.write_snapshot(key)
+
+  def on_partitions_revoked(self, revoked):
+    # commit first, so the state handed over matches the committed offsets
+    super().on_partitions_revoked(revoked)
+    for tp in revoked:
+      key = (tp.topic, tp.partition)
+      if self.state_dir and key in self.shards:
+        self.write_snapshot(key)
+      self.shards.pop(key, None)
+      self.shard_handlers.pop(key, None)
+      self._committed.pop(key, None)
+      self._snapshot_offsets.pop(key, None)
+      self._processed.pop(key, None)
+      for pending in self._pending_snapshots:
+        pending.pop(key, None)
+    print(f"[STATE] Dropped {len(revoked)} revoked partitions, {len(self.shards)} left")
+
+  def on_partitions_assigned(self, assigned):
+    for tp in assigned:
+      key = (tp.topic, tp.partition)
+      self.shard_handlers.pop(key, None)
+      self.shards[key] = PartitionState(self.rules, self.shared_windows)
+      offset = self.restore_snapshot(key) if self.state_dir else None
+      if offset is not None:
+        # replay the gap between the state file and the last commit
+        self.consumer.seek(tp, offset)
+        print(f"[STATE] {tp.topic}[{tp.partition}] restored, resumes at offset {offset}")
+
+  def state_path(self, key):
+    topic, partition = key
+    return os.path.join(self.state_dir, f"{topic}-{partition}.state")
+
+  def write_snapshot(self, key):
+    offset = self._committed.get(key)
+    if offset is None:
+      return
+    if self.sinks is not None and self._processed.get(key, offset) != offset:
+      # analyzed past the last commit, the sinks still hold some alerts
+      return
+    start = time.perf_counter()
     try:
-      source_type = self._detect_source_type(message)
-      analysis_result = self.analyze_data(message, source_type)
-      
-      if analysis_result['is_alert']:
-        self.alert_handler.send_alert(analysis_result)
-        print(f"[ALERT] {analysis_result['alert_message']}")
+      size = write_snapshot(self.state_path(key), {key: offset}, self.shards[key].snapshot())
+    except OSError as e:
+      print(f"[STATE] Write {key[0]}[{key[1]}] Failed: {e}")
+      return
+    self._snapshot_offsets[key] = offset
+    print(f"[STATE] Wrote {key[0]}[{key[1]}] at offset {offset}: {size:,} bytes "
+          f"in {(time.perf_counter() - start) * 1000:.0f}ms")
 
-        self.db_handler.insert_analysis_result(analysis_result)
-        print("[DB] Analysis written")
+  def write_pending_snapshots(self):
+    # held commits are released in order, so state files are too
+    while self._pending_snapshots:
+      pending = self._pending_snapshots[0]
+      if any(self._committed.get(key, -1) < offset for key, (offset, _) in pending.items()):
+        return
+      self._pending_snapshots.popleft()
+      for key, (offset, payload) in pending.items():
+        try:
+          size = write_payload(self.state_path(key), payload)
+        except OSError as e:
+          print(f"[STATE] Write {key[0]}[{key[1]}] Failed: {e}")
+          continue
+        self._snapshot_offsets[key] = offset
+        print(f"[STATE] Wrote {key[0]}[{key[1]}] at offset {offset}: {size:,} bytes")
+
+  def restore_snapshot(self, key):
+    snapshot = read_snapshot(self.state_path(key))
+    if snapshot is None or key not in snapshot["offsets"]:
+      return None
+    self.shards[key].restore(snapshot["state"])
+    offset = snapshot["offsets"][key]
+    self._committed[key] = self._snapshot_offsets[key] = offset
+    return offset
+
+  def shard(self, topic, partition):
+    key = (topic, partition)
+    shard = self.shards.get(key)
+    if shard is None:
+      # records can arrive without an assignment callback, e.g. manual
+      # assignment or a record still in flight from before a rebalance
+      shard = self.shards[key] = PartitionState(self.rules, self.shared_windows)
+    return shard
+
+  def deserialize(self, topic, value):
+    try:
+      return decode_event(topic, value)
+    except DecodeError as e:
+      print(f"[DECODE] Rejected {topic} event: {e}")
+      return None
+
+  def process_message(self, message, meta=None):
+    try:
+      topic, partition = (meta.topic, meta.partition) if meta else (None, None)
+      handler = self.shard_handlers.get((topic, partition))
+      if handler is None and topic in ANALYZER_TYPES:
+        handler = self.shard(topic, partition).analyzer(topic).process
+        self.shard_handlers[(topic, partition)] = handler
+
+      if handler:
+        alerts = handler(message)
+      else:
+        # unknown topic: fall back to guessing the source from the payload
+        source_type = self._detect_source_type(message)
+        alerts = self.analyze_data(message, source_type, self.shard(topic, partition))
+
+      self.handle_alerts(alerts)
 
     except Exception as e:
       print(f"Analysis Error: {e}")
       raise
-  
-  def analyze_data(self, data, source_type):
-    if source_type == "logs":
-      return self.logs_analyzer.process(data)
 
-    elif source_type == "metrics":
-      return self.metrics_analyzer.process(data)
+  def process_batch(self, records):
+    if not AnalyzerConfig.METRICS_BATCH_MIN:
+      return super().process_batch(records)
 
-    elif source_type == "transactions":
-      return self.transactions_analyzer.process(data)
-    
-    else:
-      return {
-        "is_alert": False,
-        "alert_type": None,
-        "alert_message": None,
-        "service": data.get("service", "unknown"),
-        "raw_data": data
-      }
-
-  def calculate_anomaly_score(self, value):
-    # TODO: change to ML model
-    return abs(value - 50) / 50
+    # polled records arrive grouped by partition
+    for (topic, partition), group in groupby(records, key=lambda r: (r.topic, r.partition)):
+      group = list(group)
+      if topic != "metrics" or len(group) < AnalyzerConfig.METRICS_BATCH_MIN:
+        super().process_batch(group)
+        continue
+      self.process_metrics_batch(partition, group)
+
+  def process_metrics_batch(self, partition, records):
+    events = []
+    for record in records:
+      event = self.deserialize(record.topic, record.value)
+      if event is not None:
+        events.append(event)
+    if not events:
+      return
+    batch = MetricsBatch.from_events(events)
+    try:
+      batch.ts_ms
+    except ValueError:
+      # a bad timestamp fails only its own record on the per-event path;
+      # nothing has been counted yet, so hand the records over
+      super().process_batch(records)
+      return
+    try:
+      alerts = self.shard("metrics", partition).analyzer("metrics").process_batch(batch)
+      self.handle_alerts(alerts)
+    except Exception as e:
+      print(f"Process batch Error (metrics[{partition}] offsets "
+            f"{records[0].offset}-{records[-1].offset}): {e}")
+
+  def handle_alerts(self, alerts):
+    # correlation sees every alert, including repeats the cooldown drops
+    composite = self.correlator.observe(alerts) if alerts else []
+    for analysis_result in chain(alerts, composite):
+      if not self.alert_cooldown.allow(analysis_result):
+        continue
+
+      if self.sinks is not None:
+        # may block on a full queue; the poll loop pauses before that
+        self.sinks.submit(analysis_result)
+        print(f"[ALERT] {analysis_result['alert_message']}")
+        continue
+
+      self.alert_handler.send_alert(analysis_result)
+      print(f"[ALERT] {analysis_result['alert_message']}")
+
+      self.db_handler.insert_analysis_result(analysis_result)
+      if not self.db_handler.flush_rows:
+        print("[DB] Analysis written")
   
+  def analyze_data(self, data, source_type, shard):
+    if source_type in ANALYZER_TYPES:
+      return shard.analyzer(source_type).process(convert_event(source_type, data))
+    return []
+
+  def close(self):
+    for (topic, partition), shard in self.shards.items():
+      print(f"[STATE] {topic}[{partition}] {shard.stats()}")
+    print(f"[STATE] process-wide {self.shared_windows.stats()}")
+    print(f"[ALERT] Cooldown {self.alert_cooldown.stats()}")
+    print(f"[ALERT] Correlation {self.correlator.stats()}")
+    if self.rules.rates is not None and self.rules.rates.unknown:
+      print(f"[RATES] Amounts in currencies without a rate {self.rules.rates.unknown}")
+    # the final commit happens in super().close(), snapshot what it covered;
+    # in sink mode it first waits for the sinks to take the alerts
+    super().close()
+    if self.sinks is not None:
+      self.sinks.close(ConsumerConfig.SINK_DRAIN_SECONDS)
+      print(f"[SINK] {self.sinks.stats()}")
+    if self.state_dir:
+      for key in list(self.shards):
+        self.write_snapshot(key)
+    # rows still buffered here failed their last flush; their offsets were
+    # not committed, so the records are analyzed again on restart
+    print(f"[DB] {self.db_handler.stats()}")
+    self.db_handler.close()
+
   def _detect_source_type(self, data):
     if "level" in data:
       return "logs"
@@ -0,0 +1,43 @@
+from consumers.analyzers.rule_engine import WindowState
+
+
+class BaseAnalyzer:
+  # thresholds and windows for each source live in config/rules.json
+  source = None
+
+  def __init__(self, rules, shared=None):
+    # shared: the process-wide WindowState for rules.process_ids, None keeps
+    # every window in this analyzer's own state
+    self.windows = WindowState(shared)
+    self.set_rules(rules)
+
+  def set_rules(self, rules):
+    # the evaluator is swapped in one assignment, so an event in flight sees
+    # either the old rules or the new ones; window counts carry over for
+    # every window the new rules still use
+    self.rules = rules
+    evaluate = rules.evaluator(self.source)
+    shared = self.windows.shared
+    if shared is not None:
+      self.windows.shared_ids = frozenset(rules.process_ids)
+      if self.source in rules.process_sources:
+        # analyzers of other partitions count into the same windows
+        def evaluate(data, windows, evaluate=evaluate, lock=shared.lock):
+          with lock:
+            return evaluate(data, windows)
+    self._evaluate = evaluate
+    return self.windows.retain(rules.state_ids)
+
+  def process(self, data):
+    return self._evaluate(data, self.windows)
+
+  def snapshot(self):
+    return self.windows.snapshot()
+
+  def restore(self, snapshot):
+    # windows of rules removed since the snapshot are not brought back
+    self.windows.restore(snapshot)
+    self.windows.retain(self.rules.state_ids)
+
+  def stats(self):
+    return self.windows.stats()
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from math import sqrt
+
+
+class StreamingBaseline:
+  """Per-key running baseline of a few numeric fields.
+
+  For every field it keeps an exponentially weighted mean and variance and a
+  stochastic-approximation estimate of each tracked quantile, all updated in
+  O(1) per event. A key costs one flat list of floats, and the least
+  recently updated key is evicted beyond `max_keys`.
+
+  update() scores a value against the baseline as it was *before* the value
+  is folded in, so a spike cannot hide itself:
+    - z:   (value - mean) / std
+    - pct: the highest tracked quantile the value is above, 0.0 if none
+  Both are 0.0 until a key has seen `warmup` events.
+  """
+
+  # quantile estimates move by this fraction of the current std per event
+  QUANTILE_RATE = 0.05
+
+  def __init__(self, fields, alpha=0.02, quantiles=(0.5, 0.99), warmup=50,
+               max_keys=None):
+    self.fields = tuple(fields)
+    self.alpha = alpha
+    self.quantiles = tuple(sorted(quantiles))
+    self.warmup = warmup
+    self.max_keys = max_keys
+    # per field: mean, variance, one estimate per quantile
+    self._stride = 2 + len(self.quantiles)
+    # per field: index of its mean, and (index, quantile) of each estimate
+    self._layout = [
+      (base, tuple(zip(range(base + 2, base + self._stride), self.quantiles)))
+      for base in range(1, 1 + len(self.fields) * self._stride, self._stride)
+    ]
+    self._cold = (0.0, 0.0) * len(self.fields)
+    self._states = OrderedDict()  # key -> [count, field 0 ..., field 1 ...]
+    self.evicted_keys = 0
+
+  def update(self, key, *values):
+    """Fold one event's field values in, return (z, pct) per field, flattened."""
+    state = self._states.get(key)
+    if state is None:
+      state = self._states[key] = self._new_state(values)
+      if self.max_keys and len(self._states) > self.max_keys:
+        self._states.popitem(last=False)
+        self.evicted_keys += 1
+      return self._cold
+    self._states.move_to_end(key)
+
+    warm = state[0] >= self.warmup
+    state[0] += 1
+    alpha = self.alpha
+    decay = 1.0 - alpha
+    rate = self.QUANTILE_RATE
+
+    scores = []
+    for x, (base, slots) in zip(values, self._layout):
+      mean = state[base]
+      var = state[base + 1]
+      std = sqrt(var)
+      diff = x - mean
+      step = rate * std
+
+      pct = 0.0
+      for i, p in slots:
+        q = state[i]
+        if x > q:
+          pct = p
+          state[i] = q + step * p
+        else:
+          state[i] = q + step * (p - 1.0)
+      if warm and std > 0.0:
+        scores.append(diff / std)
+        scores.append(pct)
+      else:
+        scores.append(0.0)
+        scores.append(0.0)
+
+      incr = alpha * diff
+      state[base] = mean + incr
+      state[base + 1] = decay * (var + diff * incr)
+    return tuple(scores)
+
+  def _new_state(self, values):
+    state = [1]
+    for x in values:
+      state += [float(x), 0.0] + [float(x)] * len(self.quantiles)
+    return state
+
+  def get(self, key, field):
+    """(mean, std, {quantile: estimate}) for one key and field, or None."""
+    state = self._states.get(key)
+    if state is None:
+      return None
+    base = 1 + self.fields.index(field) * self._stride
+    estimates = dict(zip(self.quantiles, state[base + 2:base + self._stride]))
+    return state[base], sqrt(state[base + 1]), estimates
+
+  def snapshot(self):
+    return {
+      "fields": self.fields,
+      "quantiles": self.quantiles,
+      "states": list(self._states.items()),
+      "evicted_keys": self.evicted_keys,
+    }
+
+  def restore(self, state):
+    if (tuple(state["fields"]), tuple(state["quantiles"])) != (self.fields, self.quantiles):
+      raise ValueError("snapshot baseline layout does not match this baseline")
+    self._states = OrderedDict(state["states"])
+    self.evicted_keys = state["evicted_keys"]
+    while self.max_keys and len(self._states) > self.max_keys:
+      self._states.popitem(last=False)
+      self.evicted_keys += 1
+
+  def stats(self):
+    return {"keys": len(self._states), "evicted_keys": self.evicted_keys}
+
+  def __len__(self):
+    return len(self._states)
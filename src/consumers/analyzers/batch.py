@@ -0,0 +1,269 @@
+import operator
+from operator import attrgetter
+
+import numpy as np
+
+from consumers.analyzers.window import MultiResolutionCounter
+from consumers.utils.timestamps import parse_epoch_ms
+
+_NP_OPS = {
+  "==": operator.eq,
+  "!=": operator.ne,
+  ">": operator.gt,
+  ">=": operator.ge,
+  "<": operator.lt,
+  "<=": operator.le,
+}
+
+
+class MetricsBatch:
+  """A micro-batch of metric events as NumPy columns.
+
+  `service` holds indices into `services`, `ts_ms` epoch milliseconds. The
+  events are kept alongside for what alerts copy (timestamp, message,
+  user_id), which is only read for rows that fire.
+  """
+
+  # numeric event fields rules can compare in vectorized form
+  COLUMNS = ("cpu", "latency_ms")
+
+  def __init__(self, events, services, service, cpu, latency_ms, ts_ms=None):
+    self.events = events
+    self.services = services
+    self.service = service
+    self.cpu = cpu
+    self.latency_ms = latency_ms
+    self._ts_ms = ts_ms
+
+  @classmethod
+  def from_events(cls, events):
+    """Columns from decoded MetricEvents."""
+    n = len(events)
+    index = {}
+    service = np.fromiter(
+      (index.setdefault(e.service, len(index)) for e in events), np.int32, n)
+    cpu = np.fromiter(map(attrgetter("cpu"), events), np.float64, n)
+    latency_ms = np.fromiter(map(attrgetter("latency_ms"), events), np.int64, n)
+    return cls(events, list(index), service, cpu, latency_ms)
+
+  @property
+  def ts_ms(self):
+    # parsed on first use, as the per-event path only parses timestamps of
+    # events that reach a window; raises ValueError on a bad timestamp
+    if self._ts_ms is None:
+      self._ts_ms = np.fromiter(
+        map(parse_epoch_ms, map(attrgetter("timestamp"), self.events)),
+        np.int64, len(self.events))
+    return self._ts_ms
+
+  def column(self, field):
+    return getattr(self, field)
+
+  def __len__(self):
+    return len(self.events)
+
+
+class BatchPlan:
+  """One source's rules evaluated a whole MetricsBatch at a time.
+
+  Conditions become boolean masks over the batch columns; window rules count
+  all matching rows of a key at once from the counter's buckets plus a
+  running count over the batch, then add each bucket's rows in one call.
+  Counters that span several levels, or that a rule queries for a width
+  narrower than their finest level, are counted row by row.
+  Alerts are built by the rules' own alert functions and come out in the
+  same order, with the same content, as calling the per-event evaluator on
+  each event in turn.
+
+  Baseline scores depend on every earlier event of their key, so the
+  baseline is still updated row by row, on plain floats.
+
+  `supported` is False when a rule needs something the columns don't have
+  (a string match, a field other than service/cpu/latency_ms, a velocity
+  spec) or keeps state shared across partitions; callers then use the
+  per-event evaluator.
+  """
+
+  def __init__(self, rules, source):
+    self.supported = source not in rules.velocities and source not in rules.process_sources
+    self.baseline = rules.baselines.get(source)
+    self._derived = self.baseline.derived if self.baseline else ()
+    for rule in rules.rules:
+      if rule.source != source:
+        continue
+      if not all(self._supports(field, op, value) for field, op, value in rule.predicates):
+        self.supported = False
+      if rule.window_id is not None and rule.window_key != "service":
+        self.supported = False
+    # in the generated evaluator's order, rules counting one window together
+    self.targets = [
+      (group[0].predicates, group[0].window_id, group)
+      for group in rules.targets(source)
+    ]
+
+  def _supports(self, field, op, value):
+    if field == "service":
+      return op in ("==", "!=", "in")
+    if field in MetricsBatch.COLUMNS or field in self._derived:
+      numbers = value if op == "in" else [value]
+      return (op in _NP_OPS or op == "in") and all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) for v in numbers)
+    return False
+
+  def evaluate(self, batch, windows):
+    scores = self._update_baseline(batch, windows) if self.baseline else None
+    derived = {}
+    if scores is not None:
+      matrix = np.array(scores, dtype=np.float64).reshape(len(batch), len(self._derived))
+      derived = {name: matrix[:, i] for i, name in enumerate(self._derived)}
+
+    # rows that fired, and for each the rule's place in evaluation order
+    fired_rows = []
+    fired_order = []
+    fired_rules = []
+    for predicates, window_id, rules in self.targets:
+      mask = self._mask(predicates, batch, derived)
+      rows = np.arange(len(batch)) if mask is None else np.flatnonzero(mask)
+      if window_id is None:
+        hits = [rows]
+      elif rows.size:
+        counts = _window_counts(windows, window_id, batch, rows, rules)
+        hits = [rows[counts[rule.window_seconds] >= rule.min_count] for rule in rules]
+      else:
+        hits = [rows] * len(rules)
+      for rule, rule_rows in zip(rules, hits):
+        if rule_rows.size:
+          fired_rows.append(rule_rows)
+          fired_order.append(np.full(rule_rows.size, len(fired_rules)))
+          fired_rules.append(rule)
+    if not fired_rules:
+      return []
+
+    rows = np.concatenate(fired_rows)
+    order = np.concatenate(fired_order)
+    sort = np.lexsort((order, rows))
+    positions = {name: i for i, name in enumerate(self._derived)}
+    builders = [
+      (rule.build_alert, [positions[name] for name in rule.alert_args])
+      for rule in fired_rules
+    ]
+    events = batch.events
+    alerts = []
+    for row, index in zip(rows[sort].tolist(), order[sort].tolist()):
+      build, args = builders[index]
+      if args:
+        score = scores[row]
+        alerts.append(build(events[row], *[score[i] for i in args]))
+      else:
+        alerts.append(build(events[row]))
+    return alerts
+
+  def _update_baseline(self, batch, windows):
+    baseline = windows.baselines.get(self.baseline.id)
+    if baseline is None:
+      baseline = windows.create_baseline(self.baseline.id)
+    update = baseline.update
+    services = batch.services
+    keys = [services[i] for i in batch.service.tolist()]
+    columns = [batch.column(field).tolist() for field in self.baseline.fields]
+    return list(map(update, keys, *columns))
+
+  def _mask(self, predicates, batch, derived):
+    mask = None
+    for field, op, value in predicates:
+      if field == "service":
+        index = {name: i for i, name in enumerate(batch.services)}
+        wanted = [index.get(v, -1) for v in (value if op == "in" else [value])]
+        match = np.isin(batch.service, wanted)
+        if op == "!=":
+          match = ~match
+      else:
+        column = derived[field] if field in derived else batch.column(field)
+        match = np.isin(column, value) if op == "in" else _NP_OPS[op](column, value)
+      mask = match if mask is None else mask & match
+    return mask
+
+
+def _window_counts(windows, window_id, batch, rows, rules):
+  """{width: window count after each of `rows` is added}, in row order."""
+  counter = windows.counters.get(window_id)
+  if counter is None:
+    counter = windows.create(window_id)
+  services = batch.services
+  keys = batch.service[rows]
+  ts_ms = batch.ts_ms[rows]
+  widths = {rule.window_seconds: rule.window_full for rule in rules}
+  if not all(widths.values()) or not isinstance(counter, MultiResolutionCounter) or \
+      len(counter.levels) > 1 or not _ring_safe(counter, services, keys, ts_ms):
+    add = counter.add
+    count = counter.count
+    counts = {seconds: np.empty(len(rows), np.int64) for seconds in widths}
+    for i, (k, t) in enumerate(zip(keys.tolist(), ts_ms.tolist())):
+      key = services[k]
+      total = add(key, t)
+      for seconds, full in widths.items():
+        counts[seconds][i] = total if full else count(key, seconds)
+    return counts
+
+  n = counter.num_buckets
+  bucket_ms = counter.bucket_seconds * 1000
+  buckets = ts_ms // bucket_ms
+  counts = np.empty(len(rows), np.int64)
+  adds = []  # (first row, bucket, key, amount)
+  for k in np.unique(keys).tolist():
+    at = np.flatnonzero(keys == k)
+    b = buckets[at]
+    key = services[k]
+    prior = counter.buckets(key)
+    # counter buckets still inside each row's window, then earlier rows of
+    # the batch inside it (buckets of a key never go back, see _ring_safe)
+    if prior:
+      prior_buckets = np.fromiter(prior, np.int64, len(prior))
+      suffix = np.concatenate((np.cumsum(list(prior.values())[::-1])[::-1], [0]))
+      counts[at] = suffix[np.searchsorted(prior_buckets, b - n, side="right")]
+    else:
+      counts[at] = 0
+    counts[at] += np.arange(1, len(b) + 1) - np.searchsorted(b, b - n, side="right")
+    values, first, amounts = np.unique(b, return_index=True, return_counts=True)
+    adds.extend(zip(at[first].tolist(), values.tolist(), [key] * len(values), amounts.tolist()))
+
+  # one add per key and bucket, placed at its first row: row by row, only
+  # those rows advance a ring, move the watermark or expire idle keys, so
+  # the counter ends up exactly as the per-event path leaves it
+  adds.sort(key=operator.itemgetter(0))
+  add = counter.add
+  for _, bucket, key, amount in adds:
+    add(key, bucket * bucket_ms, amount)
+  return dict.fromkeys(widths, counts)
+
+
+def _ring_safe(counter, services, keys, ts_ms):
+  # the closed form above matches adding rows one by one only if no key's
+  # buckets go backwards, no key would lose still-counted buckets to idle
+  # expiry part way through the batch, and nothing gets evicted
+  buckets = ts_ms // (counter.bucket_seconds * 1000)
+  names = {k: services[k] for k in np.unique(keys).tolist()}
+  new_keys = sum(1 for name in names.values() if name not in counter)
+  if counter.max_keys and len(counter) + new_keys > counter.max_keys:
+    return False
+
+  n = counter.num_buckets
+  start = counter.watermark
+  watermark = np.maximum.accumulate(buckets)
+  if start is not None:
+    watermark = np.maximum(watermark, start)
+  for k, name in names.items():
+    at = np.flatnonzero(keys == k)
+    b = buckets[at]
+    prior = counter.buckets(name)
+    head = max(prior) if prior else None
+    if head is not None and b[0] < head:
+      return False
+    if np.any(b[1:] < b[:-1]):
+      return False
+    # a new key's first row has nothing to lose
+    previous = np.concatenate(([head if head is not None else b[0] - n], b[:-1]))
+    expired = previous <= watermark[at] - n - counter.idle_ttl_buckets
+    if np.any(expired & (previous > b - n)):
+      return False
+  return True
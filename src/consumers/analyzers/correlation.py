@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+
+from consumers.utils.timestamps import parse_epoch_ms
+
+
+class Correlation:
+  """A correlation spec from the rules file: every alert type in `signals`
+  raised for the same `key` value, each within `seconds` of event time of
+  the alert that completes the set."""
+
+  def __init__(self, spec):
+    self.name = spec["name"]
+    self.signals = tuple(spec["signals"])
+    if len(set(self.signals)) < 2:
+      raise ValueError(f"correlation {self.name!r} needs at least two distinct signals")
+    self.key = spec.get("key", "service")
+    self.window_ms = int(spec["seconds"] * 1000)
+    if self.window_ms <= 0:
+      raise ValueError(f"correlation {self.name!r} needs a positive window")
+    self.header = {
+      "is_alert": True,
+      "alert_type": spec["alert_type"],
+      "alert_level": spec["alert_level"],
+      "alert_title": spec["alert_title"],
+      "rule": self.name,
+    }
+    self.message = spec["alert_message"]
+
+  def build_alert(self, key_value, alert, seen):
+    # seen: signal -> (ts_ms, timestamp, rule) of the alerts that matched
+    signals = ", ".join(self.signals)
+    times = [ts_ms for ts_ms, _, _ in seen.values()]
+    return {
+      **self.header,
+      "alert_message": self.message.format(
+        **{self.key: key_value}, signals=signals, seconds=self.window_ms // 1000),
+      self.key: key_value,
+      "tags": {
+        "signals": {signal: {"timestamp": timestamp, "rule": rule}
+                    for signal, (_, timestamp, rule) in seen.items()},
+      },
+      "metrics": {"span_seconds": (max(times) - min(times)) / 1000},
+      "timestamp": alert["timestamp"],
+    }
+
+
+class Correlator:
+  """Joins alerts of different analyzers on a shared key.
+
+  For every key value (a service, by default) it keeps the newest alert of
+  each signal type any correlation listens to, so checking a correlation is
+  a few dict lookups instead of a scan of recent events. Alerts are fed in
+  as the analyzers raise them, from any topic; when one completes a
+  correlation, i.e. every other signal of it was seen for the same key
+  within the window, a composite alert is returned. A correlation fires at
+  most once per window per key.
+
+  Summaries are in event time and held least recently updated first, the
+  oldest dropped beyond `max_keys`.
+  """
+
+  def __init__(self, correlations=(), max_keys=None):
+    self.max_keys = max_keys
+    self._lock = threading.Lock()
+    # (key field, key value) -> {signal: (ts_ms, timestamp, rule)}
+    self._summaries = OrderedDict()
+    # (correlation name, key value) -> ts_ms it last fired at
+    self._fired = OrderedDict()
+    self.emitted = 0
+    self.set_rules(correlations)
+
+  def set_rules(self, correlations):
+    by_signal = {}
+    for correlation in correlations:
+      for signal in correlation.signals:
+        by_signal.setdefault(signal, []).append(correlation)
+    # swapped in one assignment, like the analyzers' evaluators
+    self._by_signal = by_signal
+
+  def observe(self, alerts):
+    """Record alerts, return the composite alerts they complete."""
+    by_signal = self._by_signal
+    composite = []
+    for alert in alerts:
+      correlations = by_signal.get(alert.get("alert_type"))
+      if correlations:
+        composite.extend(self._observe(alert, correlations))
+    return composite
+
+  def _observe(self, alert, correlations):
+    signal = alert["alert_type"]
+    ts_ms = parse_epoch_ms(alert["timestamp"])
+    completed = []
+    with self._lock:
+      for correlation in correlations:
+        key_value = alert.get(correlation.key)
+        if key_value is None:
+          continue
+        summary = self._summary((correlation.key, key_value))
+        latest = summary.get(signal)
+        if latest is None or ts_ms >= latest[0]:
+          summary[signal] = (ts_ms, alert["timestamp"], alert.get("rule"))
+
+        seen = {}
+        for other in correlation.signals:
+          entry = summary.get(other)
+          if entry is None or abs(ts_ms - entry[0]) > correlation.window_ms:
+            break
+          seen[other] = entry
+        else:
+          fired_key = (correlation.name, key_value)
+          fired = self._fired.get(fired_key)
+          if fired is not None and abs(ts_ms - fired) < correlation.window_ms:
+            continue
+          self._fired[fired_key] = ts_ms
+          self._fired.move_to_end(fired_key)
+          if self.max_keys and len(self._fired) > self.max_keys:
+            self._fired.popitem(last=False)
+          self.emitted += 1
+          completed.append(correlation.build_alert(key_value, alert, seen))
+    return completed
+
+  def _summary(self, key):
+    summary = self._summaries.get(key)
+    if summary is None:
+      summary = self._summaries[key] = {}
+      if self.max_keys and len(self._summaries) > self.max_keys:
+        self._summaries.popitem(last=False)
+    else:
+      self._summaries.move_to_end(key)
+    return summary
+
+  def stats(self):
+    return {"keys": len(self._summaries), "emitted": self.emitted}
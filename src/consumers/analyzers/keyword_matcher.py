@@ -0,0 +1,127 @@
+import re
+from collections import deque
+
+
+class KeywordMatcher:
+  """Case-insensitive multi-keyword search in a single pass (Aho-Corasick).
+
+  Keywords are compiled into one automaton whose transitions are keyed on
+  both cases of every character, so a message is scanned once, character by
+  character, without building a lowercased copy. Scan cost depends on the
+  message length, not on how many keywords are configured.
+
+  Failure links are folded into the transition table ahead of time: a state
+  only stores the transitions that differ from the root's, and every other
+  character falls back to the root row, so each character costs at most two
+  dict lookups.
+
+  For a handful of keywords, lowering the message once and running the
+  substring checks in C beats a Python-level scan, so sets of up to
+  SCAN_LIMIT keywords use that instead unless `automaton=True`.
+  """
+
+  SCAN_LIMIT = 24
+
+  def __init__(self, keywords, automaton=None):
+    self.keywords = tuple(dict.fromkeys(k.lower() for k in keywords if k))
+    if automaton is None:
+      automaton = len(self.keywords) > self.SCAN_LIMIT
+    if not automaton:
+      self.find_all = self._find_all_scan
+
+    goto = [{}]
+    outputs = {}
+    for keyword in self.keywords:
+      state = 0
+      for ch in keyword:
+        nxt = goto[state].get(ch)
+        if nxt is None:
+          nxt = len(goto)
+          goto.append({})
+          for variant in {ch, ch.upper()}:
+            if len(variant) == 1:
+              goto[state][variant] = nxt
+        state = nxt
+      outputs[state] = (keyword,)
+
+    # breadth-first, so a state's failure target is always finished first
+    root = goto[0]
+    rows = [{} for _ in goto]
+    fail = [0] * len(goto)
+    queue = deque(dict.fromkeys(root.values()))
+    while queue:
+      state = queue.popleft()
+      target = fail[state]
+      if target in outputs:
+        outputs[state] = outputs.get(state, ()) + outputs[target]
+
+      row = {**rows[target], **goto[state]}
+      rows[state] = {ch: nxt for ch, nxt in row.items() if root.get(ch, 0) != nxt}
+
+      # upper and lower case transitions share a child, visit it once
+      children = {child: ch for ch, child in goto[state].items()}
+      for child, ch in children.items():
+        fail[child] = rows[target].get(ch) or root.get(ch, 0)
+        queue.append(child)
+
+    self._root = root
+    self._rows = rows
+    self._outputs = outputs
+
+  def find_all(self, text):
+    """Distinct configured keywords found in text (case-insensitive)."""
+    root = self._root
+    rows = self._rows
+    outputs = self._outputs
+    state = 0
+    hits = None
+    for ch in text:
+      if state:
+        state = rows[state].get(ch) or root.get(ch, 0)
+      else:
+        state = root.get(ch, 0)
+        if not state:
+          continue
+      if state in outputs:
+        if hits is None:
+          hits = []
+        hits.extend(outputs[state])
+    if hits is None:
+      return ()
+    return tuple(dict.fromkeys(hits))
+
+  def _find_all_scan(self, text):
+    lowered = text.lower()
+    return tuple(keyword for keyword in self.keywords if keyword in lowered)
+
+  def __len__(self):
+    return len(self.keywords)
+
+
+# 13-19 digits, optionally grouped by single spaces or dashes
+_CARD_CANDIDATE = re.compile(r"(?<!\d)\d(?:[ -]?\d){12,18}(?!\d)")
+
+
+def _luhn_valid(digits):
+  total = 0
+  for i, ch in enumerate(reversed(digits)):
+    d = ord(ch) - 48
+    if i % 2:
+      d = d * 2 - 9 if d > 4 else d * 2
+    total += d
+  return total % 10 == 0
+
+
+def find_card_numbers(text):
+  """Card-number-like tokens in text, masked to their last four digits.
+
+  A token must be 13-19 digits and pass the Luhn check, which keeps order
+  ids and timestamps from matching. Raw numbers are never returned so they
+  can't leak into alerts.
+  """
+  hits = ()
+  for match in _CARD_CANDIDATE.finditer(text):
+    digits = match.group().replace(" ", "").replace("-", "")
+    if _luhn_valid(digits):
+      hits += ("*" * (len(digits) - 4) + digits[-4:],)
+  return hits
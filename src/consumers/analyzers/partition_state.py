@@ -0,0 +1,49 @@
+from consumers.analyzers.logs_analyzer import LogsAnalyzer
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+
+ANALYZER_TYPES = {
+  "logs": LogsAnalyzer,
+  "metrics": MetricsAnalyzer,
+  "transactions": TransactionsAnalyzer,
+}
+
+
+class PartitionState:
+  """Analyzer state for one topic-partition.
+
+  Analyzers are created on first use per source, so a shard only holds the
+  windows its partition's records have touched. A shard moves between
+  consumers as a unit: snapshot() on revoke, restore() on assign.
+
+  Windows keyed by a field the topic isn't partitioned by (rules.process_ids,
+  e.g. logs counted per user_id) would split each key's count across shards;
+  they are kept in `shared`, one WindowState for the whole process, which
+  is neither snapshotted nor handed over.
+  """
+
+  def __init__(self, rules, shared=None):
+    self.rules = rules
+    self.shared = shared
+    self.analyzers = {}
+
+  def analyzer(self, source):
+    analyzer = self.analyzers.get(source)
+    if analyzer is None:
+      analyzer = self.analyzers[source] = ANALYZER_TYPES[source](self.rules, self.shared)
+    return analyzer
+
+  def set_rules(self, rules):
+    self.rules = rules
+    return sum(analyzer.set_rules(rules) for analyzer in self.analyzers.values())
+
+  def snapshot(self):
+    return {source: analyzer.snapshot() for source, analyzer in self.analyzers.items()}
+
+  def restore(self, snapshot):
+    for source, state in snapshot.items():
+      if source in ANALYZER_TYPES:
+        self.analyzer(source).restore(state)
+
+  def stats(self):
+    return {source: analyzer.stats() for source, analyzer in self.analyzers.items()}
@@ -0,0 +1,730 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from string import Formatter
+
+from consumers.analyzers.baseline import StreamingBaseline
+from consumers.analyzers.correlation import Correlation
+from consumers.analyzers.keyword_matcher import KeywordMatcher, find_card_numbers
+from consumers.analyzers.sketch import HybridWindowCounter
+from consumers.analyzers.velocity import AmountVelocity
+from consumers.analyzers.window import MultiResolutionCounter, levels_for
+from consumers.config.settings import AlertConfig, AnalyzerConfig
+from consumers.utils.fx_rates import RateTable
+from consumers.utils.timestamps import parse_epoch_ms
+
+
+# predicate templates; {f} is the field expression and {v} the bound value
+_OPS = {
+  "==": "{f} == {v}",
+  "!=": "{f} != {v}",
+  ">": "{f} > {v}",
+  ">=": "{f} >= {v}",
+  "<": "{f} < {v}",
+  "<=": "{f} <= {v}",
+  "in": "{f} in {v}",
+  "contains": "{v} in {f}.lower()",
+  # matchers bind their hits, which alerts can reference as "$hits"
+  "keywords": "(hits := {v}.find_all({f}))",
+  "card_number": "(hits := _find_card_numbers({f}))",
+}
+_MATCHERS = ("keywords", "card_number")
+# range tests several rules share are one bisect over their sorted
+# thresholds: the bisect, and whether passing thresholds sort first
+_RANGES = {
+  ">": ("_bisect_left", True),
+  ">=": ("_bisect_right", True),
+  "<": ("_bisect_right", False),
+  "<=": ("_bisect_left", False),
+}
+
+
+def _field(name):
+  if not name.isidentifier():
+    raise ValueError(f"invalid event field in rule: {name!r}")
+  return name
+
+
+def _resolve(value, params):
+  # "${name}" is substituted from params once, at compile time
+  if isinstance(value, str) and value.startswith("${") and value.endswith("}"):
+    return params[value[2:-1]]
+  if isinstance(value, list):
+    return [_resolve(v, params) for v in value]
+  return value
+
+
+def _cost(condition):
+  # comparisons first, then substring tests, matchers last
+  if condition.op in _MATCHERS:
+    return 2
+  return condition.op == "contains"
+
+
+def _ordered(value):
+  # thresholds of one range index must sort together
+  if isinstance(value, str):
+    return str
+  if isinstance(value, (int, float)) and not isinstance(value, bool):
+    return float
+  return None
+
+
+def _shared(items, key):
+  # index keys that lead at least two of the items
+  counts = {}
+  for _, conditions in items:
+    for index in {key(cond) for cond in conditions} - {None}:
+      counts[index] = counts.get(index, 0) + 1
+  return {index for index, count in counts.items() if count > 1}
+
+
+def _split(items, key):
+  # items by the index key and value of their first condition key() takes,
+  # that condition dropped; the rest as they are
+  indexed = {}
+  rest = []
+  for rule, conditions in items:
+    lead = next((cond for cond in conditions if key(cond) is not None), None)
+    if lead is None:
+      rest.append((rule, conditions))
+      continue
+    values = indexed.setdefault(key(lead), {})
+    values.setdefault(lead.value, []).append(
+      (rule, [cond for cond in conditions if cond is not lead]))
+  return indexed, rest
+
+
+class _Condition:
+  __slots__ = ("field", "op", "value", "expr", "local", "code")
+
+  def __init__(self, field, op, value, expr, local, code):
+    self.field = field
+    self.op = op
+    self.value = value
+    self.expr = expr
+    self.local = local
+    self.code = code
+
+
+class _Codegen:
+  """Shared namespace for generated rule code; rule values are bound as
+  names, never pasted into the source."""
+
+  def __init__(self):
+    self.namespace = {
+      "_parse_epoch_ms": parse_epoch_ms,
+      "_find_card_numbers": find_card_numbers,
+      "_bisect_left": bisect_left,
+      "_bisect_right": bisect_right,
+    }
+
+  def bind(self, value):
+    name = f"_v{len(self.namespace)}"
+    self.namespace[name] = value
+    return name
+
+  def values(self, spec, expr):
+    # "$field" copies a field onto the alert, anything else is a literal
+    items = []
+    for name, value in (spec or {}).items():
+      if isinstance(value, str) and value.startswith("$"):
+        items.append(f"{self.bind(name)}: {expr(value[1:])}")
+      else:
+        items.append(f"{self.bind(name)}: {self.bind(value)}")
+    return "{" + ", ".join(items) + "}"
+
+  def function(self, body, args="e"):
+    return eval(f"lambda {args}: {body}", self.namespace)
+
+  def alert_call(self, rule):
+    args = ", ".join(("e",) + rule.alert_args)
+    return f"alerts.append({self.bind(rule.build_alert)}({args}))"
+
+  def condition(self, conditions):
+    return " and ".join(cond.code for cond in sorted(conditions, key=_cost))
+
+  def node(self, items, lines, params, indent="  "):
+    """Emit one branch of a source's rules; items are (rule, conditions
+    still to test), params the arguments every branch takes.
+
+    Rules are split on a condition the branch answers for all of them at
+    once: equality tests dispatch on the field's value, range tests several
+    rules share on a bisect of their sorted thresholds. Each part compiles
+    into a function of its own, recursively, without the condition that led
+    there; rules left without one are inlined. Returns the rules in the
+    order they raise alerts, each window's rules as one list.
+    """
+    equal, rest = _split(
+      items, lambda cond: cond.expr if cond.op == "==" and not cond.local else None)
+
+    def range_key(cond):
+      if cond.op in _RANGES and cond.field != "hits" and _ordered(cond.value):
+        return (cond.expr, cond.op, _ordered(cond.value))
+      return None
+    compared = _shared(rest, range_key)
+    ranges, rest = _split(
+      rest, lambda cond: range_key(cond) if range_key(cond) in compared else None)
+
+    targets = self.inline(rest, lines, indent)
+    for expr, values in equal.items():
+      branches = {}
+      for value, group in values.items():
+        branches[value] = self.branch(group, params, targets)
+      lines.append(f"{indent}branch = {self.bind(branches)}.get({expr})")
+      lines.append(f"{indent}if branch is not None: branch({params})")
+    for (expr, op, _), values in ranges.items():
+      bisect, passing_first = _RANGES[op]
+      thresholds = sorted(values)
+      branches = [self.branch(values[value], params, targets) for value in thresholds]
+      cut = f"{bisect}({self.bind(thresholds)}, value)"
+      run = f"{self.bind(branches)}[{':' + cut if passing_first else cut + ':'}]"
+      lines.append(f"{indent}value = {expr}")
+      # NaN passes no test but would bisect to one end or the other
+      lines.append(f"{indent}for branch in ({run} if value == value else ()): branch({params})")
+    return targets
+
+  def branch(self, items, params, targets):
+    body = [f"def _match({params}):", "  counters = windows.counters"]
+    targets.extend(self.node(items, body, params))
+    return self.define(body)
+
+  def inline(self, items, lines, indent):
+    # conditions, window counting and alert building are inlined, so an
+    # event costs one call per branch no matter how many rules it holds.
+    # Rules sharing a counter add to it once and query it once per width.
+    targets = []
+    groups = {}
+    for rule, conditions in items:
+      if rule.window_id is None:
+        targets.append(_Target(rule, conditions))
+      elif rule.window_id in groups:
+        groups[rule.window_id].add(rule)
+      else:
+        groups[rule.window_id] = _Target(rule, conditions)
+        targets.append(groups[rule.window_id])
+
+    for target in targets:
+      body = indent
+      if target.conditions:
+        lines.append(f"{indent}if {self.condition(target.conditions)}:")
+        body += "  "
+      if target.window_id is None:
+        lines.append(f"{body}{self.alert_call(target.rules[0])}")
+        continue
+
+      window = self.bind(target.window_id)
+      lines.append(f"{body}if ts_ms is None: ts_ms = _parse_epoch_ms(e.timestamp)")
+      # `is None`, not `or`: an empty counter is falsy, and rebuilding a
+      # sketch-backed one per event costs its whole table
+      lines.append(f"{body}counter = counters.get({window})")
+      lines.append(f"{body}if counter is None: counter = windows.create({window})")
+      add = f"counter.add(e.{target.window_key}, ts_ms)"
+      # rules whose width is the counter's finest level use what add()
+      # returns, the rest query their own width
+      lines.append(f"{body}count = {add}" if target.rules[0].window_full else f"{body}{add}")
+      seconds = None
+      for rule in target.rules:
+        if not rule.window_full and rule.window_seconds != seconds:
+          seconds = rule.window_seconds
+          lines.append(f"{body}count = counter.count(e.{target.window_key}, {self.bind(seconds)})")
+        lines.append(f"{body}if count >= {self.bind(rule.min_count)}: {self.alert_call(rule)}")
+    return [target.rules for target in targets]
+
+  def define(self, lines):
+    scope = {}
+    exec("\n".join(lines), self.namespace, scope)
+    return scope.popitem()[1]
+
+
+class Rule:
+  __slots__ = (
+    "name", "source", "predicates", "conditions",
+    "window_id", "window_key", "window_seconds", "window_full", "min_count",
+    "alert_args", "build_alert",
+  )
+
+  def __init__(self, source, spec, params, gen, derived=()):
+    self.name = spec["name"]
+    self.source = source
+
+    # derived values (baseline scores, velocities, matcher hits) are locals
+    # of the generated evaluator, everything else is an event attribute
+    local_names = {"hits", *derived}
+    used_locals = []
+
+    def expr(name):
+      if name in local_names:
+        if name not in used_locals:
+          used_locals.append(name)
+        return name
+      return f"e.{_field(name)}"
+
+    # (field, op, value) of every condition, for evaluators that don't run
+    # the generated code (see analyzers/batch.py)
+    self.predicates = []
+    self.conditions = []
+    uses_hits = False
+    for cond in spec.get("when", []):
+      field, op, value = cond["field"], cond["op"], _resolve(cond.get("value"), params)
+      self.predicates.append((field, op, value))
+      if op == "contains":
+        value = value.lower()
+      elif op == "keywords":
+        value = KeywordMatcher(value)
+      elif op not in _OPS:
+        raise ValueError(f"unknown op in rule {self.name!r}: {op!r}")
+      if op in _MATCHERS:
+        uses_hits = True
+      code = "(" + _OPS[op].format(f=expr(field), v=gen.bind(value)) + ")"
+      self.conditions.append(
+        _Condition(field, op, value, expr(field), field in local_names, code))
+    # conditions see every local; only those alerts copy are passed on
+    used_locals.clear()
+
+    window = spec.get("window")
+    if window:
+      conditions = json.dumps(spec.get("when", []), sort_keys=True)
+      self.window_key = _field(window["key"])
+      self.window_seconds = window["seconds"]
+      self.min_count = window["min_count"]
+      exact_from = window.get("exact_from") if AnalyzerConfig.SKETCH_WINDOWS else None
+      if exact_from is not None:
+        # a sketch window counts one width and is shared only by rules with
+        # the same key, width and conditions; the pre-threshold is part of
+        # the id because it changes the counter's state
+        self.window_id = (source, window["key"], self.window_seconds, conditions, exact_from)
+        self.window_full = True
+      else:
+        # widened to every rule counting the same key and conditions by
+        # _share_windows, once all rules are compiled
+        levels = levels_for(self.window_seconds)
+        self.window_id = (source, window["key"], levels, conditions, None)
+        self.window_full = len(levels) == 1
+    else:
+      self.window_id = None
+
+    message_fields = {
+      field: '", ".join(hits)' if field == "hits" else expr(field)
+      for _, field, _, _ in Formatter().parse(spec["alert_message"]) if field
+    }
+    if "hits" in message_fields:
+      expr("hits")
+    message = gen.bind(spec["alert_message"]) + ".format(" + ", ".join(
+      f"{field}={expr}" for field, expr in message_fields.items()) + ")"
+
+    header = {
+      "is_alert": True,
+      "alert_type": spec["alert_type"],
+      "alert_level": spec["alert_level"],
+      "alert_title": spec["alert_title"],
+      "rule": self.name,
+    }
+    body = (
+      f"{{**{gen.bind(header)}, 'alert_message': {message}, "
+      f"**{gen.values(spec.get('fields'), expr)}, "
+      f"'tags': {gen.values(spec.get('tags'), expr)}, "
+      f"'metrics': {gen.values(spec.get('metrics'), expr)}, "
+      f"'timestamp': e.timestamp}}"
+    )
+    if "hits" in used_locals and not uses_hits:
+      raise ValueError(f"rule {self.name!r} uses hits without a keywords or card_number condition")
+    self.alert_args = tuple(used_locals)
+    self.build_alert = gen.function(body, args=", ".join(("e",) + self.alert_args))
+
+
+class _Target:
+  """A rule, or the rules counting one window: the counter's own width
+  first, then by width and threshold."""
+
+  __slots__ = ("conditions", "window_id", "window_key", "rules")
+
+  def __init__(self, rule, conditions):
+    self.conditions = conditions
+    self.window_id = rule.window_id
+    self.window_key = rule.window_key if rule.window_id is not None else None
+    self.rules = [rule]
+
+  def add(self, rule):
+    self.rules.append(rule)
+    self.rules.sort(key=_window_order)
+
+
+class RuleSet:
+  """Rules compiled once into per-source evaluator functions.
+
+  Each source gets one generated function holding its rules as a decision
+  tree (see _Codegen.node): rules are indexed on equality tests (e.g.
+  level == "ERROR") and on range tests they share, so an event only
+  evaluates the branches that can fire for it. Within a rule, comparisons
+  run before matchers.
+
+  A source with a baseline updates it first, once per event, and its scores
+  (z_<field>, pct_<field>) are locals every rule of the source can use.
+  Likewise a source with a velocity spec converts the event's amount
+  (norm_amount) and updates the key's rolling sums (sum_<w>, count_<w>).
+
+  Window counters, baselines and velocities live in a WindowState owned by
+  the caller, which lets a rule set be swapped without losing state. State
+  keyed by a field the source's messages are not keyed by is listed in
+  process_ids: one key's events reach several partitions' WindowStates, so
+  that state is kept in a process-wide one they share. Sketch windows are
+  listed too, so a process holds one fixed-size sketch per window rather
+  than one per partition.
+  Correlations join alerts across sources and are run by a Correlator, not
+  by the evaluators.
+  """
+
+  def __init__(self, rules, gen, baselines=None, correlations=(), velocities=None, rates=None):
+    self.rules = rules
+    self.correlations = list(correlations)
+    baselines = self.baselines = baselines or {}
+    velocities = self.velocities = velocities or {}
+    # polled by the consumer, so rate changes don't need a rules reload
+    self.rates = rates
+    self.state_ids = {rule.window_id for rule in rules if rule.window_id}
+    self.state_ids.update(baseline.id for baseline in baselines.values())
+    self.state_ids.update(velocity.id for velocity in velocities.values())
+    keyed = [(rule.source, rule.window_key, rule.window_id) for rule in rules if rule.window_id]
+    keyed += [(source, state.key, state.id)
+              for states in (baselines, velocities) for source, state in states.items()]
+    self.process_ids = {
+      state_id for source, key, state_id in keyed
+      if key != AnalyzerConfig.MESSAGE_KEYS.get(source, key)
+    }
+    # window_id[4] is exact_from, set for sketch windows only
+    self.process_ids.update(rule.window_id for rule in rules
+                            if rule.window_id and rule.window_id[4] is not None)
+    self.process_sources = {state_id[0] for state_id in self.process_ids}
+
+    self._evaluators = {}
+    self._targets = {}
+    for source in dict.fromkeys(rule.source for rule in rules):
+      source_rules = [rule for rule in rules if rule.source == source]
+      lines = [
+        "def _evaluate(e, windows):",
+        "  alerts = []",
+        "  counters = windows.counters",
+        "  ts_ms = None",
+      ]
+      baseline = baselines.get(source)
+      velocity = velocities.get(source)
+      params = ", ".join(("e", "windows", "alerts", "ts_ms") + tuple(_derived(baseline, velocity)))
+      if baseline is not None:
+        baseline_id = gen.bind(baseline.id)
+        values = ", ".join(f"e.{field}" for field in baseline.fields)
+        lines.append(f"  baseline = windows.baselines.get({baseline_id})")
+        lines.append(f"  if baseline is None: baseline = windows.create_baseline({baseline_id})")
+        lines.append(
+          f"  {', '.join(baseline.derived)}, = baseline.update(e.{baseline.key}, {values})")
+      if velocity is not None:
+        velocity_id = gen.bind(velocity.id)
+        if velocity.currency_field is None:
+          lines.append(f"  norm_amount = float(e.{velocity.field})")
+        else:
+          # the rate is looked up inline; convert() only handles (and
+          # reports) a currency without one
+          amount, currency = f"e.{velocity.field}", f"e.{velocity.currency_field}"
+          lines.append(f"  rate = {gen.bind(rates)}.rates.get({currency})")
+          lines.append(
+            f"  norm_amount = {amount} * rate if rate is not None "
+            f"else {gen.bind(rates.convert)}({amount}, {currency})")
+        lines.append("  ts_ms = _parse_epoch_ms(e.timestamp)")
+        lines.append(f"  velocity = windows.velocities.get({velocity_id})")
+        lines.append(f"  if velocity is None: velocity = windows.create_velocity({velocity_id})")
+        lines.append(
+          f"  {', '.join(velocity.derived[1:])}, = velocity.update(e.{velocity.key}, ts_ms, norm_amount)")
+
+      self._targets[source] = gen.node(
+        [(rule, rule.conditions) for rule in source_rules], lines, params)
+      lines.append("  return alerts")
+      self._evaluators[source] = gen.define(lines)
+
+  def evaluator(self, source):
+    """Return a fast `(event, windows) -> alerts` function for one source."""
+    return self._evaluators.get(source, _no_rules)
+
+  def targets(self, source):
+    """A source's rules in the order its evaluator raises their alerts, the
+    rules counting one window as one list."""
+    return self._targets.get(source, [])
+
+
+def _no_rules(event, windows):
+  return []
+
+
+def _window_order(rule):
+  return (not rule.window_full, rule.window_seconds, rule.min_count)
+
+
+def _share_windows(rules):
+  # rules counting the same key under the same conditions share one
+  # multi-resolution counter, with the levels the widest of them needs
+  widest = {}
+  for rule in rules:
+    if rule.window_id is not None and rule.window_id[4] is None:
+      source, key, _, conditions, _ = rule.window_id
+      stream = (source, key, conditions)
+      widest[stream] = max(widest.get(stream, 0), rule.window_seconds)
+  for rule in rules:
+    if rule.window_id is not None and rule.window_id[4] is None:
+      source, key, _, conditions, _ = rule.window_id
+      levels = levels_for(widest[(source, key, conditions)])
+      rule.window_id = (source, key, levels, conditions, None)
+      rule.window_full = len(levels) == 1 and levels == levels_for(rule.window_seconds)
+
+
+def _locals(rule):
+  """Derived values a rule's conditions or alert read."""
+  return {cond.field for cond in rule.conditions if cond.local} | set(rule.alert_args)
+
+
+def _derived(baseline, velocity):
+  # locals a source's evaluator computes before its rules run
+  return ((baseline.derived if baseline is not None else ())
+          + (velocity.derived if velocity is not None else ()))
+
+
+class Baseline:
+  """A source's baseline spec from the rules file."""
+
+  def __init__(self, source, spec):
+    self.key = _field(spec["key"])
+    self.fields = tuple(_field(field) for field in spec["fields"])
+    self.derived = tuple(
+      name for field in self.fields for name in (f"z_{field}", f"pct_{field}"))
+    # the id carries everything needed to build the baseline, so state
+    # survives a rules reload as long as the spec is unchanged
+    self.id = (
+      source, "baseline", self.key, self.fields, spec.get("alpha", 0.02),
+      tuple(spec.get("quantiles", (0.5, 0.99))), spec.get("warmup", 50),
+    )
+
+
+def _window_label(seconds):
+  for unit, width in (("h", 3600), ("m", 60)):
+    if seconds % width == 0:
+      return f"{seconds // width}{unit}"
+  return f"{seconds}s"
+
+
+class Velocity:
+  """A source's velocity spec from the rules file: rolling sum and count of
+  an amount per key over several windows, the amount converted to the rate
+  table's base currency when `currency_field` is set."""
+
+  def __init__(self, source, spec):
+    self.key = _field(spec["key"])
+    self.field = _field(spec["field"])
+    currency_field = spec.get("currency_field")
+    self.currency_field = _field(currency_field) if currency_field else None
+    self.windows = tuple(int(seconds) for seconds in spec["windows"])
+    if not self.windows or min(self.windows) <= 0:
+      raise ValueError(f"velocity for {source!r} needs positive windows")
+    labels = [_window_label(seconds) for seconds in self.windows]
+    if len(set(labels)) != len(labels):
+      raise ValueError(f"velocity for {source!r} lists a window twice")
+    self.derived = ("norm_amount",) + tuple(
+      name for label in labels for name in (f"sum_{label}", f"count_{label}"))
+    self.id = (
+      source, "velocity", self.key, self.field, self.currency_field,
+      self.windows, spec.get("buckets", 10),
+    )
+
+
+class WindowState:
+  """Window counters, baselines and velocities by id, created on first use.
+
+  State whose id is in `shared_ids` is created in the process-wide `shared`
+  WindowState and only referenced here; snapshots, restores and stats leave
+  it out, as it is not this state's to hand over. `lock` guards a shared
+  WindowState against evaluators on several worker threads.
+  """
+
+  def __init__(self, shared=None):
+    self.counters = {}
+    self.baselines = {}
+    self.velocities = {}
+    self.shared = shared
+    self.shared_ids = frozenset()
+    self.lock = threading.Lock()
+
+  def _from_shared(self, states, create, state_id):
+    # referenced here too, so evaluators find it with one lookup
+    state = getattr(self.shared, states).get(state_id)
+    if state is None:
+      state = getattr(self.shared, create)(state_id)
+    getattr(self, states)[state_id] = state
+    return state
+
+  def create(self, window_id):
+    if window_id in self.shared_ids:
+      return self._from_shared("counters", "create", window_id)
+    # window_id[2] is the width of a sketch window, the levels of a shared one
+    if window_id[4] is not None:
+      counter = HybridWindowCounter(
+        window_id[2], window_id[4],
+        epsilon=AnalyzerConfig.SKETCH_EPSILON,
+        delta=AnalyzerConfig.SKETCH_DELTA,
+        max_keys=AnalyzerConfig.MAX_KEYS,
+        idle_ttl_seconds=AnalyzerConfig.IDLE_TTL_SECONDS
+      )
+    else:
+      counter = MultiResolutionCounter(
+        window_id[2],
+        max_keys=AnalyzerConfig.MAX_KEYS,
+        idle_ttl_seconds=AnalyzerConfig.IDLE_TTL_SECONDS
+      )
+    self.counters[window_id] = counter
+    return counter
+
+  def create_baseline(self, baseline_id):
+    if baseline_id in self.shared_ids:
+      return self._from_shared("baselines", "create_baseline", baseline_id)
+    _, _, _, fields, alpha, quantiles, warmup = baseline_id
+    baseline = StreamingBaseline(
+      fields, alpha=alpha, quantiles=quantiles, warmup=warmup,
+      max_keys=AnalyzerConfig.MAX_KEYS
+    )
+    self.baselines[baseline_id] = baseline
+    return baseline
+
+  def create_velocity(self, velocity_id):
+    if velocity_id in self.shared_ids:
+      return self._from_shared("velocities", "create_velocity", velocity_id)
+    _, _, _, _, _, windows, buckets = velocity_id
+    velocity = AmountVelocity(windows, buckets=buckets, max_keys=AnalyzerConfig.MAX_KEYS)
+    self.velocities[velocity_id] = velocity
+    return velocity
+
+  def snapshot(self):
+    return {
+      "windows": {window_id: counter.snapshot() for window_id, counter in self._own(self.counters)},
+      "baselines": {baseline_id: baseline.snapshot()
+                    for baseline_id, baseline in self._own(self.baselines)},
+      "velocities": {velocity_id: velocity.snapshot()
+                     for velocity_id, velocity in self._own(self.velocities)},
+    }
+
+  def restore(self, snapshot):
+    # shared state in a snapshot from before it was shared holds one
+    # partition's part of the counts; it is rebuilt from the stream instead
+    for window_id, state in snapshot["windows"].items():
+      if window_id not in self.shared_ids:
+        self.create(window_id).restore(state)
+    for baseline_id, state in snapshot["baselines"].items():
+      if baseline_id not in self.shared_ids:
+        self.create_baseline(baseline_id).restore(state)
+    # absent from snapshots written before velocities existed
+    for velocity_id, state in snapshot.get("velocities", {}).items():
+      if velocity_id not in self.shared_ids:
+        self.create_velocity(velocity_id).restore(state)
+
+  def _own(self, states):
+    return [(state_id, state) for state_id, state in states.items()
+            if state_id not in self.shared_ids]
+
+  def retain(self, state_ids):
+    """Drop state no rule uses any more; returns how many were dropped."""
+    dropped = 0
+    for states in (self.counters, self.baselines, self.velocities):
+      stale = [state_id for state_id in states if state_id not in state_ids]
+      for state_id in stale:
+        del states[state_id]
+      dropped += len(stale)
+    return dropped
+
+  def stats(self):
+    stats = {
+      f"{window_id[1]}/{counter.window_seconds}s": counter.stats()
+      for window_id, counter in self._own(self.counters)
+    }
+    for baseline_id, baseline in self._own(self.baselines):
+      stats[f"baseline/{baseline_id[2]}"] = baseline.stats()
+    for velocity_id, velocity in self._own(self.velocities):
+      stats[f"velocity/{velocity_id[2]}"] = velocity.stats()
+    return stats
+
+
+def compile_rules(config):
+  params = {"ALERT_THRESHOLD": AlertConfig.THRESHOLD, **config.get("params", {})}
+  gen = _Codegen()
+  baselines = {
+    source: Baseline(source, spec)
+    for source, spec in config.get("baselines", {}).items()
+  }
+  velocities = {
+    source: Velocity(source, spec)
+    for source, spec in config.get("velocity", {}).items()
+  }
+  rules = [
+    Rule(source, spec, params, gen,
+         _derived(baselines.get(source), velocities.get(source)))
+    for source, specs in config.get("sources", {}).items()
+    for spec in specs
+    if spec.get("enabled", True)
+  ]
+  if not AnalyzerConfig.VELOCITY_RULES and velocities:
+    # opt-in: the rules reading velocities are left out, and so are the
+    # velocity updates they would need
+    derived = {name for velocity in velocities.values() for name in velocity.derived}
+    rules = [rule for rule in rules if not _locals(rule) & derived]
+    velocities = {}
+  rates = None
+  if any(velocity.currency_field for velocity in velocities.values()):
+    rates = RateTable(
+      AnalyzerConfig.RATES_PATH, AnalyzerConfig.RATES_RELOAD_SECONDS)
+  _share_windows(rules)
+  correlations = [
+    Correlation(spec)
+    for spec in config.get("correlations", [])
+    if spec.get("enabled", True)
+  ]
+  return RuleSet(rules, gen, baselines, correlations, velocities, rates)
+
+
+def load_rules(path=None):
+  with open(path or AnalyzerConfig.RULES_PATH) as f:
+    return compile_rules(json.load(f))
+
+
+class RulesWatcher:
+  """Recompiles the rules file when its mtime changes.
+
+  `poll()` is cheap enough to call every poll loop: it stats the file at most
+  once per `interval` seconds. A file that fails to load or compile is
+  reported and skipped, so the rule set in use is never replaced by a broken
+  one.
+  """
+
+  def __init__(self, path=None, interval=None):
+    self.path = path or AnalyzerConfig.RULES_PATH
+    self.interval = AnalyzerConfig.RULES_RELOAD_SECONDS if interval is None else interval
+    self._mtime = self._stat()
+    self._next_check = time.monotonic() + self.interval
+
+  def _stat(self):
+    try:
+      return os.stat(self.path).st_mtime_ns
+    except OSError:
+      return None
+
+  def poll(self):
+    """Return a freshly compiled RuleSet if the file changed, else None."""
+    if not self.interval or time.monotonic() < self._next_check:
+      return None
+    self._next_check = time.monotonic() + self.interval
+
+    mtime = self._stat()
+    if mtime is None or mtime == self._mtime:
+      return None
+    self._mtime = mtime
+
+    try:
+      return load_rules(self.path)
+    except (OSError, ValueError, KeyError, TypeError, SyntaxError) as e:
+      print(f"[RULES] Reload of {self.path} failed, keeping current rules: {e}")
+      return None
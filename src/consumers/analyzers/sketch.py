@@ -0,0 +1,256 @@
+import math
+from array import array
+from operator import sub
+
+from consumers.analyzers.window import SlidingWindowCounter
+
+_MIX = 0x9E3779B97F4A7C15
+_MASK = (1 << 64) - 1
+
+
+class WindowedCountMinSketch:
+  """Approximate per-key event counts over a sliding window in fixed memory.
+
+  A Count-Min Sketch of `depth` rows by `width` counters is kept per time
+  bucket, plus a running sum of the buckets in the window, so an update or a
+  query touches `depth` counters no matter how many keys are live. Sizing
+  follows the usual bounds: with width = ceil(e / epsilon) and
+  depth = ceil(ln(1 / delta)), an estimate is never below the true window
+  count and exceeds it by more than epsilon * (events in window) with
+  probability at most delta.
+
+  Updates are conservative: a bucket's counters for a key are only raised
+  to the key's new estimate in that bucket, not each bumped by the amount,
+  which keeps the bound above and cuts the over-count of keys sharing
+  counters with heavy ones by a large factor.
+  """
+
+  def __init__(self, window_seconds, bucket_seconds=10, epsilon=0.0001, delta=0.01):
+    self.window_seconds = window_seconds
+    self.bucket_seconds = bucket_seconds
+    self.num_buckets = max(1, window_seconds // bucket_seconds)
+    self.width = math.ceil(math.e / epsilon)
+    self.depth = max(1, math.ceil(math.log(1 / delta)))
+    self._bucket_ms = bucket_seconds * 1000
+    self._buckets = [self._rows() for _ in range(self.num_buckets)]
+    self._totals = self._rows()
+    self._bucket_events = [0] * self.num_buckets
+    self._head = None
+    self.events = 0  # events currently in the window
+
+  def _rows(self):
+    return [array('i', bytes(4 * self.width)) for _ in range(self.depth)]
+
+  def _hash(self, key):
+    # double hashing over one mixed 64-bit hash; ints hash to themselves, so
+    # the mix is what spreads sequential user ids across the row. Row i uses
+    # cell (h1 + i * h2) % width.
+    h = (hash(key) * _MIX) & _MASK
+    return h & 0xFFFFFFFF, (h >> 32) | 1
+
+  def _cells(self, key):
+    h, step = self._hash(key)
+    width = self.width
+    return [(h + i * step) % width for i in range(self.depth)]
+
+  def add(self, key, ts_ms, amount=1):
+    """Record events for key, return the estimated window count."""
+    bucket = ts_ms // self._bucket_ms
+    if self._head is None or bucket > self._head:
+      self._advance(bucket)
+    elif bucket <= self._head - self.num_buckets:
+      # older than the whole window, nothing to count
+      return self.estimate(key)
+
+    h, step = self._hash(key)
+    width = self.width
+    index = bucket % self.num_buckets
+    slot = self._buckets[index]
+    cells = []
+    target = None
+    for slot_row in slot:
+      cell = h % width
+      cells.append(cell)
+      if target is None or slot_row[cell] < target:
+        target = slot_row[cell]
+      h += step
+    target += amount
+
+    estimate = None
+    for slot_row, total_row, cell in zip(slot, self._totals, cells):
+      raised = target - slot_row[cell]
+      if raised > 0:
+        slot_row[cell] = target
+        total_row[cell] += raised
+      total = total_row[cell]
+      if estimate is None or total < estimate:
+        estimate = total
+    self._bucket_events[index] += amount
+    self.events += amount
+    return estimate
+
+  def estimate(self, key):
+    return min(map(array.__getitem__, self._totals, self._cells(key)))
+
+  def history(self, key):
+    """[(bucket start ms, estimate)] for key's non-empty window buckets,
+    oldest first. Each is at least the key's true count in its bucket, and
+    they sum to at most estimate(key)."""
+    if self._head is None:
+      return []
+    cells = self._cells(key)
+    n = self.num_buckets
+    history = []
+    for b in range(self._head - n + 1, self._head + 1):
+      count = min(map(array.__getitem__, self._buckets[b % n], cells))
+      if count:
+        history.append((b * self._bucket_ms, count))
+    return history
+
+  def _advance(self, bucket):
+    if self._head is not None and bucket - self._head >= self.num_buckets:
+      # the whole window slid past
+      self._buckets = [self._rows() for _ in range(self.num_buckets)]
+      self._totals = self._rows()
+      self._bucket_events = [0] * self.num_buckets
+      self.events = 0
+    elif self._head is not None:
+      # subtract the buckets the window slid past from the running totals
+      for b in range(self._head + 1, bucket + 1):
+        index = b % self.num_buckets
+        slot = self._buckets[index]
+        self.events -= self._bucket_events[index]
+        self._bucket_events[index] = 0
+        self._totals = [array('i', map(sub, total, row))
+                        for total, row in zip(self._totals, slot)]
+        self._buckets[index] = self._rows()
+    self._head = bucket
+
+  def memory_bytes(self):
+    return (self.num_buckets + 1) * self.depth * self.width * 4
+
+  def snapshot(self):
+    return {
+      "shape": (self.num_buckets, self.depth, self.width),
+      "head": self._head,
+      "bucket_events": list(self._bucket_events),
+      "buckets": [[row.tobytes() for row in slot] for slot in self._buckets],
+      "totals": [row.tobytes() for row in self._totals],
+    }
+
+  def restore(self, state):
+    if tuple(state["shape"]) != (self.num_buckets, self.depth, self.width):
+      raise ValueError("snapshot sketch shape does not match this sketch")
+    self._head = state["head"]
+    self._bucket_events = list(state["bucket_events"])
+    self.events = sum(self._bucket_events)
+    self._buckets = [[array('i', row) for row in slot] for slot in state["buckets"]]
+    self._totals = [array('i', row) for row in state["totals"]]
+
+
+class HybridWindowCounter:
+  """SlidingWindowCounter-compatible counter for high-cardinality keys.
+
+  Every key is counted in a WindowedCountMinSketch. Once a key's estimate
+  reaches `exact_from`, it is promoted to an exact SlidingWindowCounter and
+  counted exactly from then on; idle exact keys expire or are evicted as
+  usual and fall back to the sketch. Memory is the fixed sketch plus one
+  ring per key that got close to a threshold.
+
+  A promoted key is seeded from its per-bucket sketch estimates, each at the
+  end of its sketch bucket, so seeded events age out of the exact window at
+  most one sketch bucket after the events they stand for. Counts are never
+  below the true count, so a threshold is not missed (short of a key being
+  evicted from the exact counter, as with a plain SlidingWindowCounter).
+  Sketch collisions can promote a key early, which over-counts it by at most
+  exact_from - 1 until the seed ages out; how often that happens depends on
+  events in window / width, see bench_sketch.
+  """
+
+  # the sketch holds one table per bucket, so it slides in coarser steps
+  # than the exact counter; it keeps one bucket more than the width, so its
+  # window never starts after the exact one and expiry is late, not early
+  SKETCH_BUCKETS = 6
+
+  def __init__(self, window_seconds, exact_from, bucket_seconds=10,
+               epsilon=0.0001, delta=0.01, max_keys=None, idle_ttl_seconds=0):
+    self.window_seconds = window_seconds
+    self.exact_from = exact_from
+    sketch_seconds = max(bucket_seconds, window_seconds // self.SKETCH_BUCKETS)
+    self.sketch = WindowedCountMinSketch(
+      window_seconds + sketch_seconds, sketch_seconds, epsilon, delta)
+    self.exact = SlidingWindowCounter(
+      window_seconds, bucket_seconds, max_keys=max_keys,
+      idle_ttl_seconds=idle_ttl_seconds)
+    self.promoted_keys = 0
+
+  def add(self, key, ts_ms, amount=1):
+    if key in self.exact:
+      self.sketch.add(key, ts_ms, amount)
+      return self.exact.add(key, ts_ms, amount)
+
+    estimate = self.sketch.add(key, ts_ms, amount)
+    if estimate < self.exact_from:
+      return estimate
+    # the per-bucket estimates are tighter than the running totals, and a
+    # key they keep below exact_from stays in the sketch
+    history = self.sketch.history(key)
+    estimate = sum(count for _, count in history)
+    if estimate < self.exact_from:
+      return estimate
+    self.promoted_keys += 1
+    return self._seed(key, ts_ms, history, amount)
+
+  def _seed(self, key, ts_ms, history, amount):
+    # a key not yet promoted had a true count below exact_from at its
+    # previous event, so the seed is capped at exact_from - 1 + amount;
+    # trimming the oldest buckets first keeps every suffix of the seed, and
+    # so the count after any bucket ages out, at or above the true count
+    room = self.exact_from - 1 + amount
+    seeds = []
+    for start_ms, count in reversed(history):
+      if room <= 0:
+        break
+      seeds.append((start_ms, min(count, room)))
+      room -= count
+    # no later than the newest event seen, so the exact window doesn't
+    # slide ahead of the stream
+    newest_ms = ts_ms
+    if self.exact.watermark is not None:
+      newest_ms = max(newest_ms, (self.exact.watermark + 1) * self.exact.bucket_seconds * 1000 - 1)
+    last_ms = self.sketch.bucket_seconds * 1000 - 1
+    count = 0
+    for start_ms, seed in reversed(seeds):
+      count = self.exact.add(key, min(start_ms + last_ms, newest_ms), seed)
+    return count
+
+  def count(self, key):
+    if key in self.exact:
+      return self.exact.count(key)
+    return self.sketch.estimate(key)
+
+  def stats(self):
+    return {
+      **self.exact.stats(),
+      "promoted_keys": self.promoted_keys,
+      "sketch_bytes": self.sketch.memory_bytes(),
+      "sketch_events": self.sketch.events,
+    }
+
+  def snapshot(self):
+    return {
+      "sketch": self.sketch.snapshot(),
+      "exact": self.exact.snapshot(),
+      "promoted_keys": self.promoted_keys,
+    }
+
+  def restore(self, state):
+    self.sketch.restore(state["sketch"])
+    self.exact.restore(state["exact"])
+    self.promoted_keys = state["promoted_keys"]
+
+  def __len__(self):
+    return len(self.exact)
+
+  def __contains__(self, key):
+    return key in self.exact
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+
+
+class AmountVelocity:
+  """Per-key rolling sum and count of an amount over several windows.
+
+  Each window holds a ring of `buckets` (sum, count) slots per key plus the
+  window's running totals, so an event costs a constant amount of work per
+  window whatever the volume: it adds to one slot and the totals, and only
+  when the window slides are the expired slots taken off the totals and
+  zeroed. A window the key's events have all slid out of starts again from
+  0, so float rounding can't build up across bursts. Windows are exact to
+  1/`buckets` of their width.
+
+  A NaN amount (e.g. an unknown currency) is counted but not summed. Keys
+  are held least recently updated first; a key idle for longer than the
+  widest window is dropped, and the oldest beyond `max_keys` is evicted.
+  """
+
+  def __init__(self, windows, buckets=10, max_keys=None):
+    self.windows = tuple(windows)
+    self.buckets = buckets
+    self.max_keys = max_keys
+    # per window, in one flat list: [head bucket, sum, count, sums..., counts...]
+    stride = self._stride = 3 + 2 * buckets
+    self._empty = [0] * stride
+    # per window: (head, sum, count, first slot, end) indices and bucket width
+    self._layout = [
+      (offset, offset + 1, offset + 2, offset + 3, offset + stride, seconds * 1000 // buckets)
+      for offset, seconds in zip(range(0, stride * len(self.windows), stride), self.windows)
+    ]
+    self._size = stride * len(self.windows)
+    widest = max(range(len(self.windows)), key=lambda i: self.windows[i])
+    self._widest_offset = self._layout[widest][0]
+    self._widest_bucket_ms = self._layout[widest][-1]
+    self._states = OrderedDict()
+    self._watermark = None  # newest bucket of the widest window seen
+
+    self.expired_keys = 0
+    self.evicted_keys = 0
+
+  def update(self, key, ts_ms, amount):
+    """Add one event, return (sum, count) per window, flattened."""
+    # expire first: an idle key being updated is dropped, not written to
+    watermark = ts_ms // self._widest_bucket_ms
+    if self._watermark is None or watermark > self._watermark:
+      self._watermark = watermark
+      self._expire()
+
+    states = self._states
+    state = states.get(key)
+    if state is None:
+      state = states[key] = self._new_state(ts_ms)
+      if self.max_keys and len(states) > self.max_keys:
+        states.popitem(last=False)
+        self.evicted_keys += 1
+    else:
+      states.move_to_end(key)
+
+    n = self.buckets
+    summed = amount == amount  # NaN is not
+    totals = []
+    for head_at, sum_at, count_at, slots, end, bucket_ms in self._layout:
+      bucket = ts_ms // bucket_ms
+      head = state[head_at]
+      if bucket != head:
+        if bucket - head >= n:
+          # the whole window slid past, typical of a key seen now and then
+          state[head_at:end] = self._empty
+          state[head_at] = bucket
+        elif bucket > head:
+          total = state[sum_at]
+          count = state[count_at]
+          for b in range(head + 1, bucket + 1):
+            slot = slots + b % n
+            total -= state[slot]
+            count -= state[slot + n]
+            state[slot] = state[slot + n] = 0
+          state[head_at] = bucket
+          state[sum_at] = total
+          state[count_at] = count
+        elif bucket <= head - n:
+          # older than the whole window, nothing to count
+          totals += state[sum_at:slots]
+          continue
+      slot = slots + bucket % n
+      if summed:
+        state[slot] += amount
+        state[sum_at] += amount
+      state[slot + n] += 1
+      state[count_at] += 1
+      totals += state[sum_at:slots]
+    return totals
+
+  def _new_state(self, ts_ms):
+    state = [0] * self._size
+    for head_at, _, _, _, _, bucket_ms in self._layout:
+      state[head_at] = ts_ms // bucket_ms
+    return state
+
+  def _expire(self):
+    # keys are ordered by last update, so idle keys are always at the front
+    cutoff = self._watermark - self.buckets
+    offset = self._widest_offset
+    states = self._states
+    while states:
+      key, state = next(iter(states.items()))
+      if state[offset] > cutoff:
+        break
+      del states[key]
+      self.expired_keys += 1
+
+  def get(self, key):
+    """(sum, count) per window as of the key's newest event, or None."""
+    state = self._states.get(key)
+    if state is None:
+      return None
+    return tuple(
+      value for _, sum_at, count_at, _, _, _ in self._layout
+      for value in (state[sum_at], state[count_at]))
+
+  def snapshot(self):
+    return {
+      "windows": self.windows,
+      "buckets": self.buckets,
+      "watermark": self._watermark,
+      "states": list(self._states.items()),
+      "expired_keys": self.expired_keys,
+      "evicted_keys": self.evicted_keys,
+    }
+
+  def restore(self, state):
+    if (tuple(state["windows"]), state["buckets"]) != (self.windows, self.buckets):
+      raise ValueError("snapshot velocity layout does not match this velocity")
+    self._states = OrderedDict(state["states"])
+    self._watermark = state["watermark"]
+    self.expired_keys = state["expired_keys"]
+    self.evicted_keys = state["evicted_keys"]
+    while self.max_keys and len(self._states) > self.max_keys:
+      self._states.popitem(last=False)
+      self.evicted_keys += 1
+
+  def stats(self):
+    return {
+      "keys": len(self._states),
+      "expired_keys": self.expired_keys,
+      "evicted_keys": self.evicted_keys,
+    }
+
+  def __len__(self):
+    return len(self._states)
@@ -0,0 +1,379 @@
+from collections import OrderedDict
+
+# ring layout per key: [head bucket, total, count_0 ... count_{n-1}]
+_HEAD = 0
+_TOTAL = 1
+_SLOTS = 2
+
+
+class SlidingWindowCounter:
+  """Per-key event counts over a sliding time window.
+
+  Events are counted in fixed-width buckets held in a small fixed-size ring
+  per key, so an update is O(1) and memory per key is constant no matter how
+  many events arrive. Counts are exact to bucket granularity: the window
+  covers the last `window_seconds // bucket_seconds` buckets, including the
+  one the newest event fell in.
+
+  Keys are kept in least-recently-advanced order. A key is expired once its
+  window has been empty for `idle_ttl_seconds` of event time, and the least
+  recently active key is evicted when more than `max_keys` are tracked.
+  """
+
+  def __init__(self, window_seconds, bucket_seconds=10, max_keys=None,
+               idle_ttl_seconds=0):
+    self.window_seconds = window_seconds
+    self.bucket_seconds = bucket_seconds
+    self.num_buckets = max(1, window_seconds // bucket_seconds)
+    self.max_keys = max_keys
+    self.idle_ttl_buckets = int(idle_ttl_seconds // bucket_seconds)
+    self._bucket_ms = bucket_seconds * 1000
+    self._rings = OrderedDict()
+    self._watermark = None
+
+    self.expired_keys = 0
+    self.evicted_keys = 0
+
+  def add(self, key, ts_ms, amount=1):
+    """Record `amount` events for key at epoch milliseconds, return window count."""
+    bucket = ts_ms // self._bucket_ms
+    ring = self._rings.get(key)
+    if ring is None or bucket != ring[_HEAD]:
+      ring = self._advance(key, ring, bucket)
+      if ring is None:
+        # older than the whole window, nothing to count
+        return self._rings[key][_TOTAL]
+
+    ring[_SLOTS + bucket % self.num_buckets] += amount
+    ring[_TOTAL] += amount
+    return ring[_TOTAL]
+
+  def count(self, key):
+    """Window count as of the newest event seen for key."""
+    ring = self._rings.get(key)
+    return ring[_TOTAL] if ring is not None else 0
+
+  def buckets(self, key):
+    """{bucket: count} of key's non-empty window buckets, without advancing it."""
+    ring = self._rings.get(key)
+    if ring is None:
+      return {}
+    head = ring[_HEAD]
+    n = self.num_buckets
+    return {
+      b: ring[_SLOTS + b % n]
+      for b in range(head - n + 1, head + 1) if ring[_SLOTS + b % n]
+    }
+
+  @property
+  def watermark(self):
+    """Newest bucket seen across all keys, None before the first event."""
+    return self._watermark
+
+  def stats(self):
+    return {
+      "keys": len(self._rings),
+      "expired_keys": self.expired_keys,
+      "evicted_keys": self.evicted_keys,
+    }
+
+  def snapshot(self):
+    """Plain-data state for restore(); rings are shared, not copied, so
+    serialize it before the next add()."""
+    return {
+      "bucket_seconds": self.bucket_seconds,
+      "num_buckets": self.num_buckets,
+      "watermark": self._watermark,
+      "rings": list(self._rings.items()),
+      "expired_keys": self.expired_keys,
+      "evicted_keys": self.evicted_keys,
+    }
+
+  def restore(self, state):
+    if (state["bucket_seconds"], state["num_buckets"]) != (self.bucket_seconds, self.num_buckets):
+      raise ValueError("snapshot bucket layout does not match this window")
+    self._rings = OrderedDict(state["rings"])
+    self._watermark = state["watermark"]
+    self.expired_keys = state["expired_keys"]
+    self.evicted_keys = state["evicted_keys"]
+    # limits may have changed since the snapshot was taken
+    if self._watermark is not None:
+      self._expire()
+    while self.max_keys and len(self._rings) > self.max_keys:
+      self._rings.popitem(last=False)
+      self.evicted_keys += 1
+
+  def _advance(self, key, ring, bucket):
+    n = self.num_buckets
+    if self._watermark is None or bucket > self._watermark:
+      self._watermark = bucket
+      self._expire()
+      if ring is not None and key not in self._rings:
+        ring = None
+
+    if ring is None:
+      ring = [bucket, 0] + [0] * n
+      self._rings[key] = ring
+      if self.max_keys and len(self._rings) > self.max_keys:
+        self._rings.popitem(last=False)
+        self.evicted_keys += 1
+      return ring
+
+    head = ring[_HEAD]
+    if bucket < head:
+      return ring if bucket > head - n else None
+
+    # expire the buckets the window slid past
+    if bucket - head >= n:
+      ring[_TOTAL:] = [0] * (n + 1)
+    else:
+      for b in range(head + 1, bucket + 1):
+        slot = _SLOTS + b % n
+        ring[_TOTAL] -= ring[slot]
+        ring[slot] = 0
+    ring[_HEAD] = bucket
+    self._rings.move_to_end(key)
+    return ring
+
+  def _expire(self):
+    # keys are ordered by last advance, so idle keys are always at the front
+    cutoff = self._watermark - self.num_buckets - self.idle_ttl_buckets
+    rings = self._rings
+    while rings:
+      key, ring = next(iter(rings.items()))
+      if ring[_HEAD] > cutoff:
+        break
+      del rings[key]
+      self.expired_keys += 1
+
+  def __len__(self):
+    return len(self._rings)
+
+  def __contains__(self, key):
+    return key in self._rings
+
+
+# (bucket seconds, buckets) of each resolution a shared window can hold,
+# finest first; each bucket width is a multiple of the one before
+LEVELS = ((10, 30), (60, 60), (3600, 24))
+
+
+def levels_for(seconds):
+  """Levels a window of `seconds` needs: the finest alone, sized to the
+  window, when it fits, else every level up to the first that reaches it."""
+  bucket_seconds, buckets = LEVELS[0]
+  if seconds <= bucket_seconds * buckets:
+    return ((bucket_seconds, max(1, seconds // bucket_seconds)),)
+  for i, (bucket_seconds, buckets) in enumerate(LEVELS[1:], start=2):
+    # the oldest bucket of a level can be partly outside the query, so a
+    # level answers one bucket less than it holds
+    if seconds <= bucket_seconds * (buckets - 1):
+      return LEVELS[:i]
+  raise ValueError(f"window of {seconds}s is wider than the counter levels allow")
+
+
+# per key: [events ever added, then per level: head bucket, starts_0 ...]
+_ADDED = 0
+
+
+class MultiResolutionCounter:
+  """Per-key event counts at several resolutions, queried over any width.
+
+  One counter holds every window width a set of rules needs for the same
+  key and conditions, so adding a rule with another width adds no state
+  and no update cost. Each key keeps a running count of its events and, per
+  level (e.g. 10s, 1m, 1h), a ring with that count as of the start of each
+  bucket. An event in the newest bucket only bumps the running count; the
+  count over the last N seconds is the running count minus the ring entry
+  where the window starts, read from the finest level that still holds it.
+
+  Widths the finest level holds are exact to its bucket granularity, as in
+  SlidingWindowCounter; beyond it the window starts at the coarse bucket it
+  falls in, so it may cover up to one coarse bucket more than asked. With a
+  single level it counts exactly like a SlidingWindowCounter of the same
+  width and exposes the same views (`buckets`, `watermark`) for the batch
+  evaluator. Keys are expired once their coarsest ring has been empty for
+  `idle_ttl_seconds`, and evicted least recently active first beyond
+  `max_keys`.
+  """
+
+  def __init__(self, levels, max_keys=None, idle_ttl_seconds=0):
+    self.levels = tuple(levels)
+    self.bucket_seconds, self.num_buckets = self.levels[0]
+    self.max_keys = max_keys
+    self.idle_ttl_buckets = int(idle_ttl_seconds // self.bucket_seconds)
+    self.window_seconds = self.levels[-1][0] * self.levels[-1][1]
+    self._bucket_ms = self.bucket_seconds * 1000
+    # per level: (offset of its head, bucket ms, buckets, width in finest buckets)
+    self._layout = []
+    offset = _ADDED + 1
+    for bucket_seconds, buckets in self.levels:
+      if bucket_seconds % self.bucket_seconds:
+        raise ValueError("level bucket widths must be multiples of the finest")
+      self._layout.append(
+        (offset, bucket_seconds * 1000, buckets, bucket_seconds // self.bucket_seconds))
+      offset += 1 + buckets
+    self._size = offset
+    self._head = self._layout[0][0]
+    # finest buckets the coarsest ring spans
+    self._span = self._layout[-1][2] * self._layout[-1][3]
+    self._rings = OrderedDict()
+    self._watermark = None
+
+    self.expired_keys = 0
+    self.evicted_keys = 0
+
+  def add(self, key, ts_ms, amount=1):
+    """Record `amount` events for key, return the count over the finest level."""
+    bucket = ts_ms // self._bucket_ms
+    ring = self._rings.get(key)
+    if ring is None or bucket != ring[self._head]:
+      ring = self._advance(key, ring, ts_ms, amount)
+      if ring is None:
+        ring = self._rings[key]
+    else:
+      ring[_ADDED] += amount
+    # the finest ring's oldest entry is the slot after its head
+    head = self._head
+    n = self.num_buckets
+    return ring[_ADDED] - ring[head + 1 + (ring[head] + 1) % n]
+
+  def count(self, key, seconds=None):
+    """Count over the last `seconds` (the finest level's width if None), as
+    of the newest event seen for key."""
+    ring = self._rings.get(key)
+    if ring is None:
+      return 0
+    wanted = self.num_buckets if seconds is None else max(1, seconds // self.bucket_seconds)
+    start = ring[self._head] - wanted + 1
+    for offset, _, n, width in self._layout:
+      level_start = start // width
+      oldest = ring[offset] - n + 1
+      if level_start >= oldest:
+        break
+    else:
+      level_start = oldest
+    return ring[_ADDED] - ring[offset + 1 + level_start % n]
+
+  def buckets(self, key):
+    """{bucket: count} of key's non-empty finest buckets, without advancing it."""
+    ring = self._rings.get(key)
+    if ring is None:
+      return {}
+    head = ring[self._head]
+    n = self.num_buckets
+    starts = self._head + 1
+    counts = {}
+    for b in range(head - n + 1, head + 1):
+      end = ring[_ADDED] if b == head else ring[starts + (b + 1) % n]
+      if end - ring[starts + b % n]:
+        counts[b] = end - ring[starts + b % n]
+    return counts
+
+  @property
+  def watermark(self):
+    """Newest finest bucket seen across all keys, None before the first event."""
+    return self._watermark
+
+  def stats(self):
+    return {
+      "keys": len(self._rings),
+      "expired_keys": self.expired_keys,
+      "evicted_keys": self.evicted_keys,
+    }
+
+  def snapshot(self):
+    """Plain-data state for restore(); rings are shared, not copied, so
+    serialize it before the next add()."""
+    return {
+      "levels": self.levels,
+      "watermark": self._watermark,
+      "rings": list(self._rings.items()),
+      "expired_keys": self.expired_keys,
+      "evicted_keys": self.evicted_keys,
+    }
+
+  def restore(self, state):
+    if tuple(map(tuple, state["levels"])) != self.levels:
+      raise ValueError("snapshot levels do not match this counter")
+    self._rings = OrderedDict(state["rings"])
+    self._watermark = state["watermark"]
+    self.expired_keys = state["expired_keys"]
+    self.evicted_keys = state["evicted_keys"]
+    # limits may have changed since the snapshot was taken
+    if self._watermark is not None:
+      self._expire()
+    while self.max_keys and len(self._rings) > self.max_keys:
+      self._rings.popitem(last=False)
+      self.evicted_keys += 1
+
+  def _advance(self, key, ring, ts_ms, amount):
+    # same order of watermark, expiry, eviction and LRU moves as
+    # SlidingWindowCounter._advance, so one level behaves identically;
+    # returns None for an event older than every ring
+    bucket = ts_ms // self._bucket_ms
+    if self._watermark is None or bucket > self._watermark:
+      self._watermark = bucket
+      self._expire()
+      if ring is not None and key not in self._rings:
+        ring = None
+
+    if ring is None:
+      ring = [0] * self._size
+      for offset, bucket_ms, _, _ in self._layout:
+        ring[offset] = ts_ms // bucket_ms
+      ring[_ADDED] = amount
+      self._rings[key] = ring
+      if self.max_keys and len(self._rings) > self.max_keys:
+        self._rings.popitem(last=False)
+        self.evicted_keys += 1
+      return ring
+
+    if bucket < ring[self._head]:
+      # late event: every bucket after its own now starts one event later,
+      # in each ring; rings that no longer hold its bucket never count it
+      offset, bucket_ms, n, _ = self._layout[-1]
+      if ts_ms // bucket_ms <= ring[offset] - n:
+        return None
+      for offset, bucket_ms, n, _ in self._layout:
+        head = ring[offset]
+        first = max(ts_ms // bucket_ms + 1, head - n + 1)
+        for b in range(first, head + 1):
+          ring[offset + 1 + b % n] += amount
+      ring[_ADDED] += amount
+      return ring
+
+    added = ring[_ADDED]
+    for offset, bucket_ms, n, _ in self._layout:
+      level_bucket = ts_ms // bucket_ms
+      head = ring[offset]
+      if level_bucket == head:
+        continue
+      # buckets the level slid into start at the count so far
+      if level_bucket - head >= n:
+        ring[offset + 1:offset + 1 + n] = [added] * n
+      else:
+        for b in range(head + 1, level_bucket + 1):
+          ring[offset + 1 + b % n] = added
+      ring[offset] = level_bucket
+    ring[_ADDED] = added + amount
+    self._rings.move_to_end(key)
+    return ring
+
+  def _expire(self):
+    # keys are ordered by last advance, so idle keys are always at the front
+    cutoff = self._watermark - self._span - self.idle_ttl_buckets
+    head = self._head
+    rings = self._rings
+    while rings:
+      key, ring = next(iter(rings.items()))
+      if ring[head] > cutoff:
+        break
+      del rings[key]
+      self.expired_keys += 1
+
+  def __len__(self):
+    return len(self._rings)
+
+  def __contains__(self, key):
+    return key in self._rings
@@ -0,0 +1,135 @@
+"""Load historical alerts into anomaly_events with COPY.
+
+Input is JSON lines, one alert per line as the analysis consumer builds it
+(`.gz` files are read compressed, `-` is stdin); alerts without a valid
+timestamp are skipped and reported, the table is partitioned on it. An
+alert's "id" is kept if it has one, otherwise a ULID is made from its
+timestamp and a hash of its content, so ids sort the way the alerts
+happened and every run gives an alert the same id (identical lines become
+one row). Rows go in batches, one transaction each, after the day
+partitions they need are created; ids already in the table are skipped, so
+a run that stopped part way can be started again over the same files.
+
+Run from src/: python -m consumers.backfill alerts.jsonl [more.jsonl.gz ...]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+import ulid
+
+from consumers.db.partitions import ensure_days
+from consumers.utils.copy_loader import COLUMNS, copy_rows
+from consumers.utils.db_handler import DBHandler, alert_row
+from consumers.utils.timestamps import parse_epoch_ms
+
+
+def read_alerts(paths):
+  for path in paths:
+    if path == "-":
+      f = sys.stdin
+    elif path.endswith(".gz"):
+      f = gzip.open(path, "rt", encoding="utf-8")
+    else:
+      f = open(path, encoding="utf-8")
+    try:
+      for number, line in enumerate(f, 1):
+        if not line.strip():
+          continue
+        try:
+          alert = json.loads(line)
+        except json.JSONDecodeError as e:
+          print(f"[BACKFILL] Skipped {path}:{number}: {e}")
+          continue
+        timestamp = alert.get("timestamp")
+        if not timestamp:
+          print(f"[BACKFILL] Skipped {path}:{number}: no timestamp")
+          continue
+        # the id and partition need it parsed; one bad line must not stop the run
+        try:
+          if not isinstance(timestamp, str):
+            raise ValueError("not a string")
+          parse_epoch_ms(timestamp)
+        except ValueError as e:
+          print(f"[BACKFILL] Skipped {path}:{number}: bad timestamp {timestamp!r} ({e})")
+          continue
+        yield alert
+    finally:
+      if f is not sys.stdin:
+        f.close()
+
+
+def to_row(alert):
+  row_id = alert.get("id")
+  if not row_id:
+    # 48 bits of time and 80 of the content's hash, in place of random bits
+    content = json.dumps(alert, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    row_id = ulid.from_bytes(
+      parse_epoch_ms(alert["timestamp"]).to_bytes(6, "big") +
+      hashlib.sha256(content).digest()[:10]).str
+  return alert_row(alert, row_id)
+
+
+def batch_days(batch):
+  ts = COLUMNS.index("timestamp")
+  return {datetime.fromtimestamp(ms / 1000, timezone.utc).date()
+          for ms in set(map(parse_epoch_ms, (row[ts] for row in batch)))}
+
+
+def load(conn, batch, binary, skip_existing):
+  # rows for a day without a partition would land in the default one
+  ensure_days(conn, batch_days(batch))
+  return copy_rows(conn, batch, binary=binary, skip_existing=skip_existing)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+    prog="python -m consumers.backfill",
+    description="Load historical alerts (JSON lines) into anomaly_events with COPY.")
+  parser.add_argument("paths", nargs="+", help="JSON lines files, .gz or - for stdin")
+  parser.add_argument("--format", choices=("text", "binary"), default="text",
+                      help="COPY format (default: text)")
+  parser.add_argument("--batch-rows", type=int, default=100_000,
+                      help="rows per transaction (default: 100000)")
+  parser.add_argument("--direct", action="store_true",
+                      help="COPY straight into the table: faster, but a batch "
+                           "holding an id that already exists fails")
+  parser.add_argument("--create-table", action="store_true",
+                      help="create anomaly_events if it does not exist")
+  args = parser.parse_args(argv)
+
+  db = DBHandler(flush_rows=0)
+  if args.create_table:
+    db.create_table()
+
+  rows = map(to_row, read_alerts(args.paths))
+  read = added = 0
+  start = time.perf_counter()
+  try:
+    while True:
+      batch = list(islice(rows, args.batch_rows))
+      if not batch:
+        break
+      # a batch lost with its connection runs again on a new one; without
+      # --direct its rows that did land are skipped
+      added += db.transaction(lambda conn: load(
+        conn, batch, args.format == "binary", not args.direct))
+      read += len(batch)
+      elapsed = time.perf_counter() - start
+      print(f"[BACKFILL] {read:,} rows read, {added:,} added, {read / elapsed:,.0f} rows/sec")
+  except Exception:
+    print(f"[BACKFILL] Stopped after {read:,} rows; committed batches stay, "
+          f"run again to continue")
+    raise
+  finally:
+    db.close()
+  print(f"[BACKFILL] Done: {read:,} rows read, {added:,} added, {read - added:,} already present")
+
+
+if __name__ == "__main__":
+  main()
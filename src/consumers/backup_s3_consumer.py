@@ -1,17 +1,24 @@
-from consumers.config.settings import KafkaConfig
+from consumers.config.settings import KafkaConfig, ConsumerConfig
 from consumers.base_consumer import BaseConsumer
 from consumers.utils.s3_handler import S3Handler
 
 class BackupS3Consumer(BaseConsumer):    
-  def __init__(self, topics, group_id):
+  def __init__(self, topics, group_id, batch_size=ConsumerConfig.BATCH_SIZE,
+               workers=ConsumerConfig.WORKERS):
     super().__init__(
       topics=topics,
       group_id=group_id,
-      bootstrap_servers=KafkaConfig.BOOTSTRAP_SERVERS
+      bootstrap_servers=KafkaConfig.BOOTSTRAP_SERVERS,
+      batch_size=batch_size,
+      poll_timeout_ms=ConsumerConfig.POLL_TIMEOUT_MS,
+      commit_interval=ConsumerConfig.COMMIT_INTERVAL_SECONDS,
+      workers=workers,
+      key_by=ConsumerConfig.WORKER_KEY_BY,
+      worker_queue_size=ConsumerConfig.WORKER_QUEUE_SIZE
     )
     self.s3_handler = S3Handler()
   
-  def process_message(self, message):
+  def process_message(self, message, meta=None):
     try:
       key = self.s3_handler.upload_data(message)
       print(f"Data Saved To S3: {key}")
@@ -1,61 +1,279 @@
 import json
-from typing import List
+import time
+import traceback
+from collections import deque
+from typing import List, Optional
 from abc import ABC, abstractmethod
 
-from kafka import KafkaConsumer
+from kafka import ConsumerRebalanceListener, KafkaConsumer
 from kafka.errors import KafkaError
+from kafka.structs import OffsetAndMetadata, TopicPartition
+
+from consumers.utils.offset_tracker import OffsetTracker
+from consumers.utils.worker_pool import KeyedWorkerPool
+
+
+def _offset_and_metadata(offset):
+  # kafka-python >= 2.1 added leader_epoch to OffsetAndMetadata
+  if len(OffsetAndMetadata._fields) == 3:
+    return OffsetAndMetadata(offset, None, -1)
+  return OffsetAndMetadata(offset, None)
+
+
+class _RebalanceListener(ConsumerRebalanceListener):
+  # forwards group rebalances to the consumer's hooks; both run on the poll
+  # thread, inside poll()
+  def __init__(self, owner):
+    self.owner = owner
+
+  def on_partitions_revoked(self, revoked):
+    self.owner.on_partitions_revoked(revoked)
+
+  def on_partitions_assigned(self, assigned):
+    self.owner.on_partitions_assigned(assigned)
+
 
 class BaseConsumer(ABC):
-  def __init__(self, topics:List[str], group_id:str, bootstrap_servers:List[str]):
+  def __init__(self, topics:List[str], group_id:str, bootstrap_servers:List[str],
+               batch_size:Optional[int]=None, poll_timeout_ms:int=1000,
+               commit_interval:Optional[float]=None, workers:int=0,
+               key_by:str='partition', worker_queue_size:int=1000):
     self.topics = topics
     self.group_id = group_id
     self.bootstrap_servers = bootstrap_servers
     self.consumer = None
+    self._running = True
+
+    # batch mode: poll up to batch_size records and commit once per batch,
+    # or at most every commit_interval seconds when it is set
+    self.batch_size = batch_size
+    self.poll_timeout_ms = poll_timeout_ms
+    self.commit_interval = commit_interval
+    self.offset_tracker = OffsetTracker()
+    self._last_commit = time.monotonic()
+    # committable offsets waiting for their commit_barrier() to pass, oldest
+    # first, as (barrier, {TopicPartition: next offset})
+    self._held = deque()
+
+    # concurrency mode: records are dispatched to a worker pool keyed by
+    # partition (or message key), so ordering is kept per key
+    self.workers = workers
+    self.key_by = key_by
+    self.worker_queue_size = worker_queue_size
+    self.pool = None
 
   def create_consumer(self):
     try:
       self.consumer = KafkaConsumer(
-        *self.topics,
         bootstrap_servers=self.bootstrap_servers,
         group_id=self.group_id,
         auto_offset_reset='earliest',
         enable_auto_commit=False,
-        value_deserializer=lambda x: json.loads(x.decode('utf-8')),
         # consumer_timeout_ms=1000,
-        max_poll_records=100
+        max_poll_records=self.batch_size or 100
       )
+      self.consumer.subscribe(self.topics, listener=_RebalanceListener(self))
       print(f"Consumer {self.group_id} Connected")
       return self.consumer
     except KafkaError as e:
       print(f"Connect Kafka Failed: {e}")
       raise
-  
+
+  def on_partitions_revoked(self, revoked):
+    # commit what finished before the partitions move to another member
+    try:
+      self._maybe_commit(force=True)
+    except KafkaError as e:
+      print(f"Commit On Revoke Failed: {e}")
+    self.offset_tracker.revoke(revoked)
+    # whatever is still held is replayed by the partitions' next owner
+    revoked = set(revoked)
+    for _, offsets in self._held:
+      for tp in revoked.intersection(offsets):
+        del offsets[tp]
+
+  def on_partitions_assigned(self, assigned):
+    pass
+
+  def before_commit(self):
+    """Hook run before offsets are committed, after the committable ones
+    are taken; returning False holds them back, e.g. while processed
+    records' writes are still buffered."""
+    return True
+
+  def commit_barrier(self, offsets):
+    """Hook run when offsets become committable; what it returns is passed
+    to barrier_passed() and the offsets are held until that is True, e.g.
+    while the records' results are still queued for a sink. None commits
+    them right away."""
+    return None
+
+  def barrier_passed(self, barrier, wait=False):
+    """Hook deciding whether a commit_barrier() has passed; wait is True
+    for the commits before a rebalance or shutdown, where it may block."""
+    return True
+
+  def on_commit(self, offsets):
+    """Hook run after offsets ({TopicPartition: next offset}) are committed."""
+    pass
+
   @abstractmethod
-  def process_message(self, message):
+  def process_message(self, message, meta=None):
+    # meta is the ConsumerRecord (topic, partition, offset, key, ...)
     pass
-  
+
+  def deserialize(self, topic, value):
+    return json.loads(value.decode('utf-8'))
+
+  def handle_record(self, record):
+    message = self.deserialize(record.topic, record.value)
+    # deserializers return None for rejected payloads
+    if message is not None:
+      self.process_message(message, record)
+
+  def process_batch(self, records):
+    for record in records:
+      try:
+        self.handle_record(record)
+      except Exception as e:
+        print(f"Process message Error (offset {record.offset}): {e}")
+
+  def stop(self):
+    """Ask the consume loop to exit after the current batch (or, without
+    batching, at the next message); start() then closes the consumer with a
+    final commit. Safe to call from a signal handler."""
+    self._running = False
+
   def start(self):
     if not self.consumer:
       self.create_consumer()
 
     print(f"Start Consumer Topics: {','.join(self.topics)}")
     try:
+      if self.batch_size or self.workers:
+        self._consume_batches()
+        return
+
       for message in self.consumer:
+        if not self._running:
+          break
         try:
           print(f"Received Message Offset: {message.offset}")
-          self.process_message(message.value)
+          self.handle_record(message)
+
+          # a held commit still runs on_poll, so maintenance and reloads go
+          # on while the database is down
+          if self.before_commit():
+            self.consumer.commit()
+            self.on_commit({
+              TopicPartition(message.topic, message.partition): message.offset + 1
+            })
+          self.on_poll()
 
-          self.consumer.commit()
-        
         except Exception as e:
-          print(f"Process message Error: {e}", exc_info=True)
+          print(f"Process message Error: {e}")
+          traceback.print_exc()
           ## TODO | commit or retry logic
     except KeyboardInterrupt:
       print("Received Shutdown Signal, Stop Consumer.....")
     finally:
       self.close()
-  
+
+  def _consume_batches(self):
+    if self.workers:
+      self.pool = KeyedWorkerPool(
+        self.workers, self.worker_queue_size, name=self.group_id)
+      print(f"Worker Mode: {self.workers} workers keyed by {self.key_by}")
+    else:
+      print(f"Batch Mode: max {self.batch_size} records per poll")
+
+    while self._running:
+      batches = self.consumer.poll(
+        timeout_ms=self.poll_timeout_ms,
+        max_records=self.batch_size
+      )
+
+      for tp, partition_records in batches.items():
+        for record in partition_records:
+          self.offset_tracker.track(tp, record.offset)
+
+      if self.pool:
+        for tp, partition_records in batches.items():
+          for record in partition_records:
+            self.pool.submit(self._dispatch_key(tp, record),
+                             self._process_record, tp, record)
+      elif batches:
+        self.process_batch([record for partition_records in batches.values()
+                            for record in partition_records])
+        for tp, partition_records in batches.items():
+          for record in partition_records:
+            self.offset_tracker.complete(tp, record.offset)
+
+      # a commit failing in a rebalance is retried with the next poll, the
+      # partitions' records are replayed by their next owner otherwise
+      try:
+        self._maybe_commit()
+      except KafkaError as e:
+        print(f"Commit Failed: {e}")
+      self.on_poll()
+
+  def on_poll(self):
+    """Hook run on the poll thread after every poll, even an empty one."""
+    pass
+
+  def _dispatch_key(self, tp, record):
+    if self.key_by == 'key' and record.key is not None:
+      return record.key
+    return tp
+
+  def _process_record(self, tp, record):
+    try:
+      self.handle_record(record)
+    except Exception as e:
+      print(f"Process message Error (offset {record.offset}): {e}")
+    finally:
+      self.offset_tracker.complete(tp, record.offset)
+
+  def _maybe_commit(self, force=False):
+    elapsed = time.monotonic() - self._last_commit
+    if not force and self.commit_interval and elapsed < self.commit_interval:
+      return
+    # taken before the flush: a record finishing during it may have its row
+    # still buffered, so its offset waits for the next commit
+    offsets = self.offset_tracker.pop_committable()
+    if not self.before_commit():
+      self.offset_tracker.requeue(offsets)
+      return
+    if offsets:
+      self._held.append((self.commit_barrier(offsets), offsets))
+    offsets = {}
+    while self._held and (self._held[0][0] is None or
+                          self.barrier_passed(self._held[0][0], wait=force)):
+      offsets.update(self._held.popleft()[1])
+    if not offsets:
+      return
+
+    try:
+      self.consumer.commit({
+        tp: _offset_and_metadata(offset) for tp, offset in offsets.items()
+      })
+    except KafkaError:
+      # keep them for the next try; their barriers have passed already
+      self._held.appendleft((None, offsets))
+      raise
+    self._last_commit = time.monotonic()
+    self.on_commit(offsets)
+
   def close(self):
+    if self.pool:
+      # let in-flight records finish so their offsets can be committed
+      self.pool.shutdown()
+      self.pool = None
+
     if self.consumer:
+      try:
+        self._maybe_commit(force=True)
+      except KafkaError as e:
+        print(f"Final Commit Failed: {e}")
       self.consumer.close()
       print("Consumer Closed")
\ No newline at end of file
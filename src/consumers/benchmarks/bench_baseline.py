@@ -0,0 +1,81 @@
+"""Cost of the per-service streaming baseline on the metrics path.
+
+  - update:    StreamingBaseline.update alone (cpu + latency_ms, 3 quantiles)
+  - no-base:   MetricsAnalyzer with the shipped rules minus baselines
+  - baseline:  MetricsAnalyzer with the shipped rules, anomaly rules included
+  - memory:    tracemalloc bytes per tracked key
+
+Run from src/: python -m consumers.benchmarks.bench_baseline
+"""
+import copy
+import json
+import random
+import time
+import tracemalloc
+
+from consumers.analyzers.baseline import StreamingBaseline
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import decode_event
+from producers.metrics_producer import metrics_generator
+
+N = 200_000
+MEMORY_KEYS = 10_000
+
+
+def build_stream(n):
+  stream = []
+  for _ in range(n):
+    raw = json.dumps(metrics_generator().model_dump()).encode('utf-8')
+    stream.append(decode_event("metrics", raw))
+  return stream
+
+
+def without_baselines(config):
+  config = copy.deepcopy(config)
+  config.pop("baselines", None)
+  config["sources"]["metrics"] = [
+    spec for spec in config["sources"]["metrics"]
+    if not any(cond["field"].startswith(("z_", "pct_")) for cond in spec.get("when", []))
+  ]
+  return config
+
+
+def run(name, fn, stream, repeat=3):
+  best = None
+  for _ in range(repeat):
+    handler = fn()
+    start = time.perf_counter()
+    for event in stream:
+      handler(event)
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  print(f"{name:<10} {len(stream) / best:>12,.0f} events/sec")
+
+
+def memory_per_key(keys):
+  baseline = StreamingBaseline(("cpu", "latency_ms"), quantiles=(0.5, 0.9, 0.99))
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  for key in range(keys):
+    for _ in range(3):
+      baseline.update(f"service-{key}", random.uniform(10, 99), random.randint(50, 1000))
+  used = tracemalloc.get_traced_memory()[0] - before
+  tracemalloc.stop()
+  return used / keys
+
+
+if __name__ == "__main__":
+  stream = build_stream(N)
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    config = json.load(f)
+
+  def bare_update():
+    baseline = StreamingBaseline(("cpu", "latency_ms"), quantiles=(0.5, 0.9, 0.99))
+    return lambda e: baseline.update(e.service, e.cpu, e.latency_ms)
+
+  run("update", bare_update, stream)
+  run("no-base", lambda: MetricsAnalyzer(compile_rules(without_baselines(config))).process, stream)
+  run("baseline", lambda: MetricsAnalyzer(compile_rules(config)).process, stream)
+  print(f"\nmemory   {memory_per_key(MEMORY_KEYS):>12,.0f} bytes/key ({MEMORY_KEYS:,} keys)")
@@ -0,0 +1,144 @@
+"""Cross-source correlation: indexed per-service summaries vs scanning.
+
+  - scan:      keep the last 120s of alerts in a deque and scan it for the
+               other signal of the same service on every alert
+  - index:     Correlator.observe, a dict lookup per signal
+  - pipeline:  logs + metrics events through their analyzers, without and
+               with the shipped correlations run on the alerts they raise
+
+The alert streams hold 1% correlated signals among other alert types, at
+10/100/1000 alerts per second of event time, so the scanned deque holds
+1,200 to 120,000 alerts.
+
+Run from src/: python -m consumers.benchmarks.bench_correlation
+"""
+import json
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from consumers.analyzers.correlation import Correlation, Correlator
+from consumers.analyzers.partition_state import PartitionState
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import decode_event
+from consumers.utils.timestamps import parse_epoch_ms
+from producers.logs_producer import logs_generator
+from producers.metrics_producer import metrics_generator
+
+N = 50_000
+SERVICES = 200
+RATES = (10, 100, 1_000)
+PIPELINE_EVENTS = 100_000
+# event time is spread at this rate so windows see production-like density
+EVENTS_PER_SECOND = 20
+
+CORRELATION = {
+  "name": "latency_with_errors", "alert_type": "CORRELATED_INCIDENT",
+  "alert_level": "CRITICAL", "alert_title": "Latency Spike With Errors",
+  "alert_message": "{service}: {signals} within {seconds}s",
+  "signals": ["HIGH_LATENCY", "ERROR_SPIKE"], "key": "service", "seconds": 120,
+}
+
+
+def build_alerts(n, rate):
+  start = datetime(2025, 1, 1)
+  alerts = []
+  for i in range(n):
+    roll = random.random()
+    alert_type = ("HIGH_LATENCY" if roll < 0.005 else "ERROR_SPIKE" if roll < 0.01
+                  else random.choice(("HIGH_CPU", "USER_ISSUE", "LOG_KEYWORD")))
+    alerts.append({
+      "alert_type": alert_type,
+      "service": f"service-{random.randrange(SERVICES)}",
+      "rule": alert_type.lower(),
+      "timestamp": (start + timedelta(seconds=i / rate)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    })
+  return alerts
+
+
+def scan(alerts, window_ms=120_000):
+  # the "scan of recent events" a correlation needs without summaries
+  recent = deque()
+  found = 0
+  pairs = {"HIGH_LATENCY": "ERROR_SPIKE", "ERROR_SPIKE": "HIGH_LATENCY"}
+  for alert in alerts:
+    ts_ms = parse_epoch_ms(alert["timestamp"])
+    while recent and recent[0][0] < ts_ms - window_ms:
+      recent.popleft()
+    other = pairs.get(alert["alert_type"])
+    if other is not None:
+      for _, seen in recent:
+        if seen["alert_type"] == other and seen["service"] == alert["service"]:
+          found += 1
+          break
+    recent.append((ts_ms, alert))
+  return found
+
+
+def index(alerts):
+  correlator = Correlator([Correlation(CORRELATION)])
+  observe = correlator.observe
+  for alert in alerts:
+    observe([alert])
+  return correlator.emitted
+
+
+def timed(fn, *args):
+  start = time.perf_counter()
+  result = fn(*args)
+  return time.perf_counter() - start, result
+
+
+def build_events(n):
+  start = datetime(2025, 1, 1)
+  generators = {"logs": logs_generator, "metrics": metrics_generator}
+  # the producers name services differently, share one set so they can meet
+  services = ["auth-service", "payment-service", "user-service"]
+  events = []
+  for i in range(n):
+    source = "logs" if i % 2 else "metrics"
+    sample = generators[source]().model_dump()
+    sample["timestamp"] = (start + timedelta(seconds=i / EVENTS_PER_SECOND)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    sample["service"] = random.choice(services)
+    if source == "metrics" and random.random() < 0.001:
+      sample["latency_ms"] = random.randint(1000, 3000)
+    events.append((source, decode_event(source, json.dumps(sample).encode('utf-8'))))
+  return events
+
+
+def pipeline(rules, events, correlate, repeat=3):
+  best = None
+  for _ in range(repeat):
+    shard = PartitionState(rules)
+    handlers = {source: shard.analyzer(source).process for source in ("logs", "metrics")}
+    correlator = Correlator(rules.correlations)
+    composite = 0
+    start = time.perf_counter()
+    for source, event in events:
+      alerts = handlers[source](event)
+      if correlate and alerts:
+        composite += len(correlator.observe(alerts))
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best, composite
+
+
+if __name__ == "__main__":
+  for rate in RATES:
+    alerts = build_alerts(N, rate)
+    scan_time, _ = timed(scan, alerts)
+    index_time, emitted = timed(index, alerts)
+    print(f"{rate:>5} alerts/s  scan {N / scan_time:>12,.0f} alerts/sec   "
+          f"index {N / index_time:>12,.0f} alerts/sec   ({emitted:,} composite)")
+
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    rules = compile_rules(json.load(f))
+  events = build_events(PIPELINE_EVENTS)
+  print()
+  for correlate in (False, True):
+    elapsed, composite = pipeline(rules, events, correlate)
+    label = "with correlation" if correlate else "analyzers only"
+    print(f"pipeline {label:<17} {PIPELINE_EVENTS / elapsed:>12,.0f} events/sec"
+          + (f" ({composite:,} composite)" if correlate else ""))
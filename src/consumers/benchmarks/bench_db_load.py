@@ -0,0 +1,127 @@
+"""Loading alerts into Postgres: per-row inserts vs execute_values vs COPY.
+
+  - per-row:      one INSERT and commit per alert, what DBHandler does
+                  unbuffered
+  - values:       execute_values in pages of 1,000 rows, one commit, what a
+                  buffered flush below DB_COPY_MIN_ROWS does
+  - copy-text:    copy_rows, text format, staged and moved across with
+                  ON CONFLICT DO NOTHING like the consumer's flushes
+  - copy-binary:  the same in binary format
+  - copy-direct:  text format straight into the table, as backfill --direct
+  - encode:       copy_loader encoding alone, no database, text and binary
+
+Rows are built from alerts of the shipped rules, tags/metrics JSON encoded
+once up front, at 10k/100k/1M rows. Each run loads into an empty temporary
+copy of anomaly_events (LIKE anomaly_events INCLUDING ALL, so the primary
+key index is maintained). Needs a local Postgres reachable through the
+POSTGRES_* settings; anomaly_events is created there if missing. Per-row at
+1M rows takes several minutes.
+
+Run from src/: python -m consumers.benchmarks.bench_db_load
+"""
+import random
+import time
+
+import ulid
+from psycopg2.extras import execute_values
+
+from consumers.utils import copy_loader
+from consumers.utils.copy_loader import COLUMNS, copy_rows
+from consumers.utils.db_handler import DBHandler, alert_row
+
+SIZES = (10_000, 100_000, 1_000_000)
+TABLE = "anomaly_events_bench"
+INSERT = f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES %s ON CONFLICT DO NOTHING"
+
+
+def build_rows(n):
+  start = 1_735_689_600
+  rows = []
+  for i in range(n):
+    user_id = random.randrange(2_000)
+    amount = round(random.uniform(100, 20_000), 2)
+    alert = {
+      "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start + i // 20)),
+      "is_alert": True,
+      "alert_type": "HIGH_AMOUNT",
+      "alert_level": "WARNING",
+      "alert_title": "High Amount Transaction",
+      "alert_message": f"User {user_id} made a transaction of {amount}",
+      "user_id": str(user_id),
+      "tags": {"rule": "high_amount", "source": "transactions"},
+      "metrics": {"amount": amount, "currency": "TWD"},
+    }
+    rows.append(alert_row(alert, ulid.new().str))
+  return rows
+
+
+def per_row(conn, rows):
+  query = INSERT.replace("VALUES %s", f"VALUES ({', '.join(['%s'] * len(COLUMNS))})")
+  with conn.cursor() as cur:
+    for row in rows:
+      cur.execute(query, row)
+      conn.commit()
+
+
+def values(conn, rows):
+  with conn.cursor() as cur:
+    execute_values(cur, INSERT, rows, page_size=1_000)
+  conn.commit()
+
+
+def copy_text(conn, rows):
+  copy_rows(conn, rows, table=TABLE)
+  conn.commit()
+
+
+def copy_binary(conn, rows):
+  copy_rows(conn, rows, binary=True, table=TABLE)
+  conn.commit()
+
+
+def copy_direct(conn, rows):
+  copy_rows(conn, rows, skip_existing=False, table=TABLE)
+  conn.commit()
+
+
+def encode(rows, binary):
+  start = time.perf_counter()
+  for _ in copy_loader._blocks(rows, binary):
+    pass
+  return len(rows) / (time.perf_counter() - start)
+
+
+def run(conn, load, rows):
+  with conn.cursor() as cur:
+    cur.execute(f"TRUNCATE {TABLE}")
+    conn.commit()
+    start = time.perf_counter()
+    load(conn, rows)
+    elapsed = time.perf_counter() - start
+    cur.execute(f"SELECT count(*) FROM {TABLE}")
+    loaded = cur.fetchone()[0]
+  conn.commit()
+  if loaded != len(rows):
+    raise RuntimeError(f"{load.__name__} loaded {loaded} of {len(rows)} rows")
+  return len(rows) / elapsed
+
+
+if __name__ == "__main__":
+  db = DBHandler(flush_rows=0)
+  db.create_table()
+  loads = (per_row, values, copy_text, copy_binary, copy_direct)
+  try:
+    # temporary tables belong to one connection, every run uses this one
+    with db.connection() as conn:
+      with conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE {TABLE} (LIKE anomaly_events INCLUDING ALL)")
+      conn.commit()
+      for size in SIZES:
+        rows = build_rows(size)
+        print(f"{size:,} rows")
+        for load in loads:
+          print(f"  {load.__name__:<12} {run(conn, load, rows):>12,.0f} rows/sec")
+        print(f"  {'encode':<12} {encode(rows, False):>12,.0f} rows/sec text, "
+              f"{encode(rows, True):,.0f} rows/sec binary")
+  finally:
+    db.close()
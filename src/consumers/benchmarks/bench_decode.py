@@ -0,0 +1,69 @@
+"""Decode + dispatch cost: json.loads dicts vs typed msgspec structs.
+
+Run from src/: python -m consumers.benchmarks.bench_decode
+"""
+import json
+import random
+import time
+
+from consumers.events import LogEvent, MetricEvent, TransactionEvent, decode_event
+from producers.logs_producer import logs_generator
+from producers.metrics_producer import metrics_generator
+from producers.transactions_producer import transaction_generator
+
+N = 200_000
+
+_generators = {
+  "logs": logs_generator,
+  "metrics": metrics_generator,
+  "transactions": transaction_generator,
+}
+
+
+def build_stream(n):
+  topics = list(_generators)
+  stream = []
+  for _ in range(n):
+    topic = random.choice(topics)
+    payload = json.dumps(_generators[topic]().model_dump()).encode('utf-8')
+    stream.append((topic, payload))
+  return stream
+
+
+def dict_path(stream):
+  # previous path: json.loads -> key sniffing -> data.get lookups
+  for _, raw in stream:
+    data = json.loads(raw.decode('utf-8'))
+    if "level" in data:
+      data.get("service"), data.get("level"), data.get("timestamp"), data.get("message", "")
+    elif "cpu" in data or "latency_ms" in data:
+      data.get("service"), data.get("cpu", 0), data.get("latency_ms", 0), data.get("timestamp")
+    elif "transaction_id" in data:
+      data.get("user_id"), data.get("amount"), data.get("timestamp")
+
+
+def typed_path(stream):
+  source_types = {LogEvent: "logs", MetricEvent: "metrics", TransactionEvent: "transactions"}
+  for topic, raw in stream:
+    event = decode_event(topic, raw)
+    source_type = source_types[type(event)]
+    if source_type == "logs":
+      event.service, event.level, event.timestamp, event.message
+    elif source_type == "metrics":
+      event.service, event.cpu, event.latency_ms, event.timestamp
+    else:
+      event.user_id, event.amount, event.timestamp
+
+
+def run(name, fn, stream):
+  start = time.perf_counter()
+  fn(stream)
+  elapsed = time.perf_counter() - start
+  print(f"{name:<8} {len(stream) / elapsed:>12,.0f} events/sec  "
+        f"{elapsed / len(stream) * 1e9:>7,.0f} ns/event")
+
+
+if __name__ == "__main__":
+  stream = build_stream(N)
+  run("dict", dict_path, stream)
+  run("typed", typed_path, stream)
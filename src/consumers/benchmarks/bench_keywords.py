@@ -0,0 +1,71 @@
+"""Multi-keyword log matching: N substring scans vs one automaton pass.
+
+For 10, 100 and 1000 keywords, matches the same messages with:
+  - naive:     message.lower() then `keyword in lowered` per keyword
+  - automaton: KeywordMatcher forced onto the automaton, one pass over the
+               original message
+  - matcher:   KeywordMatcher as configured, which keeps the substring scan
+               for sets of up to KeywordMatcher.SCAN_LIMIT keywords
+
+Run from src/: python -m consumers.benchmarks.bench_keywords
+"""
+import random
+import string
+import time
+
+from consumers.analyzers.keyword_matcher import KeywordMatcher
+from producers.logs_producer import logs_generator
+
+N = 50_000
+PATTERN_COUNTS = (10, 100, 1000)
+BASE_KEYWORDS = ["failed", "denied", "unauthorized", "forbidden", "timeout"]
+
+
+def build_messages(n):
+  # producer messages are short, so pad half of them to request-log length
+  messages = []
+  for _ in range(n):
+    message = logs_generator().message
+    if random.random() < 0.5:
+      message += f" path=/api/v1/orders/{random.randint(1, 10**6)} " \
+                 f"client=10.0.{random.randint(0, 255)}.{random.randint(0, 255)}"
+    messages.append(message)
+  return messages
+
+
+def build_keywords(count):
+  keywords = list(BASE_KEYWORDS)
+  while len(keywords) < count:
+    keywords.append("".join(random.choices(string.ascii_lowercase, k=random.randint(5, 12))))
+  return keywords[:count]
+
+
+def naive(keywords):
+  def find_all(message):
+    lowered = message.lower()
+    return tuple(k for k in keywords if k in lowered)
+  return find_all
+
+
+def run(name, find_all, messages, repeat=3):
+  best = None
+  hits = 0
+  for _ in range(repeat):
+    start = time.perf_counter()
+    hits = sum(1 for message in messages if find_all(message))
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  print(f"{name:<16} {len(messages) / best:>12,.0f} messages/sec   {hits:,} matched")
+
+
+if __name__ == "__main__":
+  random.seed(7)
+  messages = build_messages(N)
+  avg = sum(map(len, messages)) / len(messages)
+  print(f"{N:,} messages, {avg:.0f} chars on average\n")
+  for count in PATTERN_COUNTS:
+    keywords = build_keywords(count)
+    run(f"naive/{count}", naive(keywords), messages)
+    run(f"automaton/{count}", KeywordMatcher(keywords, automaton=True).find_all, messages)
+    run(f"matcher/{count}", KeywordMatcher(keywords).find_all, messages)
+    print()
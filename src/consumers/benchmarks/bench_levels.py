@@ -0,0 +1,131 @@
+"""One multi-resolution counter shared by rules of several widths vs a
+sliding window per rule.
+
+  - per-rule:  a SlidingWindowCounter per width, each added to per event
+  - shared:    one MultiResolutionCounter (10s/1m/1h levels), added to once
+               per event and queried once per width
+  - rules +K:  MetricsAnalyzer with the shipped rules plus K copies of
+               high_cpu at other widths that never fire, events/sec and
+               window counters held
+
+K widths are the widest K of 60s, 180s, 300s, 900s, 1h, 2h, 6h, 12h.
+Per-rule rings hold 10s buckets, which is what a wide rule costs without
+levels.
+
+Run from src/: python -m consumers.benchmarks.bench_levels
+"""
+import copy
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.analyzers.window import MultiResolutionCounter, SlidingWindowCounter, levels_for
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import decode_event
+from producers.metrics_producer import metrics_generator
+
+N = 100_000
+KEYS = 1_000
+MEMORY_KEYS = 2_000
+WIDTHS = (60, 180, 300, 900, 3_600, 7_200, 21_600, 43_200)
+RULE_COUNTS = (1, 2, 4, 8)
+# event time is spread at this rate so windows see production-like density
+EVENTS_PER_SECOND = 20
+
+
+def build_keys(n):
+  start = 1_735_689_600_000
+  return [(f"user-{random.randrange(KEYS)}", start + i * 1000 // EVENTS_PER_SECOND)
+          for i in range(n)]
+
+
+def per_rule(widths):
+  counters = [SlidingWindowCounter(seconds) for seconds in widths]
+
+  def add(key, ts_ms):
+    return [counter.add(key, ts_ms) for counter in counters]
+  return add
+
+
+def shared(widths):
+  counter = MultiResolutionCounter(levels_for(max(widths)))
+
+  def add(key, ts_ms):
+    counter.add(key, ts_ms)
+    return [counter.count(key, seconds) for seconds in widths]
+  return add
+
+
+def run(build, widths, keys):
+  add = build(widths)
+  start = time.perf_counter()
+  for key, ts_ms in keys:
+    add(key, ts_ms)
+  return len(keys) / (time.perf_counter() - start)
+
+
+def held_bytes(build, widths, keys):
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  add = build(widths)
+  for key, ts_ms in keys:
+    add(key, ts_ms)
+  used = tracemalloc.get_traced_memory()[0] - before
+  tracemalloc.stop()
+  return used
+
+
+def build_stream(n):
+  start = datetime(2025, 1, 1)
+  stream = []
+  for i in range(n):
+    sample = metrics_generator().model_dump()
+    sample["timestamp"] = (start + timedelta(seconds=i / EVENTS_PER_SECOND)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    stream.append(decode_event("metrics", json.dumps(sample).encode('utf-8')))
+  return stream
+
+
+def with_widths(config, widths):
+  config = copy.deepcopy(config)
+  rules = config["sources"]["metrics"]
+  high_cpu = next(spec for spec in rules if spec["name"] == "high_cpu")
+  for seconds in widths:
+    spec = copy.deepcopy(high_cpu)
+    spec["name"] = f"high_cpu_{seconds}s"
+    spec["window"]["seconds"] = seconds
+    # never reached, so the rows time counting rather than building alerts
+    spec["window"]["min_count"] = 10**9
+    rules.append(spec)
+  return config
+
+
+def analyzer_run(config, stream):
+  analyzer = MetricsAnalyzer(compile_rules(config))
+  start = time.perf_counter()
+  for event in stream:
+    analyzer.process(event)
+  return len(stream) / (time.perf_counter() - start), len(analyzer.windows.counters)
+
+
+if __name__ == "__main__":
+  keys = build_keys(N)
+  memory_keys = [(f"user-{i}", keys[0][1] + i) for i in range(MEMORY_KEYS)]
+  for count in RULE_COUNTS:
+    widths = WIDTHS[-count:]
+    print(f"{count} widths {widths}")
+    for name, build in (("per-rule", per_rule), ("shared", shared)):
+      rate = run(build, widths, keys)
+      per_key = held_bytes(build, widths, memory_keys) / MEMORY_KEYS
+      print(f"  {name:<9} {rate:>12,.0f} events/sec {per_key:>10,.0f} bytes/key")
+
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    config = json.load(f)
+  stream = build_stream(N)
+  print()
+  for count in (0, *RULE_COUNTS):
+    rate, counters = analyzer_run(with_widths(config, WIDTHS[-count:] if count else ()), stream)
+    print(f"rules +{count:<2} {rate:>12,.0f} events/sec {counters:>4} window counters")
@@ -0,0 +1,94 @@
+"""Metrics rules per event vs vectorized micro-batches.
+
+Replays generated metrics streams through the shipped rules:
+  - per-event:  MetricsAnalyzer.process on each event
+  - batch N:    MetricsBatch.from_events + MetricsAnalyzer.process_batch
+                per N events (columns built inside the timing)
+  - eval N:     process_batch alone, columns built up front
+
+Two streams: "producer" samples cpu like metrics_producer (uniform, so a
+fifth of events are over the threshold and alert), "quiet" keeps cpu
+around 45% so alerts are rare and the cost is the rules themselves. Both
+paths must raise the same alerts; the run stops if they don't. The
+baseline is the part still updated row by row, so each stream also runs
+without it.
+
+Run from src/: python -m consumers.benchmarks.bench_metrics_batch
+"""
+import json
+import random
+import time
+from itertools import product
+from datetime import datetime, timedelta
+
+from consumers.analyzers.batch import MetricsBatch
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.benchmarks.bench_baseline import without_baselines
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import decode_event
+from producers.metrics_producer import metrics_generator
+
+N = 200_000
+BATCH_SIZES = (100, 1_000, 10_000)
+# event time is spread at this rate so windows see production-like density
+EVENTS_PER_SECOND = 20
+
+
+def build_stream(n, quiet=False):
+  start = datetime(2025, 1, 1)
+  stream = []
+  for i in range(n):
+    sample = metrics_generator().model_dump()
+    sample["timestamp"] = (start + timedelta(seconds=i / EVENTS_PER_SECOND)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    if quiet:
+      sample["cpu"] = round(min(max(random.gauss(45, 8), 10.0), 99.9), 1)
+    # a tail of slow samples so the latency rules fire too
+    if random.random() < 0.002:
+      sample["latency_ms"] = random.randint(1000, 3000)
+    stream.append(decode_event("metrics", json.dumps(sample).encode('utf-8')))
+  return stream
+
+
+def per_event(rules, stream):
+  analyzer = MetricsAnalyzer(rules)
+  start = time.perf_counter()
+  alerts = [alert for event in stream for alert in analyzer.process(event)]
+  return time.perf_counter() - start, alerts
+
+
+def batched(rules, stream, size, prebuilt):
+  analyzer = MetricsAnalyzer(rules)
+  chunks = [stream[i:i + size] for i in range(0, len(stream), size)]
+  if prebuilt:
+    chunks = [MetricsBatch.from_events(chunk) for chunk in chunks]
+  start = time.perf_counter()
+  alerts = []
+  for chunk in chunks:
+    batch = chunk if prebuilt else MetricsBatch.from_events(chunk)
+    alerts += analyzer.process_batch(batch)
+  return time.perf_counter() - start, alerts
+
+
+def report(name, elapsed, n):
+  print(f"  {name:<12} {n / elapsed:>12,.0f} events/sec")
+
+
+if __name__ == "__main__":
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    config = json.load(f)
+  streams = {"producer": build_stream(N), "quiet": build_stream(N, quiet=True)}
+  rule_sets = {"shipped rules": compile_rules(config),
+               "without baselines": compile_rules(without_baselines(config))}
+
+  for (stream_name, stream), (rules_name, rules) in product(streams.items(), rule_sets.items()):
+    print(f"{stream_name} stream, {rules_name}")
+    elapsed, expected = per_event(rules, stream)
+    report("per-event", elapsed, N)
+    for size in BATCH_SIZES:
+      for prebuilt in (False, True):
+        elapsed, alerts = batched(rules, stream, size, prebuilt)
+        if alerts != expected:
+          raise SystemExit(f"batch {size} alerts differ from the per-event path")
+        report(f"{'eval' if prebuilt else 'batch'} {size:,}", elapsed, N)
+    print(f"  {len(expected):,} alerts, identical on every path")
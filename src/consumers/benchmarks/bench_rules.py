@@ -0,0 +1,158 @@
+"""Rule engine cost vs the analyzers it replaced, and as rules are added.
+
+Replays one generated stream through:
+  - pre-series:  the analyzers that predate config/rules.json, unchanged
+                 (legacy_analyzers.py), on json.loads dicts
+  - same rules:  compiled rules doing what those analyzers did (the shipped
+                 rules they had, "failed" as the only keyword, exact windows)
+  - rules:       the shipped rule set, baselines and card-number matching
+                 included; velocity rules only with ANALYZER_VELOCITY_RULES=1
+  - rules+N:     the shipped rules plus N synthetic rules per source
+
+"analyze" is the analyzers alone on payloads decoded up front; "decoded"
+adds each path's decoding (json.loads for pre-series, decode_event for the
+rest). Pre-series stops at the first alert of an event, the rules raise
+every one that matches.
+
+Run from src/: python -m consumers.benchmarks.bench_rules
+"""
+import copy
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from consumers.analyzers.logs_analyzer import LogsAnalyzer
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+from consumers.benchmarks import legacy_analyzers
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import decode_event
+from producers.logs_producer import logs_generator
+from producers.metrics_producer import metrics_generator
+from producers.transactions_producer import transaction_generator
+
+N = 100_000
+# event time is spread at this rate so windows see production-like density
+EVENTS_PER_SECOND = 20
+# the rules the pre-series analyzers hard-coded
+LEGACY_RULES = (
+  "error_spike", "failed_keyword", "user_issue",
+  "high_cpu", "high_latency", "high_cpu_latency",
+  "high_amount", "high_frequency",
+)
+
+_generators = {
+  "logs": logs_generator,
+  "metrics": metrics_generator,
+  "transactions": transaction_generator,
+}
+
+
+def build_stream(n):
+  topics = list(_generators)
+  start = datetime(2025, 1, 1)
+  stream = []
+  for i in range(n):
+    topic = random.choice(topics)
+    payload = _generators[topic]().model_dump()
+    t = start + timedelta(seconds=i / EVENTS_PER_SECOND)
+    payload["timestamp"] = t.strftime("%Y-%m-%dT%H:%M:%SZ")
+    stream.append((topic, json.dumps(payload).encode('utf-8')))
+  return stream
+
+
+def legacy_rules(config):
+  config = copy.deepcopy(config)
+  config["params"]["LOG_KEYWORDS"] = ["failed"]
+  for key in ("baselines", "velocity", "correlations"):
+    config.pop(key, None)
+  for source, specs in config["sources"].items():
+    config["sources"][source] = [spec for spec in specs if spec["name"] in LEGACY_RULES]
+    for spec in config["sources"][source]:
+      spec.get("window", {}).pop("exact_from", None)
+  return config
+
+
+def synthetic_rules(config, per_source):
+  # variations of the shipped rules with thresholds that rarely fire
+  config = copy.deepcopy(config)
+  for source, specs in config["sources"].items():
+    base = list(specs)
+    for i in range(per_source):
+      spec = copy.deepcopy(base[i % len(base)])
+      spec["name"] = f"{spec['name']}_{i}"
+      if "window" in spec:
+        spec["window"]["min_count"] = 10_000 + i
+      else:
+        # timestamps never sort below "0", so this rule never fires
+        spec.setdefault("when", []).append(
+          {"field": "timestamp", "op": "<", "value": f"0{i}"})
+      specs.append(spec)
+  return config
+
+
+def decode_seconds(decode, stream):
+  start = time.perf_counter()
+  for topic, raw in stream:
+    decode(topic, raw)
+  return time.perf_counter() - start
+
+
+def run(name, make_handlers, events, decode, repeat=3):
+  # best of `repeat` runs, each with fresh window state
+  best = None
+  for _ in range(repeat):
+    handlers = make_handlers()
+    alerts = 0
+    start = time.perf_counter()
+    for topic, event in events:
+      alerts += _count(handlers[topic](event))
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  n = len(events)
+  print(f"{name:<12} {n / best:>12,.0f} {n / (best + decode):>12,.0f}  {alerts:>7,}")
+
+
+def _count(result):
+  # pre-series analyzers return one result dict, the rules a list of alerts
+  if isinstance(result, dict):
+    return 1 if result["is_alert"] else 0
+  return len(result)
+
+
+def legacy_handlers():
+  return {
+    "logs": legacy_analyzers.LogsAnalyzer().process,
+    "metrics": legacy_analyzers.MetricsAnalyzer().process,
+    "transactions": legacy_analyzers.TransactionsAnalyzer().process,
+  }
+
+
+def rule_handlers(config):
+  rules = compile_rules(config)
+  return {
+    "logs": LogsAnalyzer(rules).process,
+    "metrics": MetricsAnalyzer(rules).process,
+    "transactions": TransactionsAnalyzer(rules).process,
+  }
+
+
+if __name__ == "__main__":
+  stream = build_stream(N)
+  dicts = [(topic, json.loads(raw)) for topic, raw in stream]
+  events = [(topic, decode_event(topic, raw)) for topic, raw in stream]
+  json_seconds = decode_seconds(lambda topic, raw: json.loads(raw), stream)
+  struct_seconds = decode_seconds(decode_event, stream)
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    config = json.load(f)
+
+  print(f"{'':<12} {'analyze/s':>12} {'decoded/s':>12}  {'alerts':>7}")
+  run("pre-series", legacy_handlers, dicts, json_seconds)
+  same = legacy_rules(config)
+  run("same rules", lambda: rule_handlers(same), events, struct_seconds)
+  run("rules", lambda: rule_handlers(config), events, struct_seconds)
+  for per_source in (10, 100, 300):
+    scaled = synthetic_rules(config, per_source)
+    run(f"rules+{per_source}", lambda: rule_handlers(scaled), events, struct_seconds)
@@ -0,0 +1,114 @@
+"""Analysis throughput with sinks inline vs queued to sink threads.
+
+  - inline:   every alert goes through the sinks on the analysis thread,
+              as with CONSUMER_SINK_QUEUE_SIZE=0
+  - queued:   alerts go to SinkPipeline queues and sink threads take them,
+              as in sink mode; "analysis" is the analyzer stage alone,
+              "drained" adds waiting until the sinks have acknowledged
+              every alert
+
+The sinks are stand-ins that sleep: a webhook of 0/1/5ms per alert and a
+database taking 2ms per batch. One transaction in ten is large; with the
+burst/velocity rules about a third of the events raise an alert.
+The queues hold every alert of a run, so the analyzer stage never waits on
+them here; in the consumer a full queue pauses its partitions instead.
+
+Run from src/: python -m consumers.benchmarks.bench_sinks
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import decode_event
+from consumers.utils.sink_pipeline import SinkPipeline
+from producers.transactions_producer import transaction_generator
+
+N = 5_000
+USERS = 2_000
+WEBHOOK_LATENCIES_MS = (0, 1, 5)
+DB_FLUSH_MS = 2
+# event time is spread at this rate so windows see production-like density
+EVENTS_PER_SECOND = 20
+
+
+def build_stream(n):
+  start = datetime(2025, 1, 1)
+  stream = []
+  for i in range(n):
+    sample = transaction_generator().model_dump()
+    sample["timestamp"] = (start + timedelta(seconds=i / EVENTS_PER_SECOND)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    sample["user_id"] = random.randrange(USERS)
+    sample["amount"] = 20_000 if random.random() < 0.1 else random.randint(100, 5_000)
+    stream.append(decode_event("transactions", json.dumps(sample).encode('utf-8')))
+  return stream
+
+
+class Sinks:
+  def __init__(self, webhook_ms):
+    self.webhook_s = webhook_ms / 1000
+    self.rows = []
+
+  def send(self, alert):
+    if self.webhook_s:
+      time.sleep(self.webhook_s)
+
+  def insert(self, alert):
+    self.rows.append(alert)
+
+  def flush(self):
+    time.sleep(DB_FLUSH_MS / 1000)
+    self.rows = []
+    return True
+
+
+def inline(config, stream, webhook_ms):
+  analyzer = TransactionsAnalyzer(compile_rules(config))
+  sinks = Sinks(webhook_ms)
+  alerts = 0
+  start = time.perf_counter()
+  for event in stream:
+    for alert in analyzer.process(event):
+      sinks.send(alert)
+      sinks.insert(alert)
+      sinks.flush()
+      alerts += 1
+  elapsed = time.perf_counter() - start
+  return elapsed, elapsed, alerts
+
+
+def queued(config, stream, webhook_ms):
+  analyzer = TransactionsAnalyzer(compile_rules(config))
+  sinks = Sinks(webhook_ms)
+  pipeline = SinkPipeline(queue_size=len(stream))
+  pipeline.add("webhook", sinks.send)
+  pipeline.add("db", sinks.insert, flush=sinks.flush)
+  pipeline.start()
+  alerts = 0
+  start = time.perf_counter()
+  for event in stream:
+    for alert in analyzer.process(event):
+      pipeline.submit(alert)
+      alerts += 1
+  analysis = time.perf_counter() - start
+  pipeline.acked(pipeline.mark(), timeout=600)
+  drained = time.perf_counter() - start
+  pipeline.close()
+  return analysis, drained, alerts
+
+
+if __name__ == "__main__":
+  # the burst/velocity rules are what makes a third of the events alert
+  AnalyzerConfig.VELOCITY_RULES = True
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    config = json.load(f)
+  stream = build_stream(N)
+  for webhook_ms in WEBHOOK_LATENCIES_MS:
+    print(f"webhook {webhook_ms}ms, database {DB_FLUSH_MS}ms per flush")
+    for name, run in (("inline", inline), ("queued", queued)):
+      analysis, drained, alerts = run(config, stream, webhook_ms)
+      print(f"  {name:<7} analysis {N / analysis:>10,.0f} events/sec   "
+            f"drained {N / drained:>10,.0f} events/sec   ({alerts:,} alerts)")
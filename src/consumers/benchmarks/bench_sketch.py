@@ -0,0 +1,92 @@
+"""High-cardinality windows: exact ring counters vs sketch + exact hybrid.
+
+One 300s window with min_count 5, fed a skewed stream of twice as many
+events as users (a few heavy users cross the threshold, most are seen once
+or twice):
+
+  - exact:   SlidingWindowCounter per user
+  - hybrid:  HybridWindowCounter, exact_from 3, default epsilon/delta
+  - sized:   the same with epsilon = 4e / (events in window), about four
+             events per sketch column, and delta 0.05 (3 rows)
+
+For each it reports events/sec, tracemalloc bytes held after the run, and
+alerts (count >= min_count) against the exact path: false positives are
+hybrid alerts the exact counter did not raise, false negatives the reverse.
+
+Run from src/: python -m consumers.benchmarks.bench_sketch
+"""
+import math
+import random
+import time
+import tracemalloc
+
+from consumers.analyzers.sketch import HybridWindowCounter
+from consumers.analyzers.window import SlidingWindowCounter
+
+USERS = (10_000, 100_000, 1_000_000)
+WINDOW = 300
+MIN_COUNT = 5
+EXACT_FROM = 3
+HEAVY_SHARE = 0.01  # of users, sending a third of the events
+
+
+def build_stream(users):
+  n = 2 * users
+  heavy = max(1, int(users * HEAVY_SHARE))
+  start_ms = 1_735_689_600_000
+  step_ms = WINDOW * 1000 / n  # the whole stream fits in one window
+  stream = []
+  for i in range(n):
+    user = random.randrange(heavy) if i % 3 == 0 else random.randrange(users)
+    stream.append((user, start_ms + int(i * step_ms)))
+  return stream
+
+
+def run(counter, stream):
+  add = counter.add
+  alerts = set()
+  start = time.perf_counter()
+  for i, (user, ts_ms) in enumerate(stream):
+    if add(user, ts_ms) >= MIN_COUNT:
+      alerts.add(i)
+  return time.perf_counter() - start, alerts
+
+
+def held_bytes(build, stream):
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  counter = build()
+  for user, ts_ms in stream:
+    counter.add(user, ts_ms)
+  used = tracemalloc.get_traced_memory()[0] - before
+  tracemalloc.stop()
+  return used, counter
+
+
+if __name__ == "__main__":
+  print(f"{'users':>9} {'path':<7} {'events/sec':>12} {'memory MB':>10} "
+        f"{'alerts':>8} {'FP':>7} {'FN':>5}")
+  for users in USERS:
+    stream = build_stream(users)
+    paths = {
+      "exact": lambda: SlidingWindowCounter(WINDOW),
+      "hybrid": lambda: HybridWindowCounter(WINDOW, EXACT_FROM),
+      "sized": lambda: HybridWindowCounter(
+        WINDOW, EXACT_FROM, epsilon=4 * math.e / len(stream), delta=0.05),
+    }
+    results = {}
+    promoted = {}
+    for name, build in paths.items():
+      elapsed, alerts = run(build(), stream)
+      used, counter = held_bytes(build, stream)
+      results[name] = (elapsed, used, alerts)
+      if name != "exact":
+        promoted[name] = counter.promoted_keys
+    exact_alerts = results["exact"][2]
+    for name, (elapsed, used, alerts) in results.items():
+      fp = len(alerts - exact_alerts)
+      fn = len(exact_alerts - alerts)
+      print(f"{users:>9,} {name:<7} {len(stream) / elapsed:>12,.0f} {used / 2**20:>10.1f} "
+            f"{len(alerts):>8,} {fp:>7,} {fn:>5,}")
+    print(f"{'':>9} promoted of {users:,} users: "
+          + ", ".join(f"{name} {count:,}" for name, count in promoted.items()))
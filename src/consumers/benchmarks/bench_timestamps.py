@@ -0,0 +1,89 @@
+"""Timestamp parsing on the analyzer hot path, before/after profiles.
+
+Replays a generated stream through the analyzers twice under cProfile: once
+with the previous datetime.fromisoformat parsing swapped in, once with
+parse_epoch_ms.
+
+Run from src/: python -m consumers.benchmarks.bench_timestamps
+"""
+import cProfile
+import json
+import pstats
+import random
+import time
+from datetime import datetime
+
+from consumers.analyzers import rule_engine
+from consumers.analyzers.logs_analyzer import LogsAnalyzer
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+from consumers.events import decode_event
+from consumers.utils.timestamps import parse_epoch_ms
+from producers.logs_producer import logs_generator
+from producers.metrics_producer import metrics_generator
+from producers.transactions_producer import transaction_generator
+
+N = 100_000
+
+_generators = {
+  "logs": logs_generator,
+  "metrics": metrics_generator,
+  "transactions": transaction_generator,
+}
+
+
+def fromisoformat_epoch_ms(ts):
+  t = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+  return int(t.timestamp() * 1000)
+
+
+def build_stream(n):
+  topics = list(_generators)
+  stream = []
+  for _ in range(n):
+    topic = random.choice(topics)
+    raw = json.dumps(_generators[topic]().model_dump()).encode('utf-8')
+    stream.append((topic, decode_event(topic, raw)))
+  return stream
+
+
+def replay(stream, rules):
+  handlers = {
+    "logs": LogsAnalyzer(rules).process,
+    "metrics": MetricsAnalyzer(rules).process,
+    "transactions": TransactionsAnalyzer(rules).process,
+  }
+  for topic, event in stream:
+    handlers[topic](event)
+
+
+def profile(name, parser, stream):
+  # generated rule code binds the parser when the rules are compiled
+  rule_engine.parse_epoch_ms = parser
+  rules = rule_engine.load_rules()
+
+  start = time.perf_counter()
+  replay(stream, rules)
+  elapsed = time.perf_counter() - start
+  print(f"\n=== {name}: {len(stream) / elapsed:,.0f} events/sec")
+
+  profiler = cProfile.Profile()
+  profiler.enable()
+  replay(stream, rules)
+  profiler.disable()
+  pstats.Stats(profiler).sort_stats("tottime").print_stats(8)
+
+
+if __name__ == "__main__":
+  stream = build_stream(N)
+  timestamps = [event.timestamp for _, event in stream]
+  for name, parser in (("fromisoformat", fromisoformat_epoch_ms),
+                       ("parse_epoch_ms", parse_epoch_ms)):
+    start = time.perf_counter()
+    for ts in timestamps:
+      parser(ts)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<15} {elapsed / len(timestamps) * 1e9:>6,.0f} ns/timestamp")
+
+  profile("before (fromisoformat)", fromisoformat_epoch_ms, stream)
+  profile("after (parse_epoch_ms)", parse_epoch_ms, stream)
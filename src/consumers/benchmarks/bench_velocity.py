@@ -0,0 +1,124 @@
+"""Per-user amount velocity over 1m/5m/1h on the transactions path.
+
+  - scan:      a deque of (ts, amount) per user, expired from the left and
+               summed for each window on every transaction
+  - update:    AmountVelocity.update alone, three windows of 10 buckets
+  - no-vel:    TransactionsAnalyzer with the shipped rules as deployed by
+               default, i.e. ANALYZER_VELOCITY_RULES off
+  - vel-state: the same rules, plus currency conversion and velocity
+               updates for every transaction
+  - velocity:  ANALYZER_VELOCITY_RULES on, burst/structuring rules included;
+               on this stream most transactions alert, so this row is
+               mostly the cost of building alerts
+  - memory:    tracemalloc bytes per tracked user
+
+The stream spreads 2,000 users over event time at 20 transactions/sec, so
+a user's 1h window holds about 36 transactions.
+
+Run from src/: python -m consumers.benchmarks.bench_velocity
+"""
+import copy
+import json
+import random
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime, timedelta
+
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+from consumers.analyzers.velocity import AmountVelocity
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import decode_event
+from consumers.utils.timestamps import parse_epoch_ms
+from producers.transactions_producer import transaction_generator
+
+N = 200_000
+USERS = 2_000
+MEMORY_KEYS = 10_000
+WINDOWS = (60, 300, 3600)
+# event time is spread at this rate so windows see production-like density
+EVENTS_PER_SECOND = 20
+
+
+def build_stream(n):
+  start = datetime(2025, 1, 1)
+  stream = []
+  for i in range(n):
+    sample = transaction_generator().model_dump()
+    sample["timestamp"] = (start + timedelta(seconds=i / EVENTS_PER_SECOND)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    sample["user_id"] = random.randrange(USERS)
+    stream.append(decode_event("transactions", json.dumps(sample).encode('utf-8')))
+  return stream
+
+
+def without_velocity_rules(config):
+  # the velocity spec stays, so with VELOCITY_RULES on it is still updated
+  config = copy.deepcopy(config)
+  derived = ("norm_amount", "sum_", "count_")
+  config["sources"]["transactions"] = [
+    spec for spec in config["sources"]["transactions"]
+    if not any(cond["field"].startswith(derived) for cond in spec.get("when", []))
+  ]
+  return config
+
+
+def scanning():
+  # what the sums cost without buckets: every event kept for the widest window
+  widest = max(WINDOWS) * 1000
+  history = {}
+
+  def update(e):
+    ts_ms = parse_epoch_ms(e.timestamp)
+    events = history.setdefault(e.user_id, deque())
+    events.append((ts_ms, e.amount))
+    while events[0][0] <= ts_ms - widest:
+      events.popleft()
+    return [sum(amount for ts, amount in events if ts > ts_ms - seconds * 1000)
+            for seconds in WINDOWS]
+  return update
+
+
+def bare_update():
+  velocity = AmountVelocity(WINDOWS)
+  return lambda e: velocity.update(e.user_id, parse_epoch_ms(e.timestamp), float(e.amount))
+
+
+def run(name, fn, stream, repeat=3):
+  best = None
+  for _ in range(repeat):
+    handler = fn()
+    start = time.perf_counter()
+    for event in stream:
+      handler(event)
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  print(f"{name:<10} {len(stream) / best:>12,.0f} events/sec")
+
+
+def memory_per_key(keys):
+  velocity = AmountVelocity(WINDOWS)
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  for key in range(keys):
+    for i in range(3):
+      velocity.update(key, 1_735_689_600_000 + i * 1000, random.uniform(100, 10_000))
+  used = tracemalloc.get_traced_memory()[0] - before
+  tracemalloc.stop()
+  return used / keys
+
+
+if __name__ == "__main__":
+  stream = build_stream(N)
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    config = json.load(f)
+
+  run("scan", scanning, stream)
+  run("update", bare_update, stream)
+  AnalyzerConfig.VELOCITY_RULES = False
+  run("no-vel", lambda: TransactionsAnalyzer(compile_rules(config)).process, stream)
+  AnalyzerConfig.VELOCITY_RULES = True
+  run("vel-state", lambda: TransactionsAnalyzer(
+    compile_rules(without_velocity_rules(config))).process, stream)
+  run("velocity", lambda: TransactionsAnalyzer(compile_rules(config)).process, stream)
+  print(f"\nmemory   {memory_per_key(MEMORY_KEYS):>12,.0f} bytes/key ({MEMORY_KEYS:,} keys)")
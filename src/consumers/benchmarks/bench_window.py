@@ -0,0 +1,67 @@
+"""Sliding-window cost: deque of datetimes vs bucketed ring counters.
+
+Run from src/: python -m consumers.benchmarks.bench_window
+"""
+import random
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+
+from consumers.analyzers.window import SlidingWindowCounter
+
+N = 500_000
+KEYS = 1_000
+WINDOW = 300
+EVENTS_PER_SECOND = 200
+
+
+def build_stream(n):
+  start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+  stream = []
+  for i in range(n):
+    t = start + timedelta(seconds=i / EVENTS_PER_SECOND)
+    stream.append((random.randrange(KEYS), t, int(t.timestamp() * 1000)))
+  return stream
+
+
+def deque_path(stream):
+  windows = defaultdict(deque)
+  for key, t, _ in stream:
+    window = windows[key]
+    window.append(t)
+    cutoff = t - timedelta(seconds=WINDOW)
+    while window and window[0] < cutoff:
+      window.popleft()
+    len(window)
+  return windows
+
+
+def ring_path(stream):
+  windows = SlidingWindowCounter(WINDOW)
+  for key, _, ts_ms in stream:
+    windows.add(key, ts_ms)
+  return windows
+
+
+def run(name, fn, stream):
+  start = time.perf_counter()
+  fn(stream)
+  elapsed = time.perf_counter() - start
+
+  tracemalloc.start()
+  state = fn(stream)
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  del state
+
+  print(f"{name:<6} {len(stream) / elapsed:>12,.0f} events/sec  "
+        f"{size / KEYS:>8,.0f} bytes/key")
+
+
+if __name__ == "__main__":
+  stream = build_stream(N)
+  print(f"{N:,} events, {KEYS:,} keys, {WINDOW}s window, "
+        f"{EVENTS_PER_SECOND} events/sec event time")
+  run("deque", deque_path, stream)
+  run("ring", ring_path, stream)
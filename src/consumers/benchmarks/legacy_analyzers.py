@@ -0,0 +1,239 @@
+"""The analyzers as they were before config/rules.json, copied unchanged,
+so bench_rules measures the compiled rules against the code they replaced.
+They take json.loads dicts and return one result dict per event.
+"""
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+
+class LogsAnalyzer:
+  def __init__(self):
+    self.users_windows = defaultdict(deque)
+    self.error_windows = defaultdict(deque)
+
+  def process(self, data):
+    service = data.get("service")
+    user_id = data.get("user_id")
+    level = data.get("level")
+    timestamp = data.get("timestamp")
+    message = data.get("message", "")
+
+    if level == "ERROR":
+      # alert when error > 20 in five minutes in same service
+      if self._detect_error_spike(service, timestamp):
+        return self._alert(
+          alert_type="ERROR_SPIKE",
+          alert_level="CRITICAL",
+          alert_title="Service Error Spike",
+          alert_message=f"{service} has too many error logs.",
+          service=service,
+          tags={"level": "ERROR"},
+          metrics={},
+          timestamp=timestamp
+        )
+      
+      # Particular word alert: failed
+      if "failed" in message.lower():
+        return self._alert(
+          alert_type="LOG_KEYWORD",
+          alert_level="WARNING",
+          alert_title="Log Keyword Detected",
+          alert_message=f"{service} log contains 'failed'",
+          service=service,
+          tags={"message": message},
+          metrics={},
+          timestamp=timestamp
+        )
+    
+    else:
+      # Same user error cluster
+      if self._detect_user_spike(user_id, timestamp):
+        return self._alert(
+          alert_type="USER_ISSUE",
+          alert_level="WARNING",
+          alert_title="User Error Detected",
+          alert_message=f"{user_id} too much error",
+          user_id=user_id,
+          tags={"message": message},
+          metrics={},
+          timestamp=timestamp
+        )
+
+    return self._no_alert(data)
+
+  def _detect_error_spike(self, service, ts):
+    t = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    window = self.error_windows[service]
+
+    window.append(t)
+    cutoff = t - timedelta(seconds=180)
+
+    while window and window[0] < cutoff:
+      window.popleft()
+
+    return len(window) >= 20
+
+  def _detect_user_spike(self, user_id, ts):
+    t = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    window = self.users_windows[user_id]
+
+    window.append(t)
+    cutoff = t - timedelta(seconds=180)
+
+    while window and window[0] < cutoff:
+      window.popleft()
+
+    return len(window) >= 10
+
+  def _alert(self, **kwargs):
+    return {
+      "is_alert": True,
+      **kwargs
+    }
+
+  def _no_alert(self, data):
+    return {
+      "is_alert": False,
+      "raw_data": data
+    }
+
+
+class MetricsAnalyzer:
+  def __init__(self):
+    self.metrics_windows = defaultdict(deque)
+
+  def process(self, data):
+    service = data.get("service")
+    cpu = data.get("cpu", 0)
+    latency_ms = data.get("latency_ms", 0)
+    timestamp = data.get("timestamp")
+    message = data.get("message", "")
+    user_id = data.get("user_id", "")
+
+    # cpu >= 80% and continue 5 mins
+    if self._detect_high_cpu(service, timestamp):
+      return self._alert(
+        alert_type="HIGH_CPU",
+        alert_level="WARNING",
+        alert_title="High CPU",
+        alert_message=f"{service} CPU {cpu}%",
+        user_id=user_id,
+        tags={"message": message},
+        metrics={"cpu": cpu},
+        timestamp=timestamp
+      )
+    
+    # latency > 1000ms
+    if latency_ms > 1000:
+      return self._alert(
+        alert_type="HIGH_LATENCY",
+        alert_level="CRITICAL",
+        alert_title="Latency Spike",
+        alert_message=f"{service} latency={latency_ms}ms",
+        user_id=user_id,
+        tags={"message": message},
+        metrics={"latency": latency_ms},
+        timestamp=timestamp
+      )
+    
+    # cpu and latency both high
+    if cpu > 80 and latency_ms > 1000:
+      return self._alert(
+        alert_type="HIGH_CPU_Latency",
+        alert_level="WARNING",
+        alert_title="High CPU & Latency",
+        alert_message=f"{service} CPU {cpu}% & latency {latency_ms}ms",
+        user_id=user_id,
+        tags={"message": message},
+        metrics={"cpu": cpu, "latency": latency_ms},
+        timestamp=timestamp
+      )
+    
+    return self._no_alert(data)
+  
+  def _detect_high_cpu(self, service, timestamp):
+    t = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    window = self.metrics_windows[service]
+
+    window.append(t)
+    cutoff = t - timedelta(seconds=300)
+
+    while window and window[0] < cutoff:
+      window.popleft()
+
+    return len(window) >= 30
+  
+  def _alert(self, **kwargs):
+    return {
+      "is_alert": True,
+      **kwargs
+    }
+
+  def _no_alert(self, data):
+    return {
+      "is_alert": False,
+      "raw_data": data
+    }
+
+
+class TransactionsAnalyzer:
+  def __init__(self):
+    self.user_windows = defaultdict(deque)
+
+  def process(self, data):
+    user_id = data.get("user_id")
+    amount = data.get("amount")
+    service = "transaction-service"
+    timestamp = data.get("timestamp")
+    
+    if amount > 10000:
+      return self._alert(
+        is_alert=True,
+        alert_type="HIGH_AMOUNT",
+        alert_level="CRITICAL",
+        alert_title="High Transaction Amount",
+        alert_message=f"user {user_id} amount={amount}",
+        service=service,
+        tags={"user_id": user_id},
+        metrics={"amount": amount},
+        timestamp=timestamp
+      )
+
+    if self._detect_high_frequency(user_id, timestamp):
+      return self._alert(
+        is_alert=True,
+        alert_type="HIGH_FREQUENCY",
+        alert_level="WARNING",
+        alert_title="Frequent Transactions",
+        alert_message=f"user {user_id} has too many transactions",
+        service=service,
+        tags={"user_id": user_id},
+        metrics={},
+        timestamp=timestamp
+      )
+
+    return self._no_alert(data)
+
+  def _detect_high_frequency(self, user_id, timestamp):
+    t = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    window = self.user_windows[user_id]
+
+    window.append(t)
+    cutoff = t - timedelta(seconds=300)
+
+    while window and window[0] < cutoff:
+        window.popleft()
+
+    return len(window) >= 5
+  
+  def _alert(self, **kwargs):
+    return {
+      "is_alert": True,
+      **kwargs
+    }
+
+  def _no_alert(self, data):
+    return {
+      "is_alert": False,
+      "raw_data": data
+    }
@@ -5,6 +5,86 @@ class KafkaConfig:
     BOOTSTRAP_SERVERS = os.getenv("KAFKA_SERVER_1")
 
 
+class ConsumerConfig:
+    # batch mode is enabled when BATCH_SIZE > 0
+    BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", "500"))
+    POLL_TIMEOUT_MS = int(os.getenv("CONSUMER_POLL_TIMEOUT_MS", "1000"))
+    COMMIT_INTERVAL_SECONDS = float(
+        os.getenv("CONSUMER_COMMIT_INTERVAL_SECONDS", "5.0"))
+    # worker pool for blocking sinks; 0 keeps processing on the poll thread
+    WORKERS = int(os.getenv("CONSUMER_WORKERS", "0"))
+    WORKER_KEY_BY = os.getenv("CONSUMER_WORKER_KEY_BY", "partition")
+    WORKER_QUEUE_SIZE = int(os.getenv("CONSUMER_WORKER_QUEUE_SIZE", "1000"))
+    # sink mode: alerts are queued for the webhook and the database, each
+    # sent from its own thread, and offsets commit once both have them;
+    # partitions are paused while a queue is 3/4 full. 0 sends alerts on
+    # the analysis thread. Commits before a rebalance or shutdown wait up to
+    # SINK_DRAIN_SECONDS for the sinks
+    SINK_QUEUE_SIZE = int(os.getenv("CONSUMER_SINK_QUEUE_SIZE", "0"))
+    SINK_DRAIN_SECONDS = float(os.getenv("CONSUMER_SINK_DRAIN_SECONDS", "10"))
+
+
+class SupervisorConfig:
+    # separate groups, so backup and analysis each see every message
+    BACKUP_GROUP_ID = os.getenv("BACKUP_GROUP_ID", "real-time-compliance-backup")
+    ANALYSIS_GROUP_ID = os.getenv(
+        "ANALYSIS_GROUP_ID", "real-time-compliance-analysis")
+    # processes per role; more than the topics' partition count sit idle
+    BACKUP_PROCESSES = int(os.getenv("BACKUP_PROCESSES", "1"))
+    ANALYSIS_PROCESSES = int(os.getenv("ANALYSIS_PROCESSES", "1"))
+    # crashed workers restart after 1s, 2s, 4s ... up to the max; the delay
+    # resets once a worker has stayed up for RESTART_RESET_SECONDS
+    RESTART_BACKOFF_SECONDS = float(os.getenv("RESTART_BACKOFF_SECONDS", "1"))
+    RESTART_BACKOFF_MAX_SECONDS = float(
+        os.getenv("RESTART_BACKOFF_MAX_SECONDS", "60"))
+    RESTART_RESET_SECONDS = float(os.getenv("RESTART_RESET_SECONDS", "60"))
+    # time a worker gets to finish its batch and commit before it is killed
+    SHUTDOWN_TIMEOUT_SECONDS = float(
+        os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "30"))
+
+
+class AnalyzerConfig:
+    RULES_PATH = os.getenv(
+        "ANALYZER_RULES_PATH",
+        os.path.join(os.path.dirname(__file__), "rules.json"))
+    # how often the rules file is checked for changes, 0 disables hot reload
+    RULES_RELOAD_SECONDS = float(os.getenv("ANALYZER_RULES_RELOAD_SECONDS", "5"))
+    # bound on keys tracked per analyzer window, least recently active is evicted
+    MAX_KEYS = int(os.getenv("ANALYZER_MAX_KEYS", "100000"))
+    # grace period after a key's window empties before it is dropped
+    IDLE_TTL_SECONDS = int(os.getenv("ANALYZER_IDLE_TTL_SECONDS", "0"))
+    # windows with "exact_from" in rules.json count keys in a Count-Min
+    # Sketch (flat memory, one per window per process) and track only keys
+    # at or above it exactly; estimates exceed true counts by more than
+    # EPSILON * (events in window) with probability at most DELTA; about
+    # 4e / (events in window) with DELTA 0.05 tracks exact alerts closely
+    SKETCH_WINDOWS = os.getenv("ANALYZER_SKETCH_WINDOWS", "0") == "1"
+    SKETCH_EPSILON = float(os.getenv("ANALYZER_SKETCH_EPSILON", "0.0001"))
+    SKETCH_DELTA = float(os.getenv("ANALYZER_SKETCH_DELTA", "0.01"))
+    # in batch mode, a partition's metrics records are evaluated as one
+    # vectorized micro-batch when a poll returns at least this many, 0 disables
+    METRICS_BATCH_MIN = int(os.getenv("ANALYZER_METRICS_BATCH_MIN", "0"))
+    # rules reading velocities (rolling amount sums per user, see rules.json)
+    # are left out unless this is on, and with them the per-event updates,
+    # which cost about as much as the rest of the transactions path
+    VELOCITY_RULES = os.getenv("ANALYZER_VELOCITY_RULES", "0") == "1"
+    # currency rates for velocity rules, {"base": ..., "rates": {...}}; the
+    # file is re-read when it changes, checked at most this often
+    RATES_PATH = os.getenv(
+        "ANALYZER_RATES_PATH",
+        os.path.join(os.path.dirname(__file__), "fx_rates.json"))
+    RATES_RELOAD_SECONDS = float(os.getenv("ANALYZER_RATES_RELOAD_SECONDS", "60"))
+    # per-partition window state files for warm restarts and rebalances,
+    # disabled when the directory is empty
+    STATE_DIR = os.getenv("ANALYZER_STATE_DIR", "")
+    SNAPSHOT_INTERVAL_SECONDS = float(
+        os.getenv("ANALYZER_SNAPSHOT_INTERVAL_SECONDS", "60"))
+    # the field each topic's messages are keyed by (src/producers); windows
+    # keyed by anything else see a key in several partitions, so they are
+    # counted once per process instead of per partition
+    MESSAGE_KEYS = {"logs": "service", "metrics": "service", "transactions": "user_id"}
+
+
 class AwsConfig:
     AWS_REGION = os.getenv("AWS_REGION")
     S3_BUCKET = os.getenv("S3_BUCKET")
@@ -15,6 +95,10 @@ class AlertConfig:
     THRESHOLD = float(os.getenv('ALERT_THRESHOLD', '80.0'))
     WEBHOOK_URL = os.getenv('ALERT_WEBHOOK', '')
     DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL', '')
+    # repeats of an (alert_type, service, user_id) alert inside this window
+    # are counted instead of sent, 0 disables
+    COOLDOWN_SECONDS = float(os.getenv('ALERT_COOLDOWN_SECONDS', '60'))
+    COOLDOWN_MAX_KEYS = int(os.getenv('ALERT_COOLDOWN_MAX_KEYS', '100000'))
     AVATAR_URL = "https://gravatar.com/avatar/4cdd4d341d3d009c4d61902f882b05e2?s=400&d=robohash&r=x"
     # https://gravatar.com/avatar/39a9e5c791f0ff472410bb46d97e2b00?s=400&d=robohash&r=x
 
@@ -25,6 +109,30 @@ class DBConfig:
     POSTGRES_DB = os.getenv('POSTGRES_DB')
     POSTGRES_USER = os.getenv('POSTGRES_USER')
     POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD')
+    # buffered writes: alerts are held and inserted together once this many
+    # are waiting or the oldest has waited FLUSH_SECONDS, and always before
+    # an offset commit; 0 writes and commits every alert on its own
+    FLUSH_ROWS = int(os.getenv('DB_FLUSH_ROWS', '0'))
+    FLUSH_SECONDS = float(os.getenv('DB_FLUSH_SECONDS', '1'))
+    # flushes of at least this many rows are streamed in with COPY (text or
+    # binary format) rather than INSERT ... VALUES; 0 never uses COPY
+    COPY_MIN_ROWS = int(os.getenv('DB_COPY_MIN_ROWS', '1000'))
+    COPY_BINARY = os.getenv('DB_COPY_FORMAT', 'text').lower() == 'binary'
+    # connections are pooled, up to one per analysis worker plus the poll
+    # thread; one idle for POOL_CHECK_SECONDS is pinged before use, and a
+    # write that loses its connection is retried on a new one up to
+    # WRITE_RETRIES times, RETRY_BACKOFF_MS apart and doubling
+    POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+    POOL_CHECK_SECONDS = float(os.getenv('DB_POOL_CHECK_SECONDS', '30'))
+    WRITE_RETRIES = int(os.getenv('DB_WRITE_RETRIES', '5'))
+    RETRY_BACKOFF_MS = float(os.getenv('DB_RETRY_BACKOFF_MS', '100'))
+    CONNECT_TIMEOUT_SECONDS = int(os.getenv('DB_CONNECT_TIMEOUT_SECONDS', '5'))
+    # anomaly_events is partitioned by UTC day: partitions are made up to
+    # PARTITION_PREMAKE_DAYS ahead and ones older than RETENTION_DAYS are
+    # dropped, checked every PARTITION_CHECK_SECONDS; 0 days keeps everything
+    PARTITION_PREMAKE_DAYS = int(os.getenv('DB_PARTITION_PREMAKE_DAYS', '3'))
+    RETENTION_DAYS = int(os.getenv('DB_RETENTION_DAYS', '0'))
+    PARTITION_CHECK_SECONDS = float(os.getenv('DB_PARTITION_CHECK_SECONDS', '3600'))
 
     DB_URL = (
         f"postgresql+psycopg2://"
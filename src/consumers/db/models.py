@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, MetaData
+from sqlalchemy import Table, Column, Index, MetaData
 from sqlalchemy import Boolean, Text, TIMESTAMP
 from sqlalchemy.dialects.postgresql import JSONB
 
@@ -8,7 +8,8 @@
     "anomaly_events",
     metadata,
     Column("id", Text, primary_key=True),
-    Column("timestamp", TIMESTAMP(timezone=True)),
+    # partitioned by day on timestamp, so it is part of the key
+    Column("timestamp", TIMESTAMP(timezone=True), primary_key=True),
     Column("is_alert", Boolean),
     Column("alert_type", Text),
     Column("alert_level", Text),
@@ -17,4 +18,6 @@
     Column("user_id", Text),
     Column("tags", JSONB),
     Column("metrics", JSONB),
+    Index("ix_anomaly_events_timestamp", "timestamp"),
+    postgresql_partition_by="RANGE (timestamp)",
 )
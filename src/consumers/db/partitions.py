@@ -0,0 +1,171 @@
+"""Daily partitions of anomaly_events.
+
+anomaly_events is range-partitioned on timestamp (see the
+partition_anomaly_events migration): one partition per UTC day, named
+anomaly_events_pYYYYMMDD, plus anomaly_events_default for rows no day
+partition takes. maintain() creates the partitions from yesterday to
+premake_days ahead and drops day partitions older than retention_days,
+which is a DROP TABLE rather than a DELETE. The analysis consumer runs it
+every DB_PARTITION_CHECK_SECONDS; this module runs it once, e.g. from cron.
+
+Run from src/: python -m consumers.db.partitions [--premake-days N] [--retention-days N]
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+
+TABLE = "anomaly_events"
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PREFIX = f"{TABLE}_p"
+# held for the transaction, so concurrent consumers take turns
+_LOCK_KEY = 0x616e6f6d
+
+
+def partition_name(day):
+    return f"{_PREFIX}{day:%Y%m%d}"
+
+
+def _bounds(day):
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+
+def is_partitioned(cur):
+    cur.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", (TABLE,))
+    return cur.fetchone() is not None
+
+
+def partition_days(cur):
+    """The days that have a partition."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (TABLE,))
+    days = set()
+    for (name,) in cur.fetchall():
+        if not name.startswith(_PREFIX):
+            continue
+        try:
+            days.add(datetime.strptime(name[len(_PREFIX):], "%Y%m%d").date())
+        except ValueError:
+            pass
+    return days
+
+
+def create_partition(cur, day):
+    """Create the day's partition, moving its rows out of the default one.
+
+    The new range may not overlap rows in the default partition, e.g. a
+    backfill of a day that had no partition yet, so those are taken out
+    first and put back through the parent.
+    """
+    start, end = _bounds(day)
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (DEFAULT_PARTITION,))
+    moving = False
+    if cur.fetchone()[0]:
+        cur.execute(f"""
+        SELECT 1 FROM {DEFAULT_PARTITION}
+        WHERE timestamp >= %s AND timestamp < %s LIMIT 1
+      """, (start, end))
+        moving = cur.fetchone() is not None
+    if moving:
+        cur.execute(f"CREATE TEMP TABLE {TABLE}_moved (LIKE {TABLE}) ON COMMIT DROP")
+        cur.execute(f"""
+        WITH moved AS (
+          DELETE FROM {DEFAULT_PARTITION}
+          WHERE timestamp >= %s AND timestamp < %s
+          RETURNING *
+        )
+        INSERT INTO {TABLE}_moved SELECT * FROM moved
+      """, (start, end))
+    cur.execute(f"""
+        CREATE TABLE {partition_name(day)} PARTITION OF {TABLE}
+        FOR VALUES FROM (%s) TO (%s)
+      """, (start, end))
+    if moving:
+        cur.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_moved")
+        cur.execute(f"DROP TABLE {TABLE}_moved")
+
+
+def maintain(conn, premake_days, retention_days, today=None):
+    """Create partitions from yesterday to premake_days ahead and drop day
+    partitions older than retention_days (0 keeps everything).
+
+    Returns (created days, dropped days), or None if anomaly_events is not
+    partitioned or another process is doing the same right now. The caller
+    commits.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    with conn.cursor() as cur:
+        if not is_partitioned(cur):
+            return None
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return None
+        # partition DDL locks the parent; give up rather than queue behind a
+        # long dashboard query, and with it every insert behind this
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+
+        days = partition_days(cur)
+        created = []
+        for offset in range(-1, premake_days + 1):
+            day = today + timedelta(days=offset)
+            if day not in days:
+                create_partition(cur, day)
+                created.append(day)
+
+        dropped = []
+        if retention_days:
+            cutoff = today - timedelta(days=retention_days)
+            for day in sorted(days):
+                if day < cutoff:
+                    cur.execute(f"DROP TABLE {partition_name(day)}")
+                    dropped.append(day)
+    return created, dropped
+
+
+def ensure_days(conn, days):
+    """Create the partitions for days that have none, e.g. ahead of a
+    backfill, so its rows don't pile up in the default partition. Returns
+    the days created; the caller commits."""
+    with conn.cursor() as cur:
+        if not is_partitioned(cur):
+            return []
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_KEY,))
+        missing = sorted(set(days) - partition_days(cur))
+        for day in missing:
+            create_partition(cur, day)
+    return missing
+
+
+def main(argv=None):
+    from consumers.config.settings import DBConfig
+    from consumers.utils.db_handler import DBHandler
+
+    parser = argparse.ArgumentParser(
+        prog="python -m consumers.db.partitions",
+        description="Create upcoming anomaly_events day partitions and drop expired ones.")
+    parser.add_argument("--premake-days", type=int, default=DBConfig.PARTITION_PREMAKE_DAYS,
+                        help=f"days ahead to create (default: {DBConfig.PARTITION_PREMAKE_DAYS})")
+    parser.add_argument("--retention-days", type=int, default=DBConfig.RETENTION_DAYS,
+                        help="drop day partitions older than this, 0 keeps all "
+                             f"(default: {DBConfig.RETENTION_DAYS})")
+    args = parser.parse_args(argv)
+
+    db = DBHandler(flush_rows=0)
+    try:
+        result = db.transaction(
+            lambda conn: maintain(conn, args.premake_days, args.retention_days))
+    finally:
+        db.close()
+    if result is None:
+        print(f"[PARTITIONS] {TABLE} is not partitioned, or another process holds the lock")
+        return
+    created, dropped = result
+    print(f"[PARTITIONS] Created {[partition_name(day) for day in created]}, "
+          f"dropped {[partition_name(day) for day in dropped]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+from typing import Optional
+
+import msgspec
+
+
+# Typed mirrors of LogsSchema / MetricsSchema / TransactionSchema in producers/.
+# Structs are slotted and skip GC tracking, and the decoders validate required
+# fields and types while parsing, so malformed events never reach an analyzer.
+
+class LogEvent(msgspec.Struct, gc=False):
+  timestamp: str
+  service: str
+  level: str
+  message: str
+  user_id: int
+
+
+class MetricEvent(msgspec.Struct, gc=False):
+  timestamp: str
+  service: str
+  cpu: float
+  latency_ms: int
+  message: str = ""
+  user_id: Optional[int] = None
+
+
+class TransactionEvent(msgspec.Struct, gc=False):
+  timestamp: str
+  transaction_id: str
+  amount: int
+  currency: str
+  status: str
+  user_id: int
+
+
+DecodeError = msgspec.MsgspecError
+
+EVENT_TYPES = {
+  "logs": LogEvent,
+  "metrics": MetricEvent,
+  "transactions": TransactionEvent,
+}
+
+_decoders = {
+  topic: msgspec.json.Decoder(event_type)
+  for topic, event_type in EVENT_TYPES.items()
+}
+_fallback_decoder = msgspec.json.Decoder()
+
+
+def decode_event(topic, raw):
+  decoder = _decoders.get(topic, _fallback_decoder)
+  return decoder.decode(raw)
+
+
+def convert_event(source_type, data):
+  return msgspec.convert(data, EVENT_TYPES[source_type])
@@ -1,35 +1,140 @@
+import signal
+import time
 from multiprocessing import Process
+
 from consumers.backup_s3_consumer import BackupS3Consumer
 from consumers.analysis_consumer import AnalysisConsumer
+from consumers.config.settings import SupervisorConfig
 
 topics = ['logs','metrics','transactions']
-group_id = 'real-time-compliance'
 
-def run_backup_consumer(topics, group_id):
-  consumer = BackupS3Consumer(
-    topics=topics,
-    group_id=group_id
-  )
-  consumer.start()
+ROLES = {
+  "backup": (BackupS3Consumer, SupervisorConfig.BACKUP_GROUP_ID,
+             SupervisorConfig.BACKUP_PROCESSES),
+  "analysis": (AnalysisConsumer, SupervisorConfig.ANALYSIS_GROUP_ID,
+               SupervisorConfig.ANALYSIS_PROCESSES),
+}
+
+
+def run_consumer(role, topics, group_id, roles=ROLES):
+  # SIGTERM from the supervisor (and Ctrl-C) ends the loop after the current
+  # batch, then start() closes the consumer with a final commit. Handlers go
+  # in before the consumer is built, so an early signal isn't lost.
+  consumer = None
+  stopping = False
 
-def run_analysis_consumer(topics, group_id):
-  consumer = AnalysisConsumer(
+  def shutdown(signum, frame):
+    nonlocal stopping
+    print(f"[{role}] Received {signal.Signals(signum).name}, Stopping Consumer")
+    stopping = True
+    if consumer is not None:
+      consumer.stop()
+
+  signal.signal(signal.SIGTERM, shutdown)
+  signal.signal(signal.SIGINT, shutdown)
+
+  consumer_class = roles[role][0]
+  consumer = consumer_class(
     topics=topics,
     group_id=group_id
   )
+  if stopping:
+    consumer.stop()
   consumer.start()
 
+
+class Worker:
+  def __init__(self, role, index, group_id, roles=ROLES):
+    self.role = role
+    self.roles = roles
+    self.name = f"{role}-{index}"
+    self.group_id = group_id
+    self.process = None
+    self.started_at = 0.0
+    self.restart_at = 0.0
+    self.failures = 0
+
+  def start(self):
+    self.process = Process(target=run_consumer, name=self.name,
+                           args=(self.role, topics, self.group_id, self.roles))
+    self.process.start()
+    self.started_at = time.monotonic()
+    print(f"[Supervisor] Started {self.name} (pid {self.process.pid})")
+
+  def alive(self):
+    return self.process is not None and self.process.is_alive()
+
+
+class Supervisor:
+  """Runs N consumer processes per role and keeps them running.
+
+  Workers of a role share a consumer group, so Kafka spreads the topics'
+  partitions across them. A worker that exits is restarted after an
+  exponential backoff, which resets once it has stayed up for
+  RESTART_RESET_SECONDS. SIGTERM/SIGINT forward SIGTERM to every worker,
+  wait SHUTDOWN_TIMEOUT_SECONDS for their final commits, then kill whatever
+  is left.
+  """
+
+  def __init__(self, roles=ROLES):
+    self.workers = [
+      Worker(role, index, group_id, roles)
+      for role, (_, group_id, count) in roles.items()
+      for index in range(count)
+    ]
+    self.stopping = False
+
+  def run(self):
+    signal.signal(signal.SIGTERM, self._request_stop)
+    signal.signal(signal.SIGINT, self._request_stop)
+    for worker in self.workers:
+      worker.start()
+
+    while not self.stopping:
+      now = time.monotonic()
+      for worker in self.workers:
+        if worker.alive():
+          continue
+        if worker.process is not None:
+          self._schedule_restart(worker, now)
+        elif now >= worker.restart_at:
+          worker.start()
+      time.sleep(0.5)
+
+    self.shutdown()
+
+  def _schedule_restart(self, worker, now):
+    uptime = now - worker.started_at
+    if uptime >= SupervisorConfig.RESTART_RESET_SECONDS:
+      worker.failures = 0
+    delay = min(
+      SupervisorConfig.RESTART_BACKOFF_SECONDS * 2 ** worker.failures,
+      SupervisorConfig.RESTART_BACKOFF_MAX_SECONDS
+    )
+    worker.failures += 1
+    worker.restart_at = now + delay
+    print(f"[Supervisor] {worker.name} exited with code {worker.process.exitcode} "
+          f"after {uptime:.0f}s, restarting in {delay:.1f}s")
+    worker.process = None
+
+  def _request_stop(self, signum, frame):
+    self.stopping = True
+
+  def shutdown(self):
+    print("[Supervisor] Stopping Consumers")
+    running = [worker for worker in self.workers if worker.alive()]
+    for worker in running:
+      worker.process.terminate()
+
+    deadline = time.monotonic() + SupervisorConfig.SHUTDOWN_TIMEOUT_SECONDS
+    for worker in running:
+      worker.process.join(max(0, deadline - time.monotonic()))
+      if worker.process.is_alive():
+        print(f"[Supervisor] {worker.name} did not stop in time, killing it")
+        worker.process.kill()
+        worker.process.join()
+    print("[Supervisor] All Consumers Stopped")
+
+
 if __name__ == '__main__':
-  p1 = Process(target=run_backup_consumer, args=(topics, group_id))
-  p2 = Process(target=run_analysis_consumer, args=(topics, group_id))
-    
-  p1.start()
-  p2.start()
-    
-  try:
-      p1.join()
-      p2.join()
-  except KeyboardInterrupt:
-      print("Stopping Consumer")
-      p1.terminate()
-      p2.terminate()
\ No newline at end of file
+  Supervisor().run()
@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+
+from consumers.utils.timestamps import parse_epoch_ms
+
+
+class AlertCooldown:
+  """Suppresses repeats of an alert for a cooldown window.
+
+  Alerts are keyed by (alert_type, service, user_id), the user_id taken from
+  tags when the alert has none of its own, as transaction alerts carry it
+  there. The first alert for a key passes and opens a window of
+  `cooldown_seconds` of event time; repeats inside it are only counted. The
+  next alert after the window passes with tags["suppressed_count"] set to
+  how many repeats it stands for.
+
+  Event time keeps the decision the same when records are replayed. Keys
+  are held least recently alerted first, and the oldest are dropped beyond
+  `max_keys`.
+  """
+
+  def __init__(self, cooldown_seconds, max_keys=None):
+    self.cooldown_ms = int(cooldown_seconds * 1000)
+    self.max_keys = max_keys
+    self._lock = threading.Lock()
+    self._keys = OrderedDict()  # key -> [cooldown end ms, suppressed count]
+
+    self.emitted = 0
+    self.suppressed = 0
+
+  def allow(self, alert):
+    """True if the alert should go to the sinks, False if it is a repeat."""
+    if not self.cooldown_ms:
+      return True
+
+    user_id = alert.get("user_id")
+    if user_id is None:
+      user_id = (alert.get("tags") or {}).get("user_id")
+    key = (alert.get("alert_type"), alert.get("service"), user_id)
+    ts_ms = parse_epoch_ms(alert["timestamp"])
+    with self._lock:
+      entry = self._keys.get(key)
+      if entry is not None and ts_ms < entry[0]:
+        entry[1] += 1
+        self.suppressed += 1
+        return False
+
+      if entry is not None and entry[1]:
+        alert["tags"] = {**(alert.get("tags") or {}), "suppressed_count": entry[1]}
+      self._keys[key] = [ts_ms + self.cooldown_ms, 0]
+      self._keys.move_to_end(key)
+      if self.max_keys and len(self._keys) > self.max_keys:
+        self._keys.popitem(last=False)
+      self.emitted += 1
+      return True
+
+  def stats(self):
+    return {
+      "keys": len(self._keys),
+      "emitted": self.emitted,
+      "suppressed": self.suppressed,
+    }
@@ -0,0 +1,170 @@
+import struct
+from itertools import islice
+
+from consumers.utils.timestamps import parse_epoch_ms
+
+# column order of the rows DBHandler builds and of every COPY below
+COLUMNS = (
+    "id", "timestamp", "is_alert", "alert_type", "alert_level", "alert_title",
+    "alert_message", "user_id", "tags", "metrics",
+)
+
+# rows are encoded this many at a time, so a COPY of any size holds one
+# block of encoded rows in memory
+BLOCK_ROWS = 1000
+
+_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_BINARY_TRAILER = struct.pack("!h", -1)
+_PG_EPOCH_MS = 946684800000  # 2000-01-01T00:00:00Z
+_NULL = struct.pack("!i", -1)
+_TRUE = struct.pack("!ib", 1, 1)
+_FALSE = struct.pack("!ib", 1, 0)
+_FIELD_COUNT = struct.pack("!h", len(COLUMNS))
+_length = struct.Struct("!i").pack
+_timestamp = struct.Struct("!iq").pack
+
+
+def _text_block(rows):
+    # most blocks hold nothing to escape, which a count of the separators
+    # and a scan for backslashes over the joined block shows (a NUL stands
+    # in for NULL, text columns can't hold one); otherwise every field is
+    # escaped on its own
+    text = "\n".join([
+        "\t".join([
+            "\x00" if value is None else
+            "t" if value is True else
+            "f" if value is False else
+            str(value)
+            for value in row
+        ])
+        for row in rows
+    ])
+    if (text.count("\t") == len(rows) * (len(COLUMNS) - 1)
+            and text.count("\n") == len(rows) - 1
+            and "\\" not in text and "\r" not in text):
+        return (text.replace("\x00", "\\N") + "\n").encode("utf-8")
+
+    lines = []
+    for row in rows:
+        lines.append("\t".join([
+            "\\N" if value is None else
+            "t" if value is True else
+            "f" if value is False else
+            str(value).translate(_TEXT_ESCAPES)
+            for value in row
+        ]))
+    lines.append("")
+    return "\n".join(lines).encode("utf-8")
+
+
+def _binary_text(value):
+    # not only strings: alerts can carry an int user_id, which text COPY
+    # and INSERT write as its digits too
+    if value is None:
+        return _NULL
+    data = str(value).encode("utf-8")
+    return _length(len(data)) + data
+
+
+def _binary_jsonb(value):
+    # jsonb's binary input is a version byte followed by the JSON text
+    if value is None:
+        return _NULL
+    data = value.encode("utf-8")
+    return _length(len(data) + 1) + b"\x01" + data
+
+
+def _binary_block(rows):
+    parts = []
+    append = parts.append
+    for (row_id, timestamp, is_alert, alert_type, alert_level, alert_title,
+         alert_message, user_id, tags, metrics) in rows:
+        append(_FIELD_COUNT)
+        append(_binary_text(row_id))
+        # microseconds since 2000-01-01 UTC; producer timestamps carry at
+        # most centiseconds, so the millisecond parse loses nothing
+        append(_NULL if timestamp is None else
+               _timestamp(8, (parse_epoch_ms(timestamp) - _PG_EPOCH_MS) * 1000))
+        append(_NULL if is_alert is None else _TRUE if is_alert else _FALSE)
+        append(_binary_text(alert_type))
+        append(_binary_text(alert_level))
+        append(_binary_text(alert_title))
+        append(_binary_text(alert_message))
+        append(_binary_text(user_id))
+        append(_binary_jsonb(tags))
+        append(_binary_jsonb(metrics))
+    return b"".join(parts)
+
+
+def _blocks(rows, binary):
+    rows = iter(rows)
+    encode = _binary_block if binary else _text_block
+    if binary:
+        yield _BINARY_HEADER
+    while True:
+        block = list(islice(rows, BLOCK_ROWS))
+        if not block:
+            break
+        yield encode(block)
+    if binary:
+        yield _BINARY_TRAILER
+
+
+class _BlockReader:
+    """File-like view of encoded blocks, read by cursor.copy_expert."""
+
+    def __init__(self, blocks):
+        self._blocks = blocks
+        self._block = b""
+        self._pos = 0
+
+    def read(self, size=-1):
+        while self._pos >= len(self._block):
+            self._block = next(self._blocks, b"")
+            self._pos = 0
+            if not self._block:
+                return b""
+        end = len(self._block) if size < 0 else self._pos + size
+        data = self._block[self._pos:end]
+        self._pos += len(data)
+        return data
+
+
+def copy_rows(conn, rows, binary=False, skip_existing=True, table="anomaly_events"):
+    """Stream rows into `table` with COPY FROM STDIN, return the rows added.
+
+    Rows are tuples in COLUMNS order with tags/metrics already JSON text, as
+    DBHandler buffers them, and are encoded block by block as COPY reads
+    them. COPY itself can't skip rows whose id exists, so with
+    `skip_existing` the rows go into a temporary staging table first and
+    then across with ON CONFLICT DO NOTHING; without it a duplicate id
+    fails the whole COPY. The caller commits.
+    """
+    columns = ", ".join(COLUMNS)
+    options = "(FORMAT binary)" if binary else ""
+    with conn.cursor() as cur:
+        if not skip_existing:
+            cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN {options}",
+                            _BlockReader(_blocks(rows, binary)), size=65536)
+            return cur.rowcount
+
+        # per connection and without indexes, rows are only appended and
+        # read once
+        stage = f"{table}_copy"
+        cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {table} INCLUDING DEFAULTS)
+      """)
+        cur.copy_expert(f"COPY {stage} ({columns}) FROM STDIN {options}",
+                        _BlockReader(_blocks(rows, binary)), size=65536)
+        cur.execute(f"""
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM {stage}
+        ON CONFLICT DO NOTHING
+      """)
+        added = cur.rowcount
+        # a failed batch takes its staging rows with it on rollback, one
+        # that went through is cleared for the next
+        cur.execute(f"TRUNCATE {stage}")
+        return added
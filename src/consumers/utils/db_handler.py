@@ -1,59 +1,298 @@
 import json
+import threading
+import time
 import urllib.parse
+from contextlib import contextmanager
 import psycopg2
 from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import ulid
 from consumers.config.settings import DBConfig
+from consumers.db.partitions import DEFAULT_PARTITION, maintain, partition_name
+from consumers.utils.copy_loader import copy_rows
+
+# errors a row itself causes (an impossible date, a constraint), which fail
+# the same way however often the write is retried; binary COPY encodes
+# timestamps itself, so a bad one fails there with a ValueError
+_REJECTED = (psycopg2.DataError, psycopg2.IntegrityError, ValueError)
+
+
+def alert_row(data, row_id):
+    """An anomaly_events row for an alert, tags/metrics as JSON text."""
+    return (
+        row_id,
+        data.get('timestamp'),
+        data.get('is_alert', False),
+        data.get('alert_type'),
+        data.get('alert_level'),
+        data.get('alert_title'),
+        data.get('alert_message'),
+        data.get('user_id'),
+        json.dumps(data.get('tags')),
+        json.dumps(data.get('metrics')),
+    )
 
 
 class DBHandler:
 
-    def __init__(self):
-        self.conn = None
+    def __init__(self, flush_rows=None, flush_seconds=None, copy_min_rows=None):
+        # buffered mode: rows wait here until flush_rows are buffered or the
+        # oldest is flush_seconds old, then go out as one multi-row INSERT,
+        # or one COPY from copy_min_rows up
+        self.flush_rows = DBConfig.FLUSH_ROWS if flush_rows is None else flush_rows
+        self.flush_seconds = DBConfig.FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.copy_min_rows = DBConfig.COPY_MIN_ROWS if copy_min_rows is None else copy_min_rows
+        self._rows = []
+        self._oldest = None
+        # analysis workers insert concurrently, the poll thread flushes
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rows_written = 0
+        self.rejected_rows = 0
+        self.copied_rows = 0
+        self.retries = 0
+        self.reconnects = 0
+        self.pool = None
+        self._next_partition_check = 0
+        self._unpartitioned_noted = False
         self.connect()
 
     def connect(self):
         # Decode URL-encoded password (e.g., %40 -> @)
         password = urllib.parse.unquote(
             DBConfig.POSTGRES_PASSWORD) if DBConfig.POSTGRES_PASSWORD else None
-        self.conn = psycopg2.connect(
+        # one connection up front, so a bad config fails at startup; more
+        # are opened as analysis workers write at the same time
+        self.pool = ThreadedConnectionPool(
+            1, DBConfig.POOL_SIZE,
             host=DBConfig.POSTGRES_HOST,
             port=DBConfig.POSTGRES_PORT,
             database=DBConfig.POSTGRES_DB,
             user=DBConfig.POSTGRES_USER,
-            password=password
+            password=password,
+            connect_timeout=DBConfig.CONNECT_TIMEOUT_SECONDS,
         )
+        # the pool raises when it is exhausted, callers wait here instead
+        self._slots = threading.BoundedSemaphore(DBConfig.POOL_SIZE)
+        self._last_used = {}
+
+    @contextmanager
+    def connection(self):
+        """A healthy pooled connection, returned to the pool afterwards.
+
+        A connection the server closed is dropped, and one idle for
+        DBConfig.POOL_CHECK_SECONDS is pinged first, so an idle timeout or
+        a Postgres restart costs a reconnect rather than a failed write.
+        A connection that fails while in use is dropped too.
+        """
+        with self._slots:
+            conn = self._healthy()
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._discard(conn)
+                raise
+            except BaseException:
+                self.pool.putconn(conn)  # rolled back by the pool
+                raise
+            self._last_used[conn] = time.monotonic()
+            self.pool.putconn(conn)
+
+    def _healthy(self):
+        while True:
+            conn = self.pool.getconn()
+            if not conn.closed:
+                last_used = self._last_used.get(conn)
+                # not returned yet: just opened by the pool
+                if last_used is None or \
+                        time.monotonic() - last_used < DBConfig.POOL_CHECK_SECONDS:
+                    return conn
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                    conn.rollback()
+                    return conn
+                except psycopg2.Error:
+                    pass
+            self._discard(conn)
+
+    def _discard(self, conn):
+        self._last_used.pop(conn, None)
+        self.reconnects += 1
+        self.pool.putconn(conn, close=True)
+
+    def transaction(self, fn):
+        """Run fn(conn) on a pooled connection and commit, return its result.
+
+        If the connection is lost (server restart, idle timeout, network)
+        or the transaction is cancelled, fn runs again on a new connection
+        after DBConfig.RETRY_BACKOFF_MS, doubling, up to
+        DBConfig.WRITE_RETRIES times. fn must be safe to repeat; the writes
+        here are, as ids are fixed before the first try and conflicts are
+        skipped. Any other error is raised at once.
+        """
+        delay = DBConfig.RETRY_BACKOFF_MS / 1000
+        for attempt in range(DBConfig.WRITE_RETRIES + 1):
+            try:
+                with self.connection() as conn:
+                    result = fn(conn)
+                    conn.commit()
+                    return result
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if attempt == DBConfig.WRITE_RETRIES:
+                    raise
+                self.retries += 1
+                print(f"[DB] Write failed, retry {attempt + 1}/"
+                      f"{DBConfig.WRITE_RETRIES} in {delay * 1000:.0f}ms: "
+                      f"{str(e).strip()}")
+                time.sleep(delay)
+                delay *= 2
 
     def insert_analysis_result(self, data):
-        with self.conn.cursor() as cur:
+        row = alert_row(data, ulid.new().str)  # Generate ULID for new event
+        if not self.flush_rows:
+            self._reject(self._write_valid([row]))
+            return
+
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            full = len(self._rows) >= self.flush_rows
+        if full:
+            self.flush()
+
+    def flush_due(self):
+        """True when buffered rows have reached the row count or age limit."""
+        return bool(self._rows) and (
+            len(self._rows) >= self.flush_rows or
+            time.monotonic() - self._oldest >= self.flush_seconds)
+
+    def flush(self):
+        """Write every buffered row in one transaction.
+
+        Returns False if the write failed, e.g. the connection was lost for
+        longer than transaction() retries; the rows stay buffered for the
+        next flush, so callers must not commit offsets past them. Rows the
+        database rejects would fail every retry and hold back every commit,
+        so they are split out (see _write_valid), logged and dropped.
+        """
+        with self._lock:
+            if not self._rows:
+                return True
+            rows = self._rows
+            start = time.perf_counter()
+            try:
+                rejected = self._write_valid(rows)
+            except psycopg2.Error as e:
+                self.failed_flushes += 1
+                print(f"[DB] Flush of {len(rows)} rows Failed, kept for retry: {e}")
+                return False
+            self._reject(rejected)
+            self._rows = []
+            self._oldest = None
+            self.flushes += 1
+        print(f"[DB] Wrote {len(rows)} rows in "
+              f"{(time.perf_counter() - start) * 1000:.0f}ms")
+        return True
+
+    def _write_valid(self, rows):
+        """Write rows, leaving out those the database rejects; returns them
+        with their errors. A rejected write is split in halves until each
+        bad row stands alone, so k bad rows cost about 2k log n writes.
+        Rows written before a later half fails are skipped when retried,
+        as their ids are fixed."""
+        try:
+            self._write(rows)
+            return []
+        except _REJECTED as e:
+            if len(rows) == 1:
+                return [(rows[0], e)]
+        middle = len(rows) // 2
+        return self._write_valid(rows[:middle]) + self._write_valid(rows[middle:])
+
+    def _reject(self, rejected):
+        for row, e in rejected:
+            self.rejected_rows += 1
+            print(f"[DB] Dropped row {row[0]} ({row[3]} at {row[1]}), "
+                  f"rejected: {str(e).strip()}")
+
+    def _write(self, rows):
+        if self.copy_min_rows and len(rows) >= self.copy_min_rows:
+            # staged and moved across with ON CONFLICT DO NOTHING, so
+            # retried rows are skipped here too
+            self.transaction(
+                lambda conn: copy_rows(conn, rows, binary=DBConfig.COPY_BINARY))
+            self.rows_written += len(rows)
+            self.copied_rows += len(rows)
+            return
+        self.transaction(lambda conn: self._insert(conn, rows))
+        self.rows_written += len(rows)
+
+    def _insert(self, conn, rows):
+        with conn.cursor() as cur:
+            # ids are fixed when a row is buffered, so a flush retried after
+            # an unconfirmed commit doesn't insert its rows twice; no conflict
+            # target, the key is (id, timestamp) once the table is partitioned
             query = """
         INSERT INTO anomaly_events (
           id, timestamp, is_alert, alert_type, alert_level, alert_title, 
           alert_message, user_id, tags, metrics
         )
         VALUES %s
+        ON CONFLICT DO NOTHING
       """
-            values = [(
-                ulid.new().str,  # Generate ULID for new event
-                data.get('timestamp'),
-                data.get('is_alert', False),
-                data.get('alert_type'),
-                data.get('alert_level'),
-                data.get('alert_title'),
-                data.get('alert_message'),
-                data.get('user_id'),
-                json.dumps(data.get('tags')),
-                json.dumps(data.get('metrics')),
-            )]
-            execute_values(cur, query, values)
-            self.conn.commit()
+            execute_values(cur, query, rows, page_size=len(rows))
+
+    def stats(self):
+        return {
+            "buffered": len(self._rows),
+            "rows_written": self.rows_written,
+            "copied_rows": self.copied_rows,
+            "rejected_rows": self.rejected_rows,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "retries": self.retries,
+            "reconnects": self.reconnects,
+        }
+
+    def maintain_partitions(self):
+        """Create upcoming day partitions of anomaly_events and drop the
+        ones past DBConfig.RETENTION_DAYS, at most once per
+        DBConfig.PARTITION_CHECK_SECONDS; see consumers.db.partitions."""
+        if not DBConfig.PARTITION_CHECK_SECONDS or \
+                time.monotonic() < self._next_partition_check:
+            return
+        self._next_partition_check = time.monotonic() + DBConfig.PARTITION_CHECK_SECONDS
+        try:
+            result = self.transaction(lambda conn: maintain(
+                conn, DBConfig.PARTITION_PREMAKE_DAYS, DBConfig.RETENTION_DAYS))
+        except psycopg2.Error as e:
+            print(f"[DB] Partition maintenance Failed: {e}")
+            return
+        if result is None:
+            if not self._unpartitioned_noted:
+                self._unpartitioned_noted = True
+                print("[DB] anomaly_events is not partitioned (or another "
+                      "process is maintaining it), see alembic upgrade head")
+            return
+        created, dropped = result
+        if created or dropped:
+            print(f"[DB] Partitions created {[partition_name(day) for day in created]}, "
+                  f"dropped {[partition_name(day) for day in dropped]}")
 
     def create_table(self):
-        with self.conn.cursor() as cur:
-            query = """
+        self.transaction(self._create_table)
+        self.maintain_partitions()
+
+    def _create_table(self, conn):
+        # the layout of the partition_anomaly_events migration
+        with conn.cursor() as cur:
+            query = f"""
         CREATE TABLE IF NOT EXISTS anomaly_events (
-          id TEXT PRIMARY KEY,
-          timestamp TIMESTAMPTZ,
+          id TEXT NOT NULL,
+          timestamp TIMESTAMPTZ NOT NULL,
           is_alert BOOLEAN,
           alert_type TEXT,
           alert_level TEXT,
@@ -61,12 +300,14 @@ def create_table(self):
           alert_message TEXT,
           user_id TEXT,
           tags JSONB,
-          metrics JSONB
-        );
+          metrics JSONB,
+          PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp);
+        CREATE INDEX IF NOT EXISTS ix_anomaly_events_timestamp ON anomaly_events (timestamp);
+        CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF anomaly_events DEFAULT;
       """
             cur.execute(query)
-            self.conn.commit()
 
     def close(self):
-        if self.conn:
-            self.conn.close()
+        if self.pool:
+            self.pool.closeall()
@@ -0,0 +1,74 @@
+import json
+import math
+import os
+import time
+
+
+class RateTable:
+  """Currency conversion rates into one base currency, from a local file.
+
+  The file looks like {"base": "TWD", "rates": {"USD": 32.1, ...}}, each rate
+  being base units per unit of the currency. Rates are held in memory;
+  `poll()` re-reads the file when its mtime changes, at most once per
+  `interval` seconds, and keeps the current table if the new one is broken.
+  """
+
+  def __init__(self, path, interval=60):
+    self.path = path
+    self.interval = interval
+    self.unknown = {}  # currency -> conversions it failed
+    self.base, self.rates = self._load()
+    self._mtime = self._stat()
+    self._next_check = time.monotonic() + interval
+
+  def _load(self):
+    with open(self.path) as f:
+      table = json.load(f)
+    base = table["base"]
+    rates = {base: 1.0}
+    for currency, rate in table["rates"].items():
+      rate = float(rate)
+      if not rate > 0:
+        raise ValueError(f"rate for {currency} must be positive, got {rate}")
+      rates[currency] = rate
+    return base, rates
+
+  def _stat(self):
+    try:
+      return os.stat(self.path).st_mtime_ns
+    except OSError:
+      return None
+
+  def convert(self, amount, currency):
+    """Amount in the base currency, NaN (never above a threshold) if the
+    currency has no rate."""
+    rate = self.rates.get(currency)
+    if rate is None:
+      if currency not in self.unknown:
+        print(f"[RATES] No rate for {currency!r} in {self.path}, its amounts are not summed")
+      self.unknown[currency] = self.unknown.get(currency, 0) + 1
+      return math.nan
+    return amount * rate
+
+  def poll(self):
+    """Reload the file if it changed; True if the rates were replaced."""
+    if not self.interval or time.monotonic() < self._next_check:
+      return False
+    self._next_check = time.monotonic() + self.interval
+
+    mtime = self._stat()
+    if mtime is None or mtime == self._mtime:
+      return False
+    self._mtime = mtime
+
+    try:
+      base, rates = self._load()
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+      print(f"[RATES] Reload of {self.path} failed, keeping current rates: {e}")
+      return False
+    if base != self.base:
+      print(f"[RATES] Reload of {self.path} changes base {self.base} -> {base}, keeping current rates")
+      return False
+    # swapped in one assignment, readers see the old or the new table
+    self.rates = rates
+    return True
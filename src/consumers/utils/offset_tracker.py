@@ -0,0 +1,58 @@
+import threading
+from collections import deque
+
+
+class OffsetTracker:
+  """Tracks dispatched/completed offsets per partition.
+
+  Records may finish out of order when they are processed concurrently, so
+  only the contiguous completed prefix of each partition is committable.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._inflight = {}  # tp -> deque of dispatched offsets, in poll order
+    self._done = {}      # tp -> set of completed offsets not yet released
+    self._ready = {}     # tp -> next offset to commit
+
+  def track(self, tp, offset):
+    with self._lock:
+      self._inflight.setdefault(tp, deque()).append(offset)
+
+  def complete(self, tp, offset):
+    with self._lock:
+      inflight = self._inflight.get(tp)
+      if inflight is None:
+        # partition was revoked while the record was in flight
+        return
+
+      done = self._done.setdefault(tp, set())
+      done.add(offset)
+      while inflight and inflight[0] in done:
+        released = inflight.popleft()
+        done.discard(released)
+        self._ready[tp] = released + 1
+
+  def pop_committable(self):
+    with self._lock:
+      ready, self._ready = self._ready, {}
+      return ready
+
+  def requeue(self, offsets):
+    """Put popped offsets back, e.g. when their commit was held back.
+    Partitions released further since, or revoked, keep what they have."""
+    with self._lock:
+      for tp, offset in offsets.items():
+        if tp in self._inflight:
+          self._ready.setdefault(tp, offset)
+
+  def pending(self):
+    with self._lock:
+      return sum(len(inflight) for inflight in self._inflight.values())
+
+  def revoke(self, partitions):
+    with self._lock:
+      for tp in partitions:
+        self._inflight.pop(tp, None)
+        self._done.pop(tp, None)
+        self._ready.pop(tp, None)
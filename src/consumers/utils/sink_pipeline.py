@@ -0,0 +1,178 @@
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class _Lane:
+  # one sink: a bounded queue and the thread that drains it in order
+  def __init__(self, name, write, flush, flush_due, queue_size, retry_seconds):
+    self.name = name
+    self.write = write
+    self.flush = flush
+    self.flush_due = flush_due
+    self.queue_size = queue_size
+    self.retry_seconds = retry_seconds
+    self.queue = queue.Queue(maxsize=queue_size)
+    # submitted/acked count items in queue order; put and count happen
+    # under one lock so a mark never covers an item queued behind another
+    self.submitted = 0
+    self.acked = 0
+    self.failed_writes = 0
+    self.failed_flushes = 0
+    self._submit_lock = threading.Lock()
+    self._acked = threading.Condition()
+    self.thread = None
+
+  def submit(self, item):
+    with self._submit_lock:
+      self.queue.put(item)
+      self.submitted += 1
+
+  def run(self, stopping):
+    pending = 0  # written but not flushed, so not acknowledged yet
+    while True:
+      item = self.queue.get()
+      if item is _STOP:
+        if pending:
+          if self._flush():
+            self._ack(pending)
+          else:
+            print(f"[SINK] {self.name}: final flush of {pending} items failed")
+        return
+      try:
+        self.write(item)
+      except Exception as e:
+        # a sink that can't take an item is reported, not retried forever
+        self.failed_writes += 1
+        print(f"[SINK] {self.name}: write failed: {e}")
+      pending += 1
+
+      # flush once the queue is caught up, or when the sink wants to; a
+      # sink without a flush is done with an item once it is written
+      if self.flush is None:
+        self._ack(pending)
+        pending = 0
+      elif self.queue.empty() or self.flush_due():
+        # while the sink is down nothing more is taken off the queue, so
+        # it fills and the consumer pauses instead of buffering here
+        while not self._flush():
+          self.failed_flushes += 1
+          if stopping.wait(self.retry_seconds):
+            break
+        else:
+          self._ack(pending)
+          pending = 0
+
+  def _flush(self):
+    # a flush that raises failed like one returning False; the thread must
+    # outlive it, or nothing after it is ever acknowledged
+    try:
+      return self.flush()
+    except Exception as e:
+      print(f"[SINK] {self.name}: flush failed: {e}")
+      return False
+
+  def _ack(self, count):
+    with self._acked:
+      self.acked += count
+      self._acked.notify_all()
+
+  def wait_acked(self, count, timeout):
+    with self._acked:
+      return self._acked.wait_for(lambda: self.acked >= count, timeout)
+
+
+class SinkPipeline:
+  """Hands alerts to slow sinks (webhook, database) on their own threads.
+
+  Every sink gets a bounded queue drained in order by one thread, so the
+  analysis thread only pays for a put. A sink's flush (if any) runs when
+  its queue is caught up or the sink says it is due, and items count as
+  acknowledged once flushed (written, for a sink without a flush).
+  `mark()` records how far the sinks have been fed; `acked(mark)` says
+  whether they got through it, which is what offset commits wait for. `saturated()` and `drained()` tell the poll loop
+  when to pause and resume its partitions; a put into a full queue blocks.
+  """
+
+  def __init__(self, queue_size=1000, retry_seconds=1.0, name="sink"):
+    self.queue_size = queue_size
+    self.retry_seconds = retry_seconds
+    self.name = name
+    self._lanes = []
+    self._stopping = threading.Event()
+
+  def add(self, name, write, flush=None, flush_due=None):
+    """Add a sink: write(item) per item, flush() -> True once written items
+    are durable, flush_due() -> True to flush before the queue is empty."""
+    self._lanes.append(_Lane(
+      name, write, flush, flush_due or (lambda: False),
+      self.queue_size, self.retry_seconds))
+
+  def start(self):
+    for lane in self._lanes:
+      lane.thread = threading.Thread(
+        target=lane.run, args=(self._stopping,),
+        name=f"{self.name}-{lane.name}", daemon=True)
+      lane.thread.start()
+
+  def submit(self, item):
+    for lane in self._lanes:
+      lane.submit(item)
+
+  def mark(self):
+    return tuple(lane.submitted for lane in self._lanes)
+
+  def acked(self, mark, timeout=0):
+    """True once every sink has acknowledged the items up to mark, waiting
+    at most timeout seconds."""
+    deadline = time.monotonic() + timeout
+    for lane, count in zip(self._lanes, mark):
+      if lane.acked < count and not lane.wait_acked(
+          count, max(0, deadline - time.monotonic())):
+        return False
+    return True
+
+  def saturated(self):
+    return any(lane.queue.qsize() >= self.queue_size * 3 // 4 for lane in self._lanes)
+
+  def drained(self):
+    return all(lane.queue.qsize() <= self.queue_size // 4 for lane in self._lanes)
+
+  def stats(self):
+    return {
+      lane.name: {
+        "queued": lane.queue.qsize(),
+        "unacked": lane.submitted - lane.acked,
+        "acked": lane.acked,
+        "failed_writes": lane.failed_writes,
+        "failed_flushes": lane.failed_flushes,
+      }
+      for lane in self._lanes
+    }
+
+  def close(self, timeout=None):
+    """Stop the sinks once they are through what is queued. Sinks still
+    failing to flush after timeout seconds get one more try each, then
+    their unflushed items are given up."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def remaining():
+      return None if deadline is None else max(0, deadline - time.monotonic())
+
+    stopped = []
+    for lane in self._lanes:
+      try:
+        lane.queue.put(_STOP, timeout=remaining())
+        stopped.append(lane)
+      except queue.Full:
+        pass
+    for lane in stopped:
+      lane.thread.join(remaining())
+    # failing flushes now give up after one try, so the lanes run dry
+    self._stopping.set()
+    for lane in self._lanes:
+      if lane not in stopped:
+        lane.queue.put(_STOP)
+      lane.thread.join()
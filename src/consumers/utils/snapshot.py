@@ -0,0 +1,64 @@
+import os
+import pickle
+import time
+import zlib
+
+SNAPSHOT_VERSION = 5
+
+
+def encode_snapshot(offsets, state):
+  """Serialize analyzer state tagged with the offsets it covers.
+
+  offsets maps (topic, partition) to the next offset to consume. State
+  shares its rings with the live windows, so encode it before the next
+  record is counted; the bytes can be written later with write_payload.
+  """
+  return zlib.compress(pickle.dumps({
+    "version": SNAPSHOT_VERSION,
+    "created_at": time.time(),
+    "offsets": offsets,
+    "state": state,
+  }, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def write_payload(path, payload):
+  """Atomically write an encoded snapshot: the file is written next to path
+  and renamed over it, so a crash mid-write leaves the previous snapshot
+  intact. Returns the snapshot size in bytes."""
+  directory = os.path.dirname(path)
+  if directory:
+    os.makedirs(directory, exist_ok=True)
+  tmp_path = f"{path}.tmp"
+  with open(tmp_path, "wb") as f:
+    f.write(payload)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(tmp_path, path)
+  return len(payload)
+
+
+def write_snapshot(path, offsets, state):
+  """Atomically write analyzer state tagged with the offsets it covers,
+  see encode_snapshot and write_payload. Returns the size in bytes."""
+  return write_payload(path, encode_snapshot(offsets, state))
+
+
+def read_snapshot(path):
+  """Load a snapshot written by write_snapshot, None if there is none.
+
+  Snapshots are pickles and must only be read from a path this service
+  writes itself.
+  """
+  try:
+    with open(path, "rb") as f:
+      snapshot = pickle.loads(zlib.decompress(f.read()))
+  except FileNotFoundError:
+    return None
+  except (OSError, zlib.error, pickle.UnpicklingError, EOFError) as e:
+    print(f"[SNAPSHOT] Unreadable snapshot {path}, starting cold: {e}")
+    return None
+
+  if snapshot.get("version") != SNAPSHOT_VERSION:
+    print(f"[SNAPSHOT] Snapshot {path} has version {snapshot.get('version')}, starting cold")
+    return None
+  return snapshot
@@ -0,0 +1,67 @@
+import calendar
+from datetime import datetime
+
+# whole-second "...SSZ" strings and "YYYY-MM-DDTHH:MM:SS" prefixes of UTC
+# strings -> epoch ms. The two are kept apart: a naive string looks like a
+# prefix but is local time. Producers stamp many events per second and time
+# only moves forward, so a full cache is dropped rather than tracked as an LRU.
+_CACHE_SIZE = 4096
+_seconds_cache = {}
+_prefix_cache = {}
+
+# fractional part (first 1-3 digits) -> milliseconds
+_FRACTION_MS = {
+  f"{value:0{digits}d}": value * 10 ** (3 - digits)
+  for digits in (1, 2, 3) for value in range(10 ** digits)
+}
+
+
+def _parse_prefix(prefix):
+  ms = _prefix_cache.get(prefix)
+  if ms is None:
+    if prefix[10] != "T":
+      raise ValueError(prefix)
+    fields = (
+      int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]),
+      int(prefix[11:13]), int(prefix[14:16]), int(prefix[17:19]),
+    )
+    # timegm rolls impossible dates over (Feb 30 -> Mar 2), reject them here
+    # and leave the error to fromisoformat
+    year, month, day, hour, minute, second = fields
+    if not (1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]
+            and hour < 24 and minute < 60 and second < 60):
+      raise ValueError(prefix)
+    ms = calendar.timegm(fields) * 1000
+    if len(_prefix_cache) >= _CACHE_SIZE:
+      _prefix_cache.clear()
+    _prefix_cache[prefix] = ms
+  return ms
+
+
+def parse_epoch_ms(ts):
+  """Parse producer timestamps to integer epoch milliseconds (UTC).
+
+  Handles "%Y-%m-%dT%H:%M:%SZ" and its fractional variant ("...:%S.%fZ" with
+  any number of digits) without building a datetime; anything else falls
+  back to datetime.fromisoformat.
+  """
+  ms = _seconds_cache.get(ts)
+  if ms is not None:
+    return ms
+
+  try:
+    if ts[-1] == "Z":
+      ms = _parse_prefix(ts[:19])
+      if len(ts) == 20:
+        if len(_seconds_cache) >= _CACHE_SIZE:
+          _seconds_cache.clear()
+        _seconds_cache[ts] = ms
+        return ms
+      if ts[19] == ".":
+        fraction = ts[20:-1]
+        return ms + (_FRACTION_MS.get(fraction) or _FRACTION_MS[fraction[:3]])
+  except (ValueError, KeyError, IndexError):
+    pass
+
+  t = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+  return int(t.timestamp() * 1000)
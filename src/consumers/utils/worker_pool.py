@@ -0,0 +1,49 @@
+import queue
+import threading
+
+_STOP = object()
+
+
+class KeyedWorkerPool:
+  """Bounded thread pool that keeps tasks with the same key in order.
+
+  Every key is pinned to one worker lane, so tasks for a key run serially
+  while different keys proceed in parallel. A full lane blocks submit(),
+  which throttles the poll loop instead of buffering without limit.
+  """
+
+  def __init__(self, num_workers, queue_size=1000, name="worker"):
+    self._queues = [queue.Queue(maxsize=queue_size) for _ in range(num_workers)]
+    self._threads = [
+      threading.Thread(target=self._run, args=(q,), name=f"{name}-{i}", daemon=True)
+      for i, q in enumerate(self._queues)
+    ]
+    for thread in self._threads:
+      thread.start()
+
+  def submit(self, key, fn, *args):
+    lane = self._queues[hash(key) % len(self._queues)]
+    lane.put((fn, args))
+
+  def join(self):
+    for q in self._queues:
+      q.join()
+
+  def shutdown(self):
+    for q in self._queues:
+      q.put(_STOP)
+    for thread in self._threads:
+      thread.join()
+
+  def _run(self, q):
+    while True:
+      item = q.get()
+      try:
+        if item is _STOP:
+          return
+        fn, args = item
+        fn(*args)
+      except Exception as e:
+        print(f"[WorkerPool] Task Failed: {e}")
+      finally:
+        q.task_done()
@@ -0,0 +1,119 @@
+"""partition anomaly_events by day
+
+Revision ID: partition_anomaly_events
+Revises: add_id_column
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'partition_anomaly_events'
+down_revision: Union[str, Sequence[str], None] = 'add_id_column'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# days made ahead here; after this consumers.db.partitions keeps them coming
+PREMAKE_DAYS = 3
+
+COLUMNS = """
+    id TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    is_alert BOOLEAN,
+    alert_type TEXT,
+    alert_level TEXT,
+    alert_title TEXT,
+    alert_message TEXT,
+    user_id TEXT,
+    tags JSONB,
+    metrics JSONB"""
+
+
+def _create_day(day):
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    op.execute(f"""
+        CREATE TABLE anomaly_events_p{day:%Y%m%d} PARTITION OF anomaly_events
+        FOR VALUES FROM ('{start.isoformat()}')
+        TO ('{(start + timedelta(days=1)).isoformat()}')
+    """)
+
+
+def upgrade() -> None:
+    """Rebuild anomaly_events range-partitioned by UTC day on timestamp.
+
+    The primary key becomes (id, timestamp), as a partitioned table's keys
+    must hold the partition column; rows without a timestamp get the time
+    of the migration. Existing rows are copied across, so this takes as
+    long as the table is large.
+    """
+    op.execute(
+        "ALTER TABLE anomaly_events RENAME TO anomaly_events_unpartitioned")
+    op.execute(
+        "ALTER INDEX IF EXISTS anomaly_events_pkey "
+        "RENAME TO anomaly_events_unpartitioned_pkey")
+    op.execute(
+        "ALTER INDEX IF EXISTS ix_anomaly_events_id "
+        "RENAME TO ix_anomaly_events_unpartitioned_id")
+
+    op.execute(f"""
+        CREATE TABLE anomaly_events ({COLUMNS},
+          PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.create_index(op.f('ix_anomaly_events_timestamp'),
+                    'anomaly_events', ['timestamp'], unique=False)
+    op.execute(
+        "CREATE TABLE anomaly_events_default PARTITION OF anomaly_events DEFAULT")
+
+    conn = op.get_bind()
+    days = {row[0] for row in conn.execute(sa.text("""
+        SELECT DISTINCT (timestamp AT TIME ZONE 'UTC')::date
+        FROM anomaly_events_unpartitioned WHERE timestamp IS NOT NULL
+    """))}
+    today = datetime.now(timezone.utc).date()
+    days.update(today + timedelta(days=offset)
+                for offset in range(-1, PREMAKE_DAYS + 1))
+    for day in sorted(days):
+        _create_day(day)
+
+    op.execute("""
+        INSERT INTO anomaly_events
+        SELECT id, COALESCE(timestamp, now()), is_alert, alert_type,
+               alert_level, alert_title, alert_message, user_id, tags, metrics
+        FROM anomaly_events_unpartitioned
+    """)
+    op.execute("DROP TABLE anomaly_events_unpartitioned")
+
+
+def downgrade() -> None:
+    """Put the rows back into a plain anomaly_events keyed on id."""
+    op.execute(
+        "ALTER TABLE anomaly_events RENAME TO anomaly_events_partitioned")
+    op.execute(
+        "ALTER INDEX IF EXISTS anomaly_events_pkey "
+        "RENAME TO anomaly_events_partitioned_pkey")
+    op.execute(
+        "ALTER INDEX IF EXISTS ix_anomaly_events_timestamp "
+        "RENAME TO ix_anomaly_events_partitioned_timestamp")
+
+    op.execute(f"""
+        CREATE TABLE anomaly_events ({COLUMNS},
+          PRIMARY KEY (id)
+        )
+    """)
+    op.alter_column('anomaly_events', 'timestamp', nullable=True)
+    op.create_index(op.f('ix_anomaly_events_id'),
+                    'anomaly_events', ['id'], unique=False)
+
+    # ids are unique per timestamp only now; keep the first of a repeat
+    op.execute("""
+        INSERT INTO anomaly_events
+        SELECT * FROM anomaly_events_partitioned
+        ON CONFLICT (id) DO NOTHING
+    """)
+    op.execute("DROP TABLE anomaly_events_partitioned CASCADE")
@@ -19,10 +19,10 @@ def send_log(self, log_data, topic="logs"):
     try:
       future = self.producer.send(
         topic,
-        json.dumps(log_data).encode('utf-8')
-        ## TODO
-        # key=log_data.get("service"),
-        # value=json.dumps(log_data).encode('utf-8')
+        json.dumps(log_data).encode('utf-8'),
+        # keyed so a service's logs stay in one partition, where the
+        # partition-scoped analyzer windows count them
+        key=log_data.get("service").encode('utf-8')
       )
       result = future.get(timeout=10)
       print(f"Log sent to topic {topic}: {log_data}")
@@ -35,9 +35,8 @@ def send_metric(self, metric_data, topic="metrics"):
     try:
       future = self.producer.send(
         topic,
-        json.dumps(metric_data).encode('utf-8')
-        # key=metric_data.get("service"),
-        # value=metric_data
+        json.dumps(metric_data).encode('utf-8'),
+        key=metric_data.get("service").encode('utf-8')
       )
       result = future.get(timeout=10)
       print(f"Metric sent to topic {topic}: {metric_data}")
@@ -50,9 +49,8 @@ def send_transaction(self, transaction_data, topic="transactions"):
     try:
         future = self.producer.send(
             topic,
-            json.dumps(transaction_data).encode('utf-8')
-            # key=transaction_data.get("transaction_id"),
-            # value=transaction_data
+            json.dumps(transaction_data).encode('utf-8'),
+            key=str(transaction_data.get("user_id")).encode('utf-8')
         )
         result = future.get(timeout=10)
         print(f"Transaction sent to topic {topic}: {transaction_data}")
@@ -0,0 +1,38 @@
+from consumers.utils.alert_cooldown import AlertCooldown
+
+
+def _high_amount(user_id, second):
+  # shaped like the transaction rules' alerts: user_id only in tags
+  return {
+    "alert_type": "HIGH_AMOUNT", "service": "transaction-service",
+    "timestamp": f"2026-02-28T00:00:{second:02d}Z", "tags": {"user_id": user_id},
+  }
+
+
+def test_users_cool_down_separately():
+  cooldown = AlertCooldown(60)
+  assert cooldown.allow(_high_amount(1, 0))
+  assert cooldown.allow(_high_amount(2, 1))
+  assert cooldown.allow(_high_amount(3, 2))
+  assert not cooldown.allow(_high_amount(1, 3))
+  assert cooldown.stats() == {"keys": 3, "emitted": 3, "suppressed": 1}
+
+
+def test_repeat_after_window_carries_suppressed_count():
+  cooldown = AlertCooldown(2)
+  cooldown.allow(_high_amount(1, 0))
+  cooldown.allow(_high_amount(1, 1))
+  alert = _high_amount(1, 2)
+  assert cooldown.allow(alert)
+  assert alert["tags"]["suppressed_count"] == 1
+
+
+def test_alert_with_null_tags_carries_suppressed_count():
+  cooldown = AlertCooldown(2)
+  first = {**_high_amount(1, 0), "tags": None, "user_id": 1}
+  repeat = {**_high_amount(1, 1), "tags": None, "user_id": 1}
+  alert = {**_high_amount(1, 2), "tags": None, "user_id": 1}
+  assert cooldown.allow(first)
+  assert not cooldown.allow(repeat)
+  assert cooldown.allow(alert)
+  assert alert["tags"] == {"suppressed_count": 1}
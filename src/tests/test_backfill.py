@@ -0,0 +1,36 @@
+import json
+
+import ulid
+
+from consumers.backfill import read_alerts, to_row
+
+
+def _alert(**fields):
+  return {"timestamp": "2026-02-28T00:00:00.25Z", "alert_type": "HIGH_AMOUNT",
+          "tags": {"user_id": 7}, **fields}
+
+
+def test_alert_without_id_gets_the_same_id_every_run():
+  assert to_row(_alert())[0] == to_row(_alert())[0]
+  assert to_row(_alert())[0] != to_row(_alert(tags={"user_id": 8}))[0]
+
+
+def test_derived_id_leads_with_the_alert_time():
+  assert ulid.from_str(to_row(_alert())[0]).timestamp().int == 1772236800250
+
+
+def test_given_id_is_kept():
+  assert to_row(_alert(id="01JKEEP"))[0] == "01JKEEP"
+
+
+def test_lines_without_a_valid_timestamp_are_skipped(tmp_path, capsys):
+  path = tmp_path / "alerts.jsonl"
+  lines = [_alert(), _alert(timestamp="2026-02-30T00:00:00Z"), "{not json",
+           _alert(timestamp="yesterday"), _alert(timestamp=1772236800), _alert(timestamp=None),
+           _alert(id="01JLAST")]
+  path.write_text("\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines))
+  alerts = list(read_alerts([str(path)]))
+  assert [alert.get("id") for alert in alerts] == [None, "01JLAST"]
+  skipped = capsys.readouterr().out.splitlines()
+  assert [line.split(": ")[0] for line in skipped] == [f"[BACKFILL] Skipped {path}:{n}" for n in range(2, 7)]
+  assert len({to_row(alert)[0] for alert in alerts}) == 2
@@ -0,0 +1,106 @@
+from kafka.structs import TopicPartition
+
+from consumers.base_consumer import BaseConsumer
+
+TP = TopicPartition("logs", 0)
+
+
+class _Kafka:
+  def __init__(self):
+    self.commits = []
+
+  def commit(self, offsets):
+    self.commits.append({tp: meta.offset for tp, meta in offsets.items()})
+
+
+class _Consumer(BaseConsumer):
+  # before_commit stands in for a flush, during which a worker finishes
+  # offset 1 and buffers its row after the flush has started
+  def __init__(self):
+    super().__init__(["logs"], "group", ["broker"], batch_size=10)
+    self.consumer = _Kafka()
+    self.flush_ok = True
+
+  def before_commit(self):
+    self.offset_tracker.complete(TP, 1)
+    return self.flush_ok
+
+  def process_message(self, message, meta=None):
+    pass
+
+
+def _consumer():
+  consumer = _Consumer()
+  for offset in (0, 1):
+    consumer.offset_tracker.track(TP, offset)
+  consumer.offset_tracker.complete(TP, 0)
+  return consumer
+
+
+def test_record_finished_during_flush_waits_for_next_commit():
+  consumer = _consumer()
+  consumer._maybe_commit(force=True)
+  assert consumer.consumer.commits == [{TP: 1}]
+  consumer._maybe_commit(force=True)
+  assert consumer.consumer.commits[-1] == {TP: 2}
+
+
+def test_failed_flush_holds_offsets():
+  consumer = _consumer()
+  consumer.flush_ok = False
+  consumer._maybe_commit(force=True)
+  assert consumer.consumer.commits == []
+  consumer.flush_ok = True
+  consumer._maybe_commit(force=True)
+  assert consumer.consumer.commits == [{TP: 2}]
+
+
+class _Record:
+  topic, partition, key, value = "logs", 0, None, b"{}"
+
+  def __init__(self, offset):
+    self.offset = offset
+
+
+class _MessageConsumer(BaseConsumer):
+  # the per-message loop: offset 0 fails, and the database is down
+  def __init__(self):
+    super().__init__(["logs"], "group", ["broker"])
+    self.consumer = _Messages(self)
+    self.polls = 0
+
+  def before_commit(self):
+    return False
+
+  def on_poll(self):
+    self.polls += 1
+
+  def process_message(self, message, meta=None):
+    if message == {} and self.consumer.position == 1:
+      raise ValueError("bad record")
+
+  def deserialize(self, topic, value):
+    return {}
+
+
+class _Messages(_Kafka):
+  def __init__(self, owner):
+    super().__init__()
+    self.owner = owner
+    self.position = 0
+
+  def __iter__(self):
+    for offset in range(3):
+      self.position = offset + 1
+      yield _Record(offset)
+    self.owner.stop()
+
+  def close(self):
+    pass
+
+
+def test_per_message_loop_survives_errors_and_polls_while_commits_are_held():
+  consumer = _MessageConsumer()
+  consumer.start()
+  assert consumer.polls == 2
+  assert consumer.consumer.commits == []
@@ -0,0 +1,74 @@
+import pickle
+import random
+
+import pytest
+
+from consumers.analyzers.baseline import StreamingBaseline
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.rule_engine import load_rules
+from consumers.events import convert_event
+
+
+def _steady(baseline, key="api", n=500, seed=15):
+  rng = random.Random(seed)
+  for _ in range(n):
+    baseline.update(key, rng.gauss(40.0, 2.0))
+
+
+def test_scores_are_zero_until_warm():
+  baseline = StreamingBaseline(["cpu"], warmup=5)
+  scores = [baseline.update("api", 40.0 + i % 2) for i in range(5)]
+  assert scores == [(0.0, 0.0)] * 5
+  assert baseline.update("api", 90.0)[0] > 0.0
+
+
+def test_spike_is_scored_against_the_baseline_before_it():
+  baseline = StreamingBaseline(["cpu"], quantiles=(0.5, 0.99))
+  _steady(baseline)
+  mean, std, estimates = baseline.get("api", "cpu")
+  assert mean == pytest.approx(40.0, abs=1.0)
+  assert std == pytest.approx(2.0, abs=0.7)
+  assert estimates[0.5] == pytest.approx(40.0, abs=1.0)
+  assert estimates[0.5] < estimates[0.99]
+
+  z, pct = baseline.update("api", 70.0)
+  assert z == pytest.approx((70.0 - mean) / std)
+  assert pct == 0.99
+  assert baseline.update("api", 40.0)[1] in (0.0, 0.5)
+
+
+def test_keys_are_scored_separately_and_evicted_oldest_first():
+  baseline = StreamingBaseline(["cpu", "latency_ms"], warmup=1, max_keys=2)
+  baseline.update("a", 1.0, 100.0)
+  baseline.update("b", 1.0, 100.0)
+  baseline.update("a", 1.0, 100.0)
+  baseline.update("c", 1.0, 100.0)
+  assert len(baseline) == 2
+  assert baseline.get("b", "cpu") is None
+  assert baseline.stats() == {"keys": 2, "evicted_keys": 1}
+  assert len(baseline.update("a", 2.0, 200.0)) == 4
+
+
+def test_snapshot_restores_into_a_matching_layout_only():
+  baseline = StreamingBaseline(["cpu"])
+  _steady(baseline)
+  restored = StreamingBaseline(["cpu"])
+  # snapshots share state with the live baseline until they are pickled
+  restored.restore(pickle.loads(pickle.dumps(baseline.snapshot())))
+  assert restored.update("api", 60.0) == baseline.update("api", 60.0)
+  with pytest.raises(ValueError):
+    StreamingBaseline(["latency_ms"]).restore(baseline.snapshot())
+
+
+def test_cpu_anomaly_rule_fires_on_a_spike():
+  analyzer = MetricsAnalyzer(load_rules())
+  rng = random.Random(15)
+
+  def process(second, cpu):
+    return [alert["alert_type"] for alert in analyzer.process(convert_event("metrics", {
+      "timestamp": f"2026-02-28T00:{second // 60:02d}:{second % 60:02d}Z",
+      "service": "api", "cpu": cpu, "latency_ms": 100, "message": "", "user_id": 1}))]
+
+  quiet = [process(second, round(rng.gauss(30.0, 2.0), 1)) for second in range(200)]
+  assert not any("CPU_ANOMALY" in types for types in quiet)
+  assert "CPU_ANOMALY" in process(200, 60.0)
@@ -0,0 +1,77 @@
+import copy
+import json
+import random
+from datetime import datetime, timedelta
+
+from consumers.analyzers.batch import MetricsBatch
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import convert_event
+
+START = datetime(2026, 1, 1)
+
+
+def _config():
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    return json.load(f)
+
+
+def _metrics(seed=17, n=3000):
+  # about 15 minutes of three services, with hot and slow stretches so the
+  # window, latency and baseline rules all fire
+  rng = random.Random(seed)
+  events = []
+  for i in range(n):
+    hot = (i // 400) % 2
+    events.append(convert_event("metrics", {
+      "timestamp": (START + timedelta(milliseconds=300 * i)).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+      "service": rng.choice(["auth", "order", "pay"]),
+      "cpu": round(rng.uniform(70, 100) if hot else rng.gauss(40, 5), 1),
+      "latency_ms": rng.choice([rng.randint(50, 300)] * 19 + [rng.randint(1001, 5000)]),
+      "message": "", "user_id": rng.randint(1, 50),
+    }))
+  return events
+
+
+def _compare(rules, events, size):
+  batched = MetricsAnalyzer(rules)
+  per_event = MetricsAnalyzer(rules)
+  expected = [alert for event in events for alert in per_event.process(event)]
+  alerts = []
+  for i in range(0, len(events), size):
+    alerts += batched.process_batch(MetricsBatch.from_events(events[i:i + size]))
+  assert alerts == expected
+  assert batched.stats() == per_event.stats()
+  return expected
+
+
+def test_batches_alert_like_the_per_event_evaluator():
+  rules = compile_rules(_config())
+  assert MetricsAnalyzer(rules)._plan.supported
+  events = _metrics()
+  for size in (1, 7, 250, len(events)):
+    alerts = _compare(rules, events, size)
+  assert {alert["alert_type"] for alert in alerts} >= {
+    "HIGH_CPU", "HIGH_LATENCY", "HIGH_CPU_Latency", "CPU_ANOMALY"}
+
+
+def test_unsupported_rules_fall_back_to_per_event():
+  config = copy.deepcopy(_config())
+  config["sources"]["metrics"].append({
+    "name": "timeout_message", "alert_type": "TIMEOUT", "alert_level": "WARNING",
+    "alert_title": "Timeout", "alert_message": "{service}: {hits}",
+    "when": [{"field": "message", "op": "keywords", "value": ["timeout"]}],
+  })
+  rules = compile_rules(config)
+  assert not MetricsAnalyzer(rules)._plan.supported
+  _compare(rules, _metrics(n=500), 100)
+
+
+def test_timestamps_are_parsed_on_first_use():
+  events = _metrics(n=3)
+  batch = MetricsBatch.from_events(events)
+  assert batch.services == [events[0].service] + [
+    s for s in dict.fromkeys(e.service for e in events) if s != events[0].service]
+  assert batch._ts_ms is None
+  assert list(batch.ts_ms) == [1_767_225_600_000, 1_767_225_600_300, 1_767_225_600_600]
@@ -0,0 +1,13 @@
+import pytest
+
+from consumers.utils.copy_loader import _binary_block, _text_block
+
+
+def _row(user_id):
+  return ("01J", "2026-02-28T00:00:00Z", True, "USER_ISSUE", "WARNING",
+          "User Error Detected", "7 too much error", user_id, "{}", "null")
+
+
+@pytest.mark.parametrize("encode", [_text_block, _binary_block])
+def test_int_user_id_encodes_like_its_digits(encode):
+  assert encode([_row(7)]) == encode([_row("7")])
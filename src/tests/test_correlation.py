@@ -0,0 +1,68 @@
+import pytest
+
+from consumers.analyzers.correlation import Correlation, Correlator
+from consumers.analyzers.rule_engine import load_rules
+
+SPEC = {
+  "name": "latency_with_errors", "alert_type": "CORRELATED_INCIDENT",
+  "alert_level": "CRITICAL", "alert_title": "Latency Spike With Errors",
+  "alert_message": "{service}: {signals} within {seconds}s",
+  "signals": ["HIGH_LATENCY", "ERROR_SPIKE"], "key": "service", "seconds": 120,
+}
+
+
+def _alert(alert_type, second, service="api"):
+  return {
+    "alert_type": alert_type, "service": service, "rule": alert_type.lower(),
+    "timestamp": f"2026-02-28T00:{second // 60:02d}:{second % 60:02d}Z",
+  }
+
+
+def test_signals_within_the_window_fire_once():
+  correlator = Correlator([Correlation(SPEC)])
+  assert correlator.observe([_alert("HIGH_LATENCY", 0)]) == []
+  [alert] = correlator.observe([_alert("ERROR_SPIKE", 90)])
+  assert alert["alert_type"] == "CORRELATED_INCIDENT"
+  assert alert["alert_message"] == "api: HIGH_LATENCY, ERROR_SPIKE within 120s"
+  assert alert["service"] == "api"
+  assert alert["timestamp"] == "2026-02-28T00:01:30Z"
+  assert alert["metrics"] == {"span_seconds": 90.0}
+  assert alert["tags"]["signals"]["HIGH_LATENCY"] == {
+    "timestamp": "2026-02-28T00:00:00Z", "rule": "high_latency"}
+  # fires at most once per window per key
+  assert correlator.observe([_alert("ERROR_SPIKE", 100)]) == []
+  assert correlator.stats() == {"keys": 1, "emitted": 1}
+
+
+def test_signals_apart_or_on_other_keys_do_not_fire():
+  correlator = Correlator([Correlation(SPEC)])
+  assert correlator.observe([_alert("HIGH_LATENCY", 0), _alert("ERROR_SPIKE", 121)]) == []
+  assert correlator.observe([_alert("HIGH_LATENCY", 130, service="db")]) == []
+  assert correlator.observe([_alert("HIGH_CPU", 131), _alert("ERROR_SPIKE", 132, service="db")])
+
+
+def test_out_of_order_alerts_keep_the_newest_signal():
+  correlator = Correlator([Correlation(SPEC)])
+  correlator.observe([_alert("HIGH_LATENCY", 200)])
+  correlator.observe([_alert("HIGH_LATENCY", 10)])
+  assert correlator.observe([_alert("ERROR_SPIKE", 250)])
+
+
+def test_least_recent_keys_are_dropped():
+  correlator = Correlator([Correlation(SPEC)], max_keys=2)
+  for second, service in enumerate(("a", "b", "c")):
+    correlator.observe([_alert("HIGH_LATENCY", second, service=service)])
+  assert correlator.stats()["keys"] == 2
+  assert correlator.observe([_alert("ERROR_SPIKE", 5, service="a")]) == []
+  assert correlator.observe([_alert("ERROR_SPIKE", 5, service="c")])
+
+
+@pytest.mark.parametrize("change", [{"signals": ["ERROR_SPIKE", "ERROR_SPIKE"]}, {"seconds": 0}])
+def test_invalid_correlations_are_rejected(change):
+  with pytest.raises(ValueError):
+    Correlation({**SPEC, **change})
+
+
+def test_shipped_rules_load_the_correlation():
+  [correlation] = load_rules().correlations
+  assert correlation.signals == ("HIGH_LATENCY", "ERROR_SPIKE")
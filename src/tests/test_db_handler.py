@@ -0,0 +1,49 @@
+import psycopg2
+import pytest
+
+from consumers.utils.db_handler import DBHandler
+
+
+class _Handler(DBHandler):
+  # no database: a write fails if any row holds an impossible timestamp
+  def connect(self):
+    self.writes = []
+
+  def _write(self, rows):
+    self.writes.append(len(rows))
+    if self.down:
+      raise psycopg2.OperationalError("server closed the connection")
+    if any(row[1].startswith("2026-02-30") for row in rows):
+      raise psycopg2.DataError("date/time field value out of range")
+    self.rows_written += len(rows)
+
+
+@pytest.fixture
+def handler():
+  handler = _Handler(flush_rows=100)
+  handler.down = False
+  return handler
+
+
+def _alert(i, timestamp="2026-02-28T00:00:00Z"):
+  return {"timestamp": timestamp, "alert_type": "HIGH_AMOUNT", "alert_message": str(i)}
+
+
+def test_rejected_rows_are_dropped_not_retried(handler):
+  for i in range(16):
+    handler.insert_analysis_result(_alert(i, "2026-02-30T00:00:00Z") if i == 5 else _alert(i))
+  assert handler.flush()
+  assert handler.stats()["buffered"] == 0
+  assert handler.rows_written == 15
+  assert handler.rejected_rows == 1
+
+
+def test_lost_connection_keeps_rows(handler):
+  for i in range(4):
+    handler.insert_analysis_result(_alert(i))
+  handler.down = True
+  assert not handler.flush()
+  assert handler.stats()["buffered"] == 4
+  handler.down = False
+  assert handler.flush()
+  assert handler.rows_written == 4
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from consumers.analyzers.keyword_matcher import KeywordMatcher, find_card_numbers
+
+KEYWORDS = ["failed", "denied", "unauthorized", "forbidden", "timeout", "he", "she", "hers", "his"]
+
+
+@pytest.mark.parametrize("automaton", [True, False])
+def test_finds_every_keyword_once_ignoring_case(automaton):
+  matcher = KeywordMatcher(KEYWORDS + ["FAILED", ""], automaton=automaton)
+  assert len(matcher) == len(KEYWORDS)
+  assert matcher.find_all("Login FAILED: access Denied, login failed") == ("failed", "denied")
+  assert matcher.find_all("Request processed") == ()
+  assert matcher.find_all("") == ()
+
+
+def test_overlapping_keywords_share_the_scan():
+  # "ushers" holds she, he and hers; the failure links must find them all
+  matcher = KeywordMatcher(KEYWORDS, automaton=True)
+  assert set(matcher.find_all("USHERS")) == {"she", "he", "hers"}
+
+
+def test_automaton_agrees_with_the_substring_scan():
+  rng = random.Random(10)
+  words = KEYWORDS + ["request", "processed", "user", "hi", "fail"]
+  automaton = KeywordMatcher(KEYWORDS, automaton=True)
+  scan = KeywordMatcher(KEYWORDS, automaton=False)
+  for _ in range(500):
+    text = "".join(rng.choice(words + [" ", "x", "ERS"]) for _ in range(rng.randint(0, 12)))
+    text = "".join(ch.upper() if rng.random() < 0.3 else ch for ch in text)
+    assert set(automaton.find_all(text)) == set(scan.find_all(text))
+
+
+def test_large_keyword_sets_use_the_automaton():
+  small = KeywordMatcher(KEYWORDS)
+  large = KeywordMatcher([f"code{n}x" for n in range(KeywordMatcher.SCAN_LIMIT + 1)])
+  assert small.find_all.__name__ == "_find_all_scan"
+  assert large.find_all.__name__ == "find_all"
+  assert large.find_all("error CODE7X raised") == ("code7x",)
+
+
+def test_card_numbers_are_luhn_checked_and_masked():
+  text = "paid with 4111 1111 1111 1111, order 1234567890123, card 5500-0000-0000-0004"
+  assert find_card_numbers(text) == ("************1111", "************0004")
+
+
+def test_card_numbers_ignore_longer_digit_runs():
+  # 20 digits is no card, and a valid card inside a longer run doesn't count
+  assert find_card_numbers("id 41111111111111111110") == ()
+  assert find_card_numbers("ts 1767225600000") == ()
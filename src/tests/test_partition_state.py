@@ -0,0 +1,36 @@
+from consumers.analyzers.partition_state import PartitionState
+from consumers.analyzers.rule_engine import WindowState, load_rules
+from consumers.events import convert_event
+
+
+def _log(service, second):
+  return convert_event("logs", {
+    "timestamp": f"2026-02-28T00:00:{second:02d}Z", "service": service,
+    "level": "INFO", "message": "Request processed", "user_id": 7,
+  })
+
+
+def _user_issues(alerts):
+  return [alert for alert in alerts if alert["alert_type"] == "USER_ISSUE"]
+
+
+def test_user_window_counts_across_partitions():
+  # logs are keyed by service, so one user's logs reach two partitions
+  rules = load_rules()
+  shared = WindowState()
+  shards = [PartitionState(rules, shared), PartitionState(rules, shared)]
+  alerts = []
+  for second in range(10):
+    shard = shards[second % 2]
+    alerts += shard.analyzer("logs").process(_log(f"service-{second % 2}", second))
+  assert len(_user_issues(alerts)) == 1
+
+
+def test_shared_windows_stay_out_of_snapshots():
+  rules = load_rules()
+  shared = WindowState()
+  shard = PartitionState(rules, shared)
+  shard.analyzer("logs").process(_log("service-0", 0))
+  assert set(shared.counters) <= rules.process_ids
+  assert shared.counters
+  assert not set(shard.snapshot()["logs"]["windows"]) & rules.process_ids
@@ -0,0 +1,163 @@
+import copy
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from consumers.analyzers.logs_analyzer import LogsAnalyzer
+from consumers.analyzers.metrics_analyzer import MetricsAnalyzer
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+from consumers.benchmarks import legacy_analyzers
+from consumers.benchmarks.bench_rules import legacy_rules
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import convert_event
+
+# Known differences from the analyzers the rules replaced, each shown by a
+# test below; the parity stream stays clear of them otherwise:
+#   - all-match: every matching rule alerts, the legacy code stopped at the
+#     first (in LEGACY_ORDER)
+#   - HIGH_CPU counts samples with cpu >= ALERT_THRESHOLD, the legacy code
+#     counted every sample of the service
+#   - HIGH_FREQUENCY counts every transaction, the legacy code skipped those
+#     it had flagged HIGH_AMOUNT
+#   - windows count 10s buckets, so an event up to 10s inside the width may
+#     have aged out; the legacy code kept exact timestamps
+LEGACY_ORDER = {
+  "logs": ("ERROR_SPIKE", "LOG_KEYWORD", "USER_ISSUE"),
+  "metrics": ("HIGH_CPU", "HIGH_LATENCY", "HIGH_CPU_Latency"),
+  "transactions": ("HIGH_AMOUNT", "HIGH_FREQUENCY"),
+}
+START = datetime(2026, 1, 1)
+
+
+def _config():
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    return json.load(f)
+
+
+def _pair():
+  rules = compile_rules(legacy_rules(_config()))
+  compiled = {
+    "logs": LogsAnalyzer(rules),
+    "metrics": MetricsAnalyzer(rules),
+    "transactions": TransactionsAnalyzer(rules),
+  }
+  legacy = {
+    "logs": legacy_analyzers.LogsAnalyzer(),
+    "metrics": legacy_analyzers.MetricsAnalyzer(),
+    "transactions": legacy_analyzers.TransactionsAnalyzer(),
+  }
+  return compiled, legacy
+
+
+def _run(source, events):
+  # (legacy alert type or None, compiled alert types) per event
+  compiled, legacy = _pair()
+  decisions = []
+  for data in events:
+    result = legacy[source].process(dict(data))
+    alerts = compiled[source].process(convert_event(source, data))
+    decisions.append((result.get("alert_type"), [alert["alert_type"] for alert in alerts]))
+  return decisions
+
+
+def _at(second):
+  return (START + timedelta(seconds=second)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _log(second, level="ERROR", message="Request processed", user_id=1, service="auth"):
+  return {"timestamp": _at(second), "service": service, "level": level,
+          "message": message, "user_id": user_id}
+
+
+def _metric(second, cpu, latency_ms=100, service="api"):
+  return {"timestamp": _at(second), "service": service, "cpu": cpu,
+          "latency_ms": latency_ms, "message": "", "user_id": 1}
+
+
+def _transaction(second, amount, user_id=1):
+  return {"timestamp": _at(second), "transaction_id": f"t{second}", "amount": amount,
+          "currency": "TWD", "status": "SUCCESS", "user_id": user_id}
+
+
+def _parity_stream(seed=8, n=4000, seconds=150):
+  # shorter than every window, so no event ages out on either side; cpu is
+  # always at the threshold or above, and each high amount is its user's
+  # only transaction
+  rng = random.Random(seed)
+  events = {source: [] for source in LEGACY_ORDER}
+  for i in range(n):
+    second = i * seconds / n
+    source = rng.choice(list(LEGACY_ORDER))
+    if source == "logs":
+      events[source].append(_log(
+        second, level="ERROR" if rng.random() < 0.3 else "INFO",
+        message=rng.choice(["Request processed", "Login failed", "Payment FAILED", "Timeout"]),
+        user_id=rng.randint(1, 40), service=rng.choice(["auth", "order", "pay"])))
+    elif source == "metrics":
+      events[source].append(_metric(
+        second, cpu=rng.choice([80.0, round(rng.uniform(80, 100), 1)]),
+        latency_ms=rng.randint(100, 1500), service=rng.choice(["auth", "order", "pay"])))
+    elif rng.random() < 0.05:
+      events[source].append(_transaction(second, rng.randint(10001, 50000), user_id=1000 + i))
+    else:
+      events[source].append(_transaction(second, rng.randint(1, 10000), user_id=rng.randint(1, 30)))
+  return events
+
+
+@pytest.mark.parametrize("source", list(LEGACY_ORDER))
+def test_compiled_rules_match_the_legacy_analyzers(source):
+  order = LEGACY_ORDER[source]
+  decisions = _run(source, _parity_stream()[source])
+  for legacy_type, compiled_types in decisions:
+    assert set(compiled_types) <= set(order)
+    assert legacy_type == next((t for t in order if t in compiled_types), None)
+  # every rule fired somewhere in the stream (legacy HIGH_CPU_Latency is
+  # shadowed by HIGH_LATENCY, so only the compiled rule ever raises it)
+  assert {t for _, compiled_types in decisions for t in compiled_types} == set(order)
+
+
+def test_known_difference_all_match():
+  events = [_log(second) for second in range(19)]
+  events.append(_log(19, message="Login failed"))
+  legacy_type, compiled_types = _run("logs", events)[-1]
+  assert legacy_type == "ERROR_SPIKE"
+  assert compiled_types == ["ERROR_SPIKE", "LOG_KEYWORD"]
+
+
+def test_known_difference_high_cpu_counts_hot_samples_only():
+  decisions = _run("metrics", [_metric(second, cpu=50.0) for second in range(30)])
+  assert decisions[-1] == ("HIGH_CPU", [])
+
+
+def test_known_difference_flagged_amounts_count_toward_frequency():
+  decisions = _run("transactions", [_transaction(second, 20000) for second in range(5)])
+  assert decisions[-1] == ("HIGH_AMOUNT", ["HIGH_AMOUNT", "HIGH_FREQUENCY"])
+
+
+def test_known_difference_bucketed_windows():
+  # the first error is 180s before the last, in a bucket that has aged out
+  events = [_log(5)] + [_log(180 + second / 10) for second in range(18)] + [_log(185)]
+  assert _run("logs", events)[-1] == ("ERROR_SPIKE", [])
+
+
+def _compile(spec):
+  config = copy.deepcopy(_config())
+  config["sources"]["logs"].append({
+    "name": "broken", "alert_type": "BROKEN", "alert_level": "WARNING",
+    "alert_title": "Broken", "alert_message": "broken", **spec,
+  })
+  return compile_rules(config)
+
+
+@pytest.mark.parametrize("spec, error", [
+  ({"when": [{"field": "service-name", "op": "==", "value": "x"}]}, "invalid event field"),
+  ({"when": [{"field": "service", "op": "~=", "value": "x"}]}, "unknown op"),
+  ({"window": {"key": "user id", "seconds": 60, "min_count": 2}}, "invalid event field"),
+  ({"alert_message": "{hits}"}, "uses hits without"),
+])
+def test_invalid_rules_are_rejected(spec, error):
+  with pytest.raises(ValueError, match=error):
+    _compile(spec)
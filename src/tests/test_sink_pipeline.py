@@ -0,0 +1,18 @@
+from consumers.utils.sink_pipeline import SinkPipeline
+
+
+def test_lane_survives_a_raising_flush():
+  failures = [AttributeError("'int' object has no attribute 'encode'")]
+
+  def flush():
+    if failures:
+      raise failures.pop()
+    return True
+
+  sinks = SinkPipeline(queue_size=10, retry_seconds=0.01)
+  sinks.add("db", lambda item: None, flush=flush)
+  sinks.start()
+  sinks.submit({"alert_type": "USER_ISSUE"})
+  assert sinks.acked(sinks.mark(), timeout=5)
+  assert sinks.stats()["db"]["failed_flushes"] == 1
+  sinks.close(1)
@@ -0,0 +1,113 @@
+import pickle
+import random
+
+from consumers.analyzers.partition_state import PartitionState
+from consumers.analyzers.rule_engine import WindowState, load_rules
+from consumers.analyzers.sketch import HybridWindowCounter, WindowedCountMinSketch
+from consumers.analyzers.window import SlidingWindowCounter
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import convert_event
+
+WINDOW = 300
+MIN_COUNT = 5
+EXACT_FROM = 3
+
+
+def _stream(seed, n=6000, users=300, step_ms=500):
+  # several windows long, a tenth of the users sending a third of the events
+  rng = random.Random(seed)
+  ts_ms = 1_767_225_600_000
+  stream = []
+  for _ in range(n):
+    ts_ms += rng.randint(0, step_ms)
+    user = rng.randrange(users // 10) if rng.random() < 0.3 else rng.randrange(users)
+    stream.append((user, ts_ms))
+  return stream
+
+
+def _alerts(counter, stream):
+  return {i for i, (user, ts_ms) in enumerate(stream) if counter.add(user, ts_ms) >= MIN_COUNT}
+
+
+def test_sketch_never_counts_below_the_window():
+  # 64 columns for 300 users: crowded, so estimates collide
+  sketch = WindowedCountMinSketch(WINDOW, 50, epsilon=0.05, delta=0.1)
+  exact = SlidingWindowCounter(WINDOW, 50)
+  stream = _stream(1)
+  for user, ts_ms in stream:
+    assert sketch.add(user, ts_ms) >= exact.add(user, ts_ms)
+    history = sketch.history(user)
+    assert sum(count for _, count in history) <= sketch.estimate(user)
+    for start_ms, count in history:
+      assert count >= exact.buckets(user).get(start_ms // 50_000, 0)
+  oldest = stream[-1][1] // 50_000 - 5
+  assert sketch.events == sum(1 for _, ts_ms in stream if ts_ms // 50_000 >= oldest)
+
+
+def test_sketch_forgets_events_once_the_window_slides_past():
+  sketch = WindowedCountMinSketch(60, 10)
+  sketch.add("a", 0)
+  sketch.add("a", 55_000)
+  assert sketch.estimate("a") == 2
+  assert sketch.add("b", 65_000) == 1
+  assert sketch.estimate("a") == 1
+  assert sketch.add("b", 1_000_000) == 1
+  assert (sketch.estimate("a"), sketch.events) == (0, 1)
+
+
+def test_promoted_key_seed_ages_out_with_the_events_it_stands_for():
+  hybrid = HybridWindowCounter(WINDOW, EXACT_FROM)
+  exact = SlidingWindowCounter(WINDOW)
+  # promoted at 200s with three events spread over the window; by 440s the
+  # ones at 0s and 100s have aged out
+  counts = [(hybrid.add(1, s * 1000), exact.add(1, s * 1000)) for s in (0, 100, 200, 420, 430, 440)]
+  assert 1 in hybrid
+  assert counts[-1] == (4, 4)
+  assert all(count < MIN_COUNT for pair in counts for count in pair)
+
+
+def test_hybrid_alerts_match_exact_counting_across_windows():
+  # exact buckets as wide as the sketch's: the seed is then the true count
+  stream = _stream(2)
+  hybrid = HybridWindowCounter(WINDOW, EXACT_FROM, bucket_seconds=WINDOW // 6)
+  exact = SlidingWindowCounter(WINDOW, WINDOW // 6)
+  assert stream[-1][1] - stream[0][1] > 4 * WINDOW * 1000
+  assert _alerts(hybrid, stream) == _alerts(exact, stream)
+  assert hybrid.promoted_keys
+
+
+def test_hybrid_never_misses_an_alert():
+  for epsilon in (0.0001, 0.05):
+    stream = _stream(3)
+    hybrid = HybridWindowCounter(WINDOW, EXACT_FROM, epsilon=epsilon, delta=0.1)
+    exact_alerts = _alerts(SlidingWindowCounter(WINDOW), stream)
+    assert exact_alerts <= _alerts(hybrid, stream)
+
+
+def test_hybrid_snapshot_round_trip():
+  stream = _stream(4, n=2000)
+  hybrid = HybridWindowCounter(WINDOW, EXACT_FROM)
+  for user, ts_ms in stream[:1000]:
+    hybrid.add(user, ts_ms)
+  restored = HybridWindowCounter(WINDOW, EXACT_FROM)
+  restored.restore(pickle.loads(pickle.dumps(hybrid.snapshot())))
+  assert restored.stats() == hybrid.stats()
+  for user, ts_ms in stream[1000:]:
+    assert restored.add(user, ts_ms) == hybrid.add(user, ts_ms)
+
+
+def test_sketch_windows_are_one_per_process(monkeypatch):
+  monkeypatch.setattr(AnalyzerConfig, "SKETCH_WINDOWS", True)
+  rules = load_rules()
+  sketch_ids = {rule.window_id for rule in rules.rules if rule.window_id and rule.window_id[4]}
+  assert sketch_ids and sketch_ids <= rules.process_ids
+
+  shared = WindowState()
+  shards = [PartitionState(rules, shared), PartitionState(rules, shared)]
+  for second, shard in enumerate(shards):
+    shard.analyzer("transactions").process(convert_event("transactions", {
+      "timestamp": f"2026-02-28T00:00:{second:02d}Z", "transaction_id": f"t{second}",
+      "amount": 100, "currency": "TWD", "status": "SUCCESS", "user_id": second,
+    }))
+  assert [type(counter) for counter in shared.counters.values()].count(HybridWindowCounter) == 1
+  assert not any(state_id[4] for state_id in shards[0].snapshot()["transactions"]["windows"])
@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from consumers.utils.timestamps import parse_epoch_ms
+
+
+def test_parses_whole_and_fractional_seconds():
+  assert parse_epoch_ms("2026-02-28T00:00:00Z") == 1772236800000
+  assert parse_epoch_ms("2026-02-28T00:00:00.25Z") == 1772236800250
+
+
+@pytest.mark.parametrize("ts", [
+  "2026-02-30T00:00:00Z",
+  "2026-13-01T00:00:00Z",
+  "2026-01-01T24:00:00Z",
+  "2026-01-01T00:60:00.5Z",
+])
+def test_rejects_impossible_dates(ts):
+  with pytest.raises(ValueError):
+    parse_epoch_ms(ts)
+
+
+def test_naive_string_is_not_read_from_the_utc_cache(monkeypatch):
+  # a naive string is local time, however its UTC twin was parsed before
+  monkeypatch.setenv("TZ", "Asia/Taipei")
+  time.tzset()
+  try:
+    local = parse_epoch_ms("2026-01-01T00:00:00")
+    assert parse_epoch_ms("2026-01-01T00:00:00Z") == 1767225600000
+    assert parse_epoch_ms("2026-01-01T00:00:00") == local == 1767196800000
+  finally:
+    monkeypatch.undo()
+    time.tzset()
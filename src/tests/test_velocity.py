@@ -0,0 +1,121 @@
+import math
+import pickle
+import random
+
+from consumers.analyzers.rule_engine import load_rules
+from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+from consumers.analyzers.velocity import AmountVelocity
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import convert_event
+
+WINDOWS = (60, 300, 3600)
+START_MS = 1_767_225_600_000
+
+
+def _expected(events, key, ts_ms, buckets=10):
+  # (sum, count) per window from the raw events, at bucket granularity
+  totals = []
+  for seconds in WINDOWS:
+    bucket_ms = seconds * 1000 // buckets
+    newest = ts_ms // bucket_ms
+    amounts = [amount for k, t, amount in events
+               if k == key and newest - buckets < t // bucket_ms <= newest]
+    totals += [sum(a for a in amounts if a == a), len(amounts)]
+  return totals
+
+
+def test_running_sums_match_the_events_in_each_window():
+  rng = random.Random(19)
+  velocity = AmountVelocity(WINDOWS)
+  events = []
+  ts_ms = START_MS
+  for _ in range(3000):
+    ts_ms += rng.randint(0, 5000)
+    event = (rng.randrange(20), ts_ms, float(rng.randint(1, 100_000)))
+    events.append(event)
+    totals = velocity.update(*event)
+    expected = _expected(events, event[0], ts_ms)
+    assert totals[1::2] == expected[1::2]
+    assert all(math.isclose(a, b, abs_tol=1e-6) for a, b in zip(totals[0::2], expected[0::2]))
+  assert velocity.get(event[0]) == tuple(totals)
+
+
+def test_sliding_takes_expired_slots_off_the_totals():
+  velocity = AmountVelocity((60,))
+  velocity.update("a", START_MS, 0.1)
+  velocity.update("a", START_MS + 1000, 0.2)
+  assert velocity.update("a", START_MS + 7000, 0.3) == [0.1 + 0.2 + 0.3, 3]
+  # 6s buckets: 60s on, the first bucket has slid out
+  [total, count] = velocity.update("a", START_MS + 60_000, math.nan)
+  assert math.isclose(total, 0.3) and count == 2
+  # once every event has slid out the sum starts again from 0
+  assert velocity.update("a", START_MS + 126_000, 5.0) == [5.0, 1]
+
+
+def test_nan_amounts_are_counted_not_summed():
+  velocity = AmountVelocity(WINDOWS)
+  velocity.update(1, START_MS, 100.0)
+  assert velocity.update(1, START_MS + 1000, math.nan) == [100.0, 2] * 3
+
+
+def test_late_events_outside_the_window_are_not_counted():
+  velocity = AmountVelocity((60,))
+  velocity.update(1, START_MS + 120_000, 10.0)
+  assert velocity.update(1, START_MS, 99.0) == [10.0, 1]
+
+
+def test_idle_and_excess_keys_are_dropped():
+  velocity = AmountVelocity((60, 300), max_keys=2)
+  velocity.update("a", START_MS, 1.0)
+  velocity.update("b", START_MS, 1.0)
+  velocity.update("c", START_MS, 1.0)
+  assert velocity.get("a") is None and velocity.stats()["evicted_keys"] == 1
+  # an hour and a bit later b and c are idle; c's new event starts it afresh
+  assert velocity.update("c", START_MS + 4_000_000, 1.0) == [1.0, 1, 1.0, 1]
+  assert velocity.get("b") is None and velocity.stats()["expired_keys"] == 2
+  assert len(velocity) == 1
+
+
+def test_snapshot_round_trip():
+  velocity = AmountVelocity(WINDOWS)
+  for i in range(50):
+    velocity.update(i % 5, START_MS + i * 7000, float(i))
+  restored = AmountVelocity(WINDOWS)
+  restored.restore(pickle.loads(pickle.dumps(velocity.snapshot())))
+  assert restored.update(1, START_MS + 400_000, 1.0) == velocity.update(1, START_MS + 400_000, 1.0)
+
+
+def _transaction(second, amount, currency="TWD", user_id=7):
+  return convert_event("transactions", {
+    "timestamp": f"2026-02-28T00:{second // 60:02d}:{second % 60:02d}Z",
+    "transaction_id": f"t{second}", "amount": amount, "currency": currency,
+    "status": "SUCCESS", "user_id": user_id,
+  })
+
+
+def test_velocity_rules_are_opt_in(monkeypatch):
+  rules = load_rules()
+  assert not rules.velocities and rules.rates is None
+  assert {rule.name for rule in rules.rules} & {"amount_burst", "structuring"} == set()
+
+  monkeypatch.setattr(AnalyzerConfig, "VELOCITY_RULES", True)
+  analyzer = TransactionsAnalyzer(load_rules())
+  assert analyzer.process(_transaction(0, 5000, currency="USD")) == []
+  [burst] = analyzer.process(_transaction(1, 5000, currency="USD"))
+  assert burst["alert_type"] == "AMOUNT_BURST"
+  assert burst["metrics"]["sum_1m"] == 2 * 5000 * 32.2
+  # no rate: counted toward the window, not summed
+  [burst] = [alert for alert in analyzer.process(_transaction(2, 10**6, currency="XXX"))
+             if alert["alert_type"] == "AMOUNT_BURST"]
+  assert (burst["metrics"]["sum_1m"], burst["metrics"]["count_1m"]) == (2 * 5000 * 32.2, 3)
+  assert analyzer.rules.rates.unknown == {"XXX": 1}
+
+
+def test_inline_rate_lookup_converts_like_the_rate_table(monkeypatch):
+  monkeypatch.setattr(AnalyzerConfig, "VELOCITY_RULES", True)
+  rules = load_rules()
+  analyzer = TransactionsAnalyzer(rules)
+  for second, (amount, currency) in enumerate([(100, "TWD"), (7, "JPY"), (3, "GBP")]):
+    analyzer.process(_transaction(second, amount, currency=currency, user_id=second))
+    [state] = analyzer.windows.velocities.values()
+    assert state.get(second)[0] == rules.rates.convert(amount, currency)
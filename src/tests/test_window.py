@@ -0,0 +1,111 @@
+import copy
+import json
+import pickle
+import random
+
+import pytest
+
+from consumers.analyzers.rule_engine import compile_rules
+from consumers.analyzers.transactions_analyzer import TransactionsAnalyzer
+from consumers.analyzers.window import LEVELS, MultiResolutionCounter, SlidingWindowCounter, levels_for
+from consumers.config.settings import AnalyzerConfig
+from consumers.events import convert_event
+
+START_MS = 1_767_225_600_000
+
+
+def _stream(seed, n=5000, keys=10, step_ms=4000):
+  rng = random.Random(seed)
+  ts_ms = START_MS
+  stream = []
+  for _ in range(n):
+    ts_ms += rng.randint(0, step_ms)
+    stream.append((rng.randrange(keys), ts_ms))
+  return stream
+
+
+@pytest.mark.parametrize("seconds, levels", [
+  (60, ((10, 6),)),
+  (300, ((10, 30),)),
+  (301, LEVELS[:2]),
+  (60 * 59, LEVELS[:2]),
+  (60 * 59 + 1, LEVELS),
+  (3600 * 23, LEVELS),
+])
+def test_levels_cover_the_window(seconds, levels):
+  assert levels_for(seconds) == levels
+
+
+def test_windows_wider_than_the_levels_are_rejected():
+  with pytest.raises(ValueError):
+    levels_for(3600 * 23 + 1)
+  with pytest.raises(ValueError):
+    MultiResolutionCounter(((10, 30), (15, 60)))
+
+
+def test_one_level_counts_like_a_sliding_window():
+  stream = _stream(1, step_ms=20_000)
+  multi = MultiResolutionCounter(levels_for(180), idle_ttl_seconds=60)
+  sliding = SlidingWindowCounter(180, idle_ttl_seconds=60)
+  for key, ts_ms in stream:
+    assert multi.add(key, ts_ms) == sliding.add(key, ts_ms)
+    assert multi.buckets(key) == sliding.buckets(key)
+  assert (multi.watermark, multi.stats()) == (sliding.watermark, sliding.stats())
+
+
+@pytest.mark.parametrize("seconds", [60, 300, 900, 3540, 7200, 3600 * 12])
+def test_queries_cover_the_width_up_to_one_coarse_bucket(seconds):
+  # events up to `seconds` back are always counted; beyond the finest level
+  # the window may reach back to the start of the coarse bucket it falls in
+  counter = MultiResolutionCounter(LEVELS)
+  seen = {}
+  for key, ts_ms in _stream(2, n=4000, keys=3, step_ms=60_000):
+    counter.add(key, ts_ms)
+    seen.setdefault(key, []).append(ts_ms // 10_000)
+    head = seen[key][-1]
+    start = head - seconds // 10 + 1
+    coarse = 1 if seconds <= 300 else 6 if seconds <= 3540 else 360
+    exact = sum(1 for b in seen[key] if b >= start)
+    widest = sum(1 for b in seen[key] if b >= start // coarse * coarse)
+    assert exact <= counter.count(key, seconds) <= widest
+
+
+def test_snapshot_round_trip():
+  stream = _stream(3)
+  counter = MultiResolutionCounter(LEVELS[:2])
+  for key, ts_ms in stream[:2500]:
+    counter.add(key, ts_ms)
+  restored = MultiResolutionCounter(LEVELS[:2])
+  restored.restore(pickle.loads(pickle.dumps(counter.snapshot())))
+  for key, ts_ms in stream[2500:]:
+    assert restored.add(key, ts_ms) == counter.add(key, ts_ms)
+    assert restored.count(key, 1800) == counter.count(key, 1800)
+
+
+def test_rules_on_the_same_stream_share_one_counter():
+  with open(AnalyzerConfig.RULES_PATH) as f:
+    config = json.load(f)
+  rules = config["sources"]["transactions"]
+  [frequency] = [rule for rule in rules if rule["name"] == "high_frequency"]
+  frequency["window"].pop("exact_from", None)
+  hourly = copy.deepcopy(frequency)
+  hourly.update(name="hourly_frequency", alert_type="HOURLY_FREQUENCY")
+  hourly["window"].update(seconds=1800, min_count=8)
+  rules.append(hourly)
+
+  compiled = compile_rules(config)
+  by_name = {rule.name: rule for rule in compiled.rules}
+  assert by_name["high_frequency"].window_id == by_name["hourly_frequency"].window_id
+  assert by_name["high_frequency"].window_id[2] == LEVELS[:2]
+  assert not by_name["high_frequency"].window_full
+
+  analyzer = TransactionsAnalyzer(compiled)
+  alert_types = []
+  for i in range(8):
+    # one transaction every 2 minutes: at most 3 in 5 minutes, 8 in 30
+    alert_types += [alert["alert_type"] for alert in analyzer.process(convert_event("transactions", {
+      "timestamp": f"2026-02-28T00:{2 * i:02d}:00Z", "transaction_id": f"t{i}",
+      "amount": 100, "currency": "TWD", "status": "SUCCESS", "user_id": 7,
+    }))]
+  assert alert_types == ["HOURLY_FREQUENCY"]
+  assert len(analyzer.windows.counters) == 1